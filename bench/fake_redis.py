@@ -0,0 +1,256 @@
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Servidor RESP mínimo, em memória, com os comandos que o CacheClient usa.
+# Fala o protocolo de verdade para que o benchmark inclua o custo do
+# redis-py (conexão, pipeline, serialização) sem depender de um Redis real.
+
+
+class RedisError(Exception):
+    pass
+
+
+class FakeRedisStore:
+    def __init__(self):
+        self._values: Dict[bytes, Any] = {}
+        self._expires: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._values.clear()
+            self._expires.clear()
+
+    def _alive(self, key: bytes) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._values
+
+    def _set(self, key: bytes, value: Any, ttl_ms: Optional[int] = None) -> None:
+        self._values[key] = value
+        if ttl_ms is None:
+            self._expires.pop(key, None)
+        else:
+            self._expires[key] = time.monotonic() + ttl_ms / 1000
+
+    def execute(self, command: List[bytes]) -> Any:
+        name = command[0].decode().upper()
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            raise RedisError(f"ERR unknown command '{name}'")
+        with self._lock:
+            return handler(*command[1:])
+
+    def cmd_ping(self, *args: bytes) -> Any:
+        return SimpleString("PONG")
+
+    def cmd_client(self, *args: bytes) -> Any:
+        return SimpleString("OK")
+
+    def cmd_select(self, db: bytes) -> Any:
+        return SimpleString("OK")
+
+    def cmd_flushdb(self, *args: bytes) -> Any:
+        self._values.clear()
+        self._expires.clear()
+        return SimpleString("OK")
+
+    def cmd_get(self, key: bytes) -> Any:
+        return self._values[key] if self._alive(key) else None
+
+    def cmd_mget(self, *keys: bytes) -> Any:
+        return [self.cmd_get(key) for key in keys]
+
+    def cmd_setex(self, key: bytes, seconds: bytes, value: bytes) -> Any:
+        self._set(key, value, int(seconds) * 1000)
+        return SimpleString("OK")
+
+    def cmd_set(self, key: bytes, value: bytes, *options: bytes) -> Any:
+        ttl_ms = None
+        only_new = False
+        args = iter(options)
+        for option in args:
+            flag = option.upper()
+            if flag == b"NX":
+                only_new = True
+            elif flag == b"EX":
+                ttl_ms = int(next(args)) * 1000
+            elif flag == b"PX":
+                ttl_ms = int(next(args))
+        if only_new and self._alive(key):
+            return None
+        self._set(key, value, ttl_ms)
+        return SimpleString("OK")
+
+    def cmd_del(self, *keys: bytes) -> Any:
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+                self._values.pop(key, None)
+                self._expires.pop(key, None)
+        return removed
+
+    def cmd_pttl(self, key: bytes) -> Any:
+        if not self._alive(key):
+            return -2
+        expires_at = self._expires.get(key)
+        if expires_at is None:
+            return -1
+        return int((expires_at - time.monotonic()) * 1000)
+
+    def cmd_hincrby(self, key: bytes, field: bytes, amount: bytes) -> Any:
+        hash_ = self._values.get(key) if self._alive(key) else None
+        if hash_ is None:
+            hash_ = self._values[key] = {}
+        hash_[field] = int(hash_.get(field, 0)) + int(amount)
+        return hash_[field]
+
+    def cmd_hgetall(self, key: bytes) -> Any:
+        hash_ = self._values.get(key) if self._alive(key) else None
+        return {field: str(value).encode() for field, value in (hash_ or {}).items()}
+
+    def cmd_lpush(self, key: bytes, *values: bytes) -> Any:
+        items = self._values.get(key) if self._alive(key) else None
+        if items is None:
+            items = self._values[key] = []
+        for value in values:
+            items.insert(0, value)
+        return len(items)
+
+    def cmd_ltrim(self, key: bytes, start: bytes, stop: bytes) -> Any:
+        if self._alive(key):
+            items = self._values[key]
+            self._values[key] = items[_slice(len(items), int(start), int(stop))]
+        return SimpleString("OK")
+
+    def cmd_lrange(self, key: bytes, start: bytes, stop: bytes) -> Any:
+        if not self._alive(key):
+            return []
+        items = self._values[key]
+        return items[_slice(len(items), int(start), int(stop))]
+
+    def cmd_evalsha(self, *args: bytes) -> Any:
+        raise RedisError("NOSCRIPT No matching script.")
+
+    def cmd_eval(self, script: bytes, numkeys: bytes, *args: bytes) -> Any:
+        # Só o script de unlock do cache: apaga a chave se o token confere.
+        keys, argv = args[: int(numkeys)], args[int(numkeys) :]
+        if b"del" not in script or not keys or not argv:
+            raise RedisError("ERR only the cache unlock script is supported")
+        if self._alive(keys[0]) and self._values[keys[0]] == argv[0]:
+            return self.cmd_del(keys[0])
+        return 0
+
+
+def _slice(length: int, start: int, stop: int) -> slice:
+    if start < 0:
+        start = max(0, length + start)
+    if stop < 0:
+        stop = length + stop
+    return slice(start, stop + 1)
+
+
+class SimpleString(str):
+    pass
+
+
+def encode(value: Any, resp3: bool = False) -> bytes:
+    if isinstance(value, SimpleString):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, RedisError):
+        return b"-" + str(value).encode() + b"\r\n"
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    if isinstance(value, int):
+        return b":" + str(value).encode() + b"\r\n"
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+    if isinstance(value, dict):
+        items = [item for pair in value.items() for item in pair]
+        if resp3:
+            return (
+                b"%"
+                + str(len(value)).encode()
+                + b"\r\n"
+                + b"".join(encode(item, resp3) for item in items)
+            )
+        value = items
+    if isinstance(value, list):
+        return (
+            b"*"
+            + str(len(value)).encode()
+            + b"\r\n"
+            + b"".join(encode(item, resp3) for item in value)
+        )
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "FakeRedisServer"
+    disable_nagle_algorithm = True
+
+    def handle(self) -> None:
+        resp3 = False
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            if command and command[0].upper() == b"HELLO":
+                # redis-py negocia RESP3 por padrão; respondemos no protocolo pedido.
+                resp3 = len(command) > 1 and command[1] == b"3"
+                reply: Any = {
+                    b"server": b"redis",
+                    b"version": b"7.2.0",
+                    b"proto": 3 if resp3 else 2,
+                    b"mode": b"standalone",
+                }
+            else:
+                try:
+                    reply = self.server.store.execute(command)
+                except RedisError as e:
+                    reply = e
+            self.wfile.write(encode(reply, resp3))
+
+    def _read_command(self) -> Optional[List[bytes]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        command = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            command.append(self.rfile.read(size + 2)[:-2])
+        return command
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.store = FakeRedisStore()
+        self._thread = threading.Thread(
+            target=self.serve_forever, args=(0.05,), daemon=True
+        )
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        host, port = self.server_address[:2]
+        return str(host), int(port)
+
+    def start(self) -> "FakeRedisServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
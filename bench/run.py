@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from bench.fake_redis import FakeRedisServer
+from bench.stubs import BrasilApiStub, OsrmStub, StubBehavior
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+
+Pair = Tuple[str, str]
+
+STATES = ("cold", "warm", "warm_l2")
+Result = Dict[str, Any]
+
+# Métricas comparadas com o baseline: (nome, maior é melhor)
+COMPARED = (("p50_ms", False), ("p99_ms", False), ("throughput_rps", True))
+
+
+class Harness:
+    # Sobe os stubs e o Redis falso e aponta a aplicação para eles. Os módulos
+    # de src/ leem o ambiente na importação, então só são importados depois.
+    def __init__(self, latency: float, jitter: float, seed: int):
+        self.brasil_api = BrasilApiStub(StubBehavior(latency, jitter), seed).start()
+        self.osrm = OsrmStub(StubBehavior(latency, jitter), seed + 1).start()
+        self.redis = FakeRedisServer().start()
+        redis_host, redis_port = self.redis.address
+        os.environ.update(
+            {
+                "BRASIL_API_URL": f"{self.brasil_api.url}/api/cep/v2/",
+                "OSRM_API_URL": f"{self.osrm.url}/route/v1/driving/",
+                "REDIS_HOST": redis_host,
+                "REDIS_PORT": str(redis_port),
+                "CEP_INDEX_PATH": "",
+                "DISTANCE_FALLBACK": "",
+                # Mede a aplicação, não o rate limit configurado para produção
+                "BRASIL_API_RATE_LIMIT": "100000",
+                "OSRM_API_RATE_LIMIT": "100000",
+                "BRASIL_API_MAX_IN_FLIGHT": "0",
+                "OSRM_API_MAX_IN_FLIGHT": "0",
+                "RATE_LIMIT_ADAPTIVE": "false",
+            }
+        )
+        if str(SRC) not in sys.path:
+            sys.path.insert(0, str(SRC))
+
+    def reset(self) -> None:
+        from provider.cache import clear_local_caches
+        from provider.resilience import brasil_api_breaker, osrm_api_breaker
+
+        self.redis.store.flush()
+        clear_local_caches()
+        brasil_api_breaker.close()
+        osrm_api_breaker.close()
+        self.brasil_api.behavior.error_rate = 0.0
+        self.osrm.behavior.error_rate = 0.0
+
+    def stop(self) -> None:
+        self.brasil_api.stop()
+        self.osrm.stop()
+        self.redis.stop()
+
+
+def percentile(ordered: Sequence[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Result:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(1000 * sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        **{f"p{p}_ms": round(1000 * percentile(ordered, p), 3) for p in (50, 90, 99)},
+        "max_ms": round(1000 * ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+def run_load(
+    call: Callable[[Pair], Any], pairs: Sequence[Pair], concurrency: int
+) -> Result:
+    def timed(pair: Pair) -> Tuple[float, bool]:
+        started = time.perf_counter()
+        try:
+            call(pair)
+            failed = False
+        except Exception:
+            failed = True
+        return time.perf_counter() - started, failed
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        outcomes = [timed(pair) for pair in pairs]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(timed, pairs))
+    elapsed = time.perf_counter() - started
+    return summarize(
+        [latency for latency, _ in outcomes],
+        sum(failed for _, failed in outcomes),
+        elapsed,
+    )
+
+
+def make_pairs(count: int, seed: int) -> List[Pair]:
+    rng = random.Random(seed)
+    return [
+        (str(rng.randrange(10**7, 10**8)), str(rng.randrange(10**7, 10**8)))
+        for _ in range(count)
+    ]
+
+
+def run_scenarios(
+    harness: Harness,
+    requests: int,
+    concurrency: int,
+    seed: int,
+    only: Optional[Sequence[str]] = None,
+) -> Dict[str, Result]:
+    from main import generate_freight
+    from provider.cache import clear_local_caches
+    from provider.cep import CepProvider
+    from provider.services.brasil_api import BrasilApiProvider
+    from services import get_distance_between_ceps
+
+    cep_provider: CepProvider = BrasilApiProvider()
+    pairs = make_pairs(requests, seed)
+
+    def distance(pair: Pair) -> Any:
+        return get_distance_between_ceps(pair[0], pair[1], cep_provider)
+
+    def freight(pair: Pair) -> Any:
+        return generate_freight(5.0, 2, pair[0], pair[1])
+
+    results: Dict[str, Result] = {}
+
+    def wanted(name: str) -> bool:
+        return not only or any(part in name for part in only)
+
+    for target_name, target in (("distance", distance), ("freight", freight)):
+        for mode, workers in (("serial", 1), ("concurrent", concurrency)):
+            # cold: caches vazios; warm: cache local (L1) quente;
+            # warm_l2: só o Redis quente, como num worker recém-iniciado.
+            names = [f"{target_name}_{state}_{mode}" for state in STATES]
+            if not any(wanted(name) for name in names):
+                continue
+            harness.reset()
+            for state, name in zip(STATES, names):
+                if state == "warm_l2":
+                    clear_local_caches()
+                result = run_load(target, pairs, workers)
+                if wanted(name):
+                    results[name] = result
+
+    if wanted("breaker_open"):
+        # Com a BrasilAPI fora do ar o circuito abre; depois disso as cotações
+        # devem falhar rápido, sem esperar timeouts nem back-off.
+        harness.reset()
+        harness.brasil_api.behavior.error_rate = 1.0
+        for pair in make_pairs(5, seed + 1):
+            try:
+                freight(pair)
+            except Exception:
+                pass
+        results["breaker_open"] = run_load(
+            freight, make_pairs(requests, seed + 2), concurrency
+        )
+        harness.reset()
+
+    return results
+
+
+def compare(
+    current: Dict[str, Result],
+    baseline: Dict[str, Result],
+    tolerance: float,
+    noise_ms: float = 0.5,
+) -> List[str]:
+    regressions = []
+    for name, result in current.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric, higher_is_better in COMPARED:
+            before, after = reference.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            # Latências de microssegundos (cache quente) oscilam muito em termos
+            # relativos; só contam diferenças acima de noise_ms.
+            if metric.endswith("_ms") and abs(after - before) < noise_ms:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(
+                    f"{name}.{metric}: {before} -> {after} ({change:+.1%})"
+                )
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark quotes against local BrasilAPI/OSRM/Redis stubs."
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--latency", type=float, default=20.0, help="stub latency in ms"
+    )
+    parser.add_argument("--jitter", type=float, default=5.0, help="stub jitter in ms")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="run only scenarios whose name contains this (repeatable)",
+    )
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="relative regression allowed before failing (default 0.1)",
+    )
+    parser.add_argument(
+        "--noise-ms",
+        type=float,
+        default=0.5,
+        help="ignore latency differences smaller than this (default 0.5)",
+    )
+    args = parser.parse_args(argv)
+
+    harness = Harness(args.latency / 1000, args.jitter / 1000, args.seed)
+    try:
+        scenarios = run_scenarios(
+            harness, args.requests, args.concurrency, args.seed, args.scenario
+        )
+    finally:
+        harness.stop()
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "latency_ms": args.latency,
+                "jitter_ms": args.jitter,
+                "seed": args.seed,
+            },
+        },
+        "scenarios": scenarios,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(
+            scenarios, baseline["scenarios"], args.tolerance, args.noise_ms
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+EARTH_RADIUS_KM = 6371.0088
+DETOUR_FACTOR = 1.3
+
+
+class StubBehavior:
+    # Latência base e jitter em segundos; error_rate é a fração de respostas
+    # com error_status (ex.: 500, ou 429 para simular rate limit).
+    def __init__(
+        self,
+        latency: float = 0.02,
+        jitter: float = 0.005,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self, rng: random.Random) -> float:
+        return max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+
+
+def cep_coordinates(cep: str) -> Tuple[float, float]:
+    # Coordenadas determinísticas dentro do Brasil para qualquer CEP.
+    digest = hashlib.blake2b(cep.encode(), digest_size=8).digest()
+    lat_fraction = int.from_bytes(digest[:4], "big") / 2**32
+    lon_fraction = int.from_bytes(digest[4:], "big") / 2**32
+    return -33.0 + 35.0 * lat_fraction, -73.0 + 38.0 * lon_fraction
+
+
+def road_meters(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    km = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+    return km * DETOUR_FACTOR * 1000
+
+
+class StubServer(ThreadingHTTPServer, ABC):
+    daemon_threads = True
+
+    def __init__(self, behavior: Optional[StubBehavior] = None, seed: int = 0):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.behavior = behavior or StubBehavior()
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self.serve_forever, args=(0.05,), daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def draw(self) -> Tuple[float, bool]:
+        with self._lock:
+            self.requests += 1
+            return (
+                self.behavior.delay(self._rng),
+                self._rng.random() < self.behavior.error_rate,
+            )
+
+    @abstractmethod
+    def route(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, Any]:
+        pass
+
+
+class BrasilApiStub(StubServer):
+    # GET /api/cep/v2/{cep}, no formato da BrasilAPI v2.
+    PREFIX = "/api/cep/v2/"
+
+    def route(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, Any]:
+        if not path.startswith(self.PREFIX):
+            return 404, {"message": "Not found"}
+        cep = path[len(self.PREFIX) :]
+        if len(cep) != 8 or not cep.isdigit():
+            return 400, {"message": "CEP inválido"}
+        latitude, longitude = cep_coordinates(cep)
+        return 200, {
+            "cep": cep,
+            "state": "SP",
+            "city": "São Paulo",
+            "location": {
+                "type": "Point",
+                "coordinates": {
+                    "longitude": f"{longitude:.7f}",
+                    "latitude": f"{latitude:.7f}",
+                },
+            },
+        }
+
+
+class OsrmStub(StubServer):
+    # GET /route/v1/driving/{lon,lat;lon,lat} e /table/v1/driving/{coords}.
+    def route(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, Any]:
+        for service in ("route", "table"):
+            prefix = f"/{service}/v1/driving/"
+            if path.startswith(prefix):
+                try:
+                    coordinates = [
+                        tuple(float(part) for part in pair.split(","))
+                        for pair in path[len(prefix) :].split(";")
+                    ]
+                except ValueError:
+                    return 400, {"code": "InvalidQuery"}
+                if service == "route":
+                    return self._route(coordinates)
+                return self._table(coordinates, query)
+        return 404, {"code": "InvalidUrl"}
+
+    @staticmethod
+    def _route(coordinates: List[Tuple[float, ...]]) -> Tuple[int, Any]:
+        if len(coordinates) != 2:
+            return 400, {"code": "InvalidQuery"}
+        (lon1, lat1), (lon2, lat2) = coordinates
+        return 200, {
+            "code": "Ok",
+            "routes": [{"distance": road_meters(lon1, lat1, lon2, lat2)}],
+        }
+
+    @staticmethod
+    def _table(
+        coordinates: List[Tuple[float, ...]], query: Dict[str, List[str]]
+    ) -> Tuple[int, Any]:
+        def indexes(name: str) -> List[int]:
+            values = query.get(name, ["all"])[0]
+            if values == "all":
+                return list(range(len(coordinates)))
+            return [int(index) for index in values.split(";")]
+
+        return 200, {
+            "code": "Ok",
+            "distances": [
+                [
+                    road_meters(*coordinates[source], *coordinates[destination])
+                    for destination in indexes("destinations")
+                ]
+                for source in indexes("sources")
+            ],
+        }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: StubServer
+    protocol_version = "HTTP/1.1"
+    # Sem Nagle: cabeçalho e corpo saem em writes separados e o atraso do
+    # ACK (~40ms) dominaria a latência medida.
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        delay, fail = self.server.draw()
+        if delay:
+            time.sleep(delay)
+        url = urlsplit(self.path)
+        if fail:
+            status, body = self.server.behavior.error_status, {"message": "error"}
+        else:
+            status, body = self.server.route(url.path, parse_qs(url.query))
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
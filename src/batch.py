@@ -0,0 +1,204 @@
+import argparse
+import json
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import IO, Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from concurrency import BATCH_MAX_WORKERS
+from exceptions import InvalidRecordError
+from factories.provider_factory import CepProviderFactory
+from main import calculate_freight
+from provider.cache import get_cache_stats
+from provider.cep import CepProvider
+from provider.services.brasil_api import BrasilApiProvider
+from serialization import error_to_dict, freight_to_dict
+
+
+class BatchSummary:
+    def __init__(self):
+        self.records = 0
+        self.errors: Counter = Counter()
+        self.started_at = time.monotonic()
+        self.finished_at = self.started_at
+        self._cache_before = get_cache_stats()
+        self.cache_hits = 0
+        self.cache_lookups = 0
+
+    def record(self, result: Dict[str, Any]) -> None:
+        self.records += 1
+        if "error" in result:
+            self.errors[result["error"]] += 1
+
+    def finish(self) -> None:
+        self.finished_at = time.monotonic()
+        after = get_cache_stats()
+        for prefix, tiers in after.items():
+            before = self._cache_before.get(prefix, {})
+            delta = {
+                tier: {
+                    outcome: count - before.get(tier, {}).get(outcome, 0)
+                    for outcome, count in counts.items()
+                }
+                for tier, counts in tiers.items()
+            }
+            l1, l2 = delta["l1"], delta["l2"]
+            # Com L1, toda consulta passa por ele; sem L1, começa no Redis.
+            lookups = l1["hits"] + l1["misses"] or l2["hits"] + l2["misses"]
+            self.cache_hits += l1["hits"] + l2["hits"]
+            self.cache_lookups += lookups
+
+    @property
+    def elapsed(self) -> float:
+        return self.finished_at - self.started_at
+
+    def report(self) -> str:
+        errors = sum(self.errors.values())
+        throughput = self.records / self.elapsed if self.elapsed > 0 else 0.0
+        hit_ratio = self.cache_hits / self.cache_lookups if self.cache_lookups else 0.0
+        lines = [
+            f"records: {self.records}",
+            f"succeeded: {self.records - errors}",
+            f"failed: {errors}",
+            f"elapsed: {self.elapsed:.2f}s",
+            f"throughput: {throughput:.1f} records/s",
+            f"cache hit ratio: {hit_ratio:.1%}",
+        ]
+        lines.extend(
+            f"  {error}: {count}" for error, count in self.errors.most_common()
+        )
+        return "\n".join(lines)
+
+
+def parse_line(line: str) -> Dict[str, Any]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise InvalidRecordError("Line is not valid JSON.")
+    if not isinstance(record, dict):
+        raise InvalidRecordError("Each line must be a JSON object.")
+    missing = [field for field in ("weight", "option") if field not in record]
+    if missing:
+        raise InvalidRecordError(f"Missing field: {', '.join(missing)}.")
+    try:
+        return {
+            "weight": float(record["weight"]),
+            "option": int(record["option"]),
+            "origin_cep": record.get("origin_cep"),
+            "destination_cep": record.get("destination_cep"),
+            "distance": (
+                None if record.get("distance") is None else float(record["distance"])
+            ),
+        }
+    except (TypeError, ValueError):
+        raise InvalidRecordError("weight, option and distance must be numbers.")
+
+
+def quote_line(
+    line_number: int, line: str, cep_provider: CepProvider
+) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"line": line_number}
+    try:
+        record = parse_line(line)
+        freight = calculate_freight(**record, cep_provider=cep_provider)
+        result.update(freight_to_dict(freight), option=record["option"])
+    except Exception as e:
+        # FreightError vira {"error": <classe>, ...}; circuito aberto,
+        # CircuitOpenError; o resto, InternalError
+        result.update(error_to_dict(e))
+    return result
+
+
+def _numbered(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    for line_number, line in enumerate(lines, start=1):
+        if line.strip():
+            yield line_number, line
+
+
+def run_batch(
+    lines: Iterable[str],
+    output: IO[str],
+    max_workers: int = BATCH_MAX_WORKERS,
+    ordered: bool = True,
+    window: Optional[int] = None,
+    cep_provider: Optional[CepProvider] = None,
+) -> BatchSummary:
+    # No máximo `window` registros em memória: a leitura só avança quando
+    # um resultado é escrito.
+    window = window or max_workers * 4
+    cep_provider = cep_provider or CepProviderFactory().create_provider(
+        BrasilApiProvider()
+    )
+    summary = BatchSummary()
+
+    def emit(result: Dict[str, Any]) -> None:
+        summary.record(result)
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending_in_order: Deque[Future] = deque()
+        pending: Set[Future] = set()
+        for line_number, line in _numbered(lines):
+            future = executor.submit(quote_line, line_number, line, cep_provider)
+            if ordered:
+                pending_in_order.append(future)
+                if len(pending_in_order) >= window:
+                    emit(pending_in_order.popleft().result())
+            else:
+                pending.add(future)
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for finished in done:
+                        emit(finished.result())
+
+        while pending_in_order:
+            emit(pending_in_order.popleft().result())
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for finished in done:
+                emit(finished.result())
+
+    summary.finish()
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="main.py --batch",
+        description="Quote freights from JSONL records (one object per line).",
+    )
+    parser.add_argument(
+        "source", nargs="?", default="-", help="JSONL file, or - for stdin"
+    )
+    parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS)
+    parser.add_argument(
+        "--order",
+        choices=("input", "completion"),
+        default="input",
+        help="write results in input order or as soon as they finish",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=None,
+        help="maximum records in flight (default: 4 x workers)",
+    )
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.source == "-" else open(args.source, encoding="utf-8")
+    try:
+        summary = run_batch(
+            source,
+            sys.stdout,
+            max_workers=args.workers,
+            ordered=args.order == "input",
+            window=args.window,
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    print(summary.report(), file=sys.stderr)
+    return 0 if not summary.errors else 1
@@ -0,0 +1,30 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterable, TypeVar, Union
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "8"))
+
+
+def run_concurrently(
+    func: Callable[[K], V], items: Iterable[K], max_workers: int = BATCH_MAX_WORKERS
+) -> Dict[K, Union[V, Exception]]:
+    unique_items = list(dict.fromkeys(items))
+    if not unique_items:
+        return {}
+
+    # Cada worker roda numa cópia do contexto de quem chamou (prazo etc.).
+    context = contextvars.copy_context()
+
+    def call(item: K) -> Union[V, Exception]:
+        try:
+            return context.copy().run(func, item)
+        except Exception as e:
+            return e
+
+    workers = max(1, min(max_workers, len(unique_items)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(unique_items, executor.map(call, unique_items)))
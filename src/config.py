@@ -0,0 +1,38 @@
+import os
+import threading
+from typing import Optional
+
+# Carrega o .env uma única vez por processo, antes de qualquer módulo ler o
+# ambiente. O python-dotenv só é importado quando existe um .env: os processos
+# curtos da CLI não pagam por ele em produção (variáveis já no ambiente).
+
+_lock = threading.Lock()
+_loaded = False
+
+
+def find_env_file(start: Optional[str] = None) -> Optional[str]:
+    # Mesma busca do load_dotenv(): do diretório do código até a raiz.
+    directory = os.path.abspath(start or os.path.dirname(__file__))
+    while True:
+        candidate = os.path.join(directory, ".env")
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def load_env() -> None:
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if _loaded:
+            return
+        path = find_env_file()
+        if path is not None:
+            from dotenv import load_dotenv
+
+            load_dotenv(path)
+        _loaded = True
@@ -20,3 +20,19 @@ class FreightTypeInvalidError(FreightError):
 
 class ExternalAPIError(FreightError):
     pass
+
+
+class CepNotFoundError(InvalidCepError):
+    pass
+
+
+class InvalidRecordError(FreightError):
+    pass
+
+
+class RateLimitError(ExternalAPIError):
+    pass
+
+
+class DeadlineExceededError(ExternalAPIError):
+    pass
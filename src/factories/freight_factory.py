@@ -1,5 +1,7 @@
-from typing import Dict, Type
+import os
+from typing import Dict, Optional
 
+from config import load_env
 from exceptions import FreightTypeInvalidError
 from strategies.freight_calulator import (
     NormalFreight,
@@ -7,18 +9,39 @@ from strategies.freight_calulator import (
     Sedex10Freight,
 )
 from strategies.freight_strategy import FreightStrategy
+from strategies.tariff import TariffTableLoader
+
+load_env()
+
+# Tabela de tarifas (JSON); vazio usa as fórmulas fixas de cada opção
+TARIFF_TABLE_PATH = os.getenv("TARIFF_TABLE_PATH", "")
+# Intervalo (s) entre verificações de mudança no arquivo (0 desativa o reload)
+TARIFF_RELOAD_INTERVAL = float(os.getenv("TARIFF_RELOAD_INTERVAL", "5"))
+
+# Estratégias sem estado: uma instância por processo, compartilhada.
+_default_strategies: Dict[int, FreightStrategy] = {
+    1: NormalFreight(),
+    2: SedexFreight(),
+    3: Sedex10Freight(),
+}
+
+# Carregada no primeiro uso; cada worker recarrega sozinho quando o arquivo muda.
+tariff_loader: Optional[TariffTableLoader] = (
+    TariffTableLoader(TARIFF_TABLE_PATH, TARIFF_RELOAD_INTERVAL)
+    if TARIFF_TABLE_PATH
+    else None
+)
 
 
 class FreightStrategyFactory:
-    def __init__(self):
-        self._strategies: Dict[int, Type[FreightStrategy]] = {
-            1: NormalFreight,
-            2: SedexFreight,
-            3: Sedex10Freight,
-        }
+    def __init__(self, tariffs: Optional[TariffTableLoader] = None):
+        self._tariffs = tariffs or tariff_loader
 
     def create_strategy(self, option: int) -> FreightStrategy:
-        if option not in self._strategies:
-            raise FreightTypeInvalidError("Invalid freight option.")
+        if self._tariffs is not None:
+            return self._tariffs.current().strategy(option)
 
-        return self._strategies[option]()
+        strategy = _default_strategies.get(option)
+        if strategy is None:
+            raise FreightTypeInvalidError("Invalid freight option.")
+        return strategy
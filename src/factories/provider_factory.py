@@ -0,0 +1,40 @@
+import os
+from typing import Optional
+
+from config import load_env
+
+from provider.cep import CepProvider, TieredCepProvider
+from provider.distance import DistanceProvider, FallbackDistanceProvider
+from provider.services.haversine import HaversineDistanceProvider
+from provider.services.local_cep_index import LocalCepIndexProvider
+from provider.services.osrm_api import OSRMProvider
+
+load_env()
+
+
+class CepProviderFactory:
+    def __init__(self, index_path: Optional[str] = None):
+        self._index_path = index_path or os.getenv("CEP_INDEX_PATH")
+
+    def create_provider(self, fallback: Optional[CepProvider] = None) -> CepProvider:
+        if not self._index_path:
+            if fallback is None:
+                raise ValueError("CEP_INDEX_PATH not found in environment variables.")
+            return fallback
+
+        local_provider = LocalCepIndexProvider(self._index_path)
+        if fallback is None:
+            return local_provider
+        return TieredCepProvider(local_provider, fallback)
+
+
+class DistanceProviderFactory:
+    def __init__(self, fallback: Optional[str] = None):
+        self._fallback = (fallback or os.getenv("DISTANCE_FALLBACK") or "").lower()
+
+    def create_provider(self) -> DistanceProvider:
+        if not self._fallback:
+            return OSRMProvider()
+        if self._fallback == "haversine":
+            return FallbackDistanceProvider(OSRMProvider(), HaversineDistanceProvider())
+        raise ValueError(f"Unknown distance fallback: {self._fallback}.")
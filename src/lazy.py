@@ -0,0 +1,45 @@
+import importlib
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Optional
+
+# Dependências pesadas (requests, redis, pybreaker, tenacity, numpy) só são
+# importadas no primeiro uso, e não ao importar a aplicação.
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return module
+
+    def __getattr__(self, attribute: str) -> Any:
+        # Nada é copiado para o proxy: patches no módulo real continuam valendo.
+        return getattr(self._load(), attribute)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name: str) -> Any:
+    return LazyModule(name)
+
+
+@lru_cache(maxsize=None)
+def numpy_module() -> Optional[ModuleType]:
+    # NumPy é opcional e só é importado no primeiro cálculo vetorizado.
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
@@ -1,14 +1,67 @@
-from typing import Optional
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union
 
+from config import load_env
 from exceptions import (
     DistanceInvalidError,
     FreightError,
     FreightTypeInvalidError,
 )
 from model.freight import Freight
+from provider.cep import CepProvider
 from provider.services.brasil_api import BrasilApiProvider
-from services import get_distance_between_ceps
+from concurrency import BATCH_MAX_WORKERS
+from services import (
+    get_distance_between_ceps,
+    get_distances_between_ceps,
+    is_estimated,
+)
 from factories.freight_factory import FreightStrategyFactory
+from factories.provider_factory import CepProviderFactory
+from metrics import REGISTRY
+from provider.deadline import deadline
+
+load_env()
+
+# Prazo total (s) de uma cotação e de um lote, incluindo retries e esperas
+FREIGHT_DEADLINE = float(os.getenv("FREIGHT_DEADLINE", "15"))
+FREIGHT_BATCH_DEADLINE = float(os.getenv("FREIGHT_BATCH_DEADLINE", "120"))
+
+_quote_seconds = REGISTRY.histogram(
+    "freight_quote_seconds", "End-to-end latency of a freight quote.", ("outcome",)
+)
+
+
+def calculate_freight(
+    weight: float,
+    option: int,
+    origin_cep: Optional[str] = None,
+    destination_cep: Optional[str] = None,
+    distance: Optional[float] = None,
+    cep_provider: Optional[CepProvider] = None,
+) -> Freight:
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        if origin_cep and destination_cep:
+            cep_provider = cep_provider or CepProviderFactory().create_provider(
+                BrasilApiProvider()
+            )
+            with deadline(FREIGHT_DEADLINE):
+                distance = get_distance_between_ceps(
+                    origin_cep, destination_cep, cep_provider
+                )
+
+        freight = _build_freight(
+            weight, option, distance, FreightStrategyFactory(), destination_cep
+        )
+        outcome = "ok"
+        return freight
+    finally:
+        _quote_seconds.observe(time.perf_counter() - started, outcome)
 
 
 def generate_freight(
@@ -18,26 +71,100 @@ def generate_freight(
     destination_cep: Optional[str] = None,
     distance: Optional[float] = None,
 ) -> str:
-    if origin_cep and destination_cep:
-        brasil_api_provider = BrasilApiProvider()
-        distance = get_distance_between_ceps(
-            origin_cep, destination_cep, brasil_api_provider
+    return _format_freight(
+        calculate_freight(weight, option, origin_cep, destination_cep, distance)
+    )
+
+
+def calculate_freights(
+    records: Iterable[Mapping[str, Any]],
+    max_workers: int = BATCH_MAX_WORKERS,
+    cep_provider: Optional[CepProvider] = None,
+) -> List[Union[Freight, Exception]]:
+    records = list(records)
+
+    cep_pairs = list(
+        dict.fromkeys(
+            (record["origin_cep"], record["destination_cep"])
+            for record in records
+            if record.get("origin_cep") and record.get("destination_cep")
         )
+    )
+    distances: Dict[Tuple[str, str], Union[float, Exception]] = {}
+    if cep_pairs:
+        with deadline(FREIGHT_BATCH_DEADLINE):
+            distances = dict(
+                zip(
+                    cep_pairs,
+                    get_distances_between_ceps(
+                        cep_pairs,
+                        cep_provider
+                        or CepProviderFactory().create_provider(BrasilApiProvider()),
+                        max_workers=max_workers,
+                    ),
+                )
+            )
+
+    factory = FreightStrategyFactory()
+    results: List[Union[Freight, Exception]] = []
+    for record in records:
+        try:
+            distance = record.get("distance")
+            if record.get("origin_cep") and record.get("destination_cep"):
+                lookup = distances[(record["origin_cep"], record["destination_cep"])]
+                if isinstance(lookup, Exception):
+                    raise lookup
+                distance = lookup
+            results.append(
+                _build_freight(
+                    record["weight"],
+                    record["option"],
+                    distance,
+                    factory,
+                    record.get("destination_cep"),
+                )
+            )
+        except Exception as e:
+            results.append(e)
+
+    return results
+
+
+def generate_freights(
+    records: Iterable[Mapping[str, Any]], max_workers: int = BATCH_MAX_WORKERS
+) -> List[Union[str, Exception]]:
+    return [
+        result if isinstance(result, Exception) else _format_freight(result)
+        for result in calculate_freights(records, max_workers)
+    ]
+
 
+def _build_freight(
+    weight: float,
+    option: int,
+    distance: Optional[float],
+    factory: FreightStrategyFactory,
+    destination_cep: Optional[str] = None,
+) -> Freight:
     if distance is None:
         raise DistanceInvalidError(
             "Distance or origin/destination CEPs must be provided."
         )
 
-    factory = FreightStrategyFactory()
-
     try:
         strategy = factory.create_strategy(option)
     except FreightTypeInvalidError:
         raise FreightTypeInvalidError("Invalid freight option.")
 
-    freight = Freight(distance, weight, strategy)
+    return Freight(distance, weight, strategy, destination_cep)
+
 
+def _format_freight(freight: Freight) -> str:
+    if is_estimated(freight.distance):
+        return (
+            f"The freight value is {freight.value:.2f} "
+            f"(estimated distance: {getattr(freight.distance, 'provider', 'unknown')})"
+        )
     return f"The freight value is {freight.value:.2f}"
 
 
@@ -66,4 +193,10 @@ def main():
 
 
 if __name__ == "__main__":
+    # Configurado só aqui (e no server): importar a aplicação não mexe no logging.
+    logging.basicConfig(level=logging.INFO)
+    if "--batch" in sys.argv[1:]:
+        import batch
+
+        sys.exit(batch.main([arg for arg in sys.argv[1:] if arg != "--batch"]))
     main()
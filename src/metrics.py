@@ -0,0 +1,262 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+Labels = Tuple[str, ...]
+Collector = Callable[[], Dict[Labels, float]]
+M = TypeVar("M", bound="Metric")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        pass
+
+    @abstractmethod
+    def snapshot(self) -> Any:
+        pass
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Collector] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+        # Com collect, os valores vêm de contadores que já existem em outro
+        # lugar e só são lidos na exportação (nada muda no caminho quente).
+        self._collect = collect
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        if self._collect is not None:
+            return self._collect()
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [
+            (self.name, _format_labels(self.labelnames, labels), value)
+            for labels, value in sorted(self.values().items())
+        ]
+
+    def snapshot(self) -> Any:
+        return [
+            {"labels": dict(zip(self.labelnames, labels)), "value": value}
+            for labels, value in sorted(self.values().items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por combinação de labels: contagem por bucket (+Inf no fim) e soma.
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[index] += 1
+            self._sums[labels] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def _copy(self) -> List[Tuple[Labels, List[int], float]]:
+        with self._lock:
+            return [
+                (labels, list(counts), self._sums[labels])
+                for labels, counts in sorted(self._counts.items())
+            ]
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples: List[Tuple[str, str, float]] = []
+        for labels, counts, total in self._copy():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(
+                    (
+                        f"{self.name}_bucket",
+                        _format_labels(self.labelnames, labels, le),
+                        cumulative,
+                    )
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            samples.append((f"{self.name}_sum", label_text, total))
+            samples.append((f"{self.name}_count", label_text, cumulative))
+        return samples
+
+    def snapshot(self) -> Any:
+        return [
+            {
+                "labels": dict(zip(self.labelnames, labels)),
+                "count": sum(counts),
+                "sum": total,
+                "buckets": dict(
+                    zip(
+                        [_format_value(bound) for bound in (*self.buckets, math.inf)],
+                        counts,
+                    )
+                ),
+            }
+            for labels, counts, total in self._copy()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def _register_as(self, metric: M) -> M:
+        # Mesmo nome com outro tipo é erro de programação (Gauge herda de
+        # Counter, então compara o tipo exato).
+        registered = self.register(metric)
+        if type(registered) is not type(metric):
+            raise ValueError(
+                f"Metric {metric.name} is already registered as a {registered.kind}."
+            )
+        return cast(M, registered)
+
+    def counter(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Collector] = None,
+    ) -> Counter:
+        return self._register_as(Counter(name, help, labelnames, collect))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Collector] = None,
+    ) -> Gauge:
+        return self._register_as(Gauge(name, help, labelnames, collect))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register_as(Histogram(name, help, labelnames, buckets))
+
+    def metrics(self) -> List[Metric]:
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            metric.name: {"type": metric.kind, "samples": metric.snapshot()}
+            for metric in self.metrics()
+        }
+
+
+REGISTRY = Registry()
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+
+def snapshot() -> Dict[str, Any]:
+    return REGISTRY.snapshot()
@@ -0,0 +1,98 @@
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from exceptions import InvalidCepError
+from validation import Validation
+
+# Tipos compactos (__slots__, sem __dict__ por instância) para guardar muitos
+# CEPs em memória. Os provedores continuam trocando o dicionário no formato da
+# BrasilAPI (é o que vai para o cache); a conversão acontece nas bordas.
+
+
+class Coordinates:
+    __slots__ = ("latitude", "longitude")
+
+    def __init__(self, latitude: float, longitude: float):
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @classmethod
+    def from_cep_data(cls, data: Mapping[str, Any]) -> "Coordinates":
+        coordinates = data["location"]["coordinates"]
+        return cls(float(coordinates["latitude"]), float(coordinates["longitude"]))
+
+    def lon_lat(self) -> Tuple[float, float]:
+        return self.longitude, self.latitude
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Coordinates):
+            return NotImplemented
+        return (self.latitude, self.longitude) == (other.latitude, other.longitude)
+
+    def __hash__(self) -> int:
+        return hash((self.latitude, self.longitude))
+
+    def __repr__(self) -> str:
+        return f"Coordinates(latitude={self.latitude}, longitude={self.longitude})"
+
+
+class CepRecord:
+    __slots__ = ("cep", "coordinates", "state", "city")
+
+    def __init__(
+        self,
+        cep: str,
+        coordinates: Coordinates,
+        state: Optional[str] = None,
+        city: Optional[str] = None,
+    ):
+        self.cep = cep
+        self.coordinates = coordinates
+        self.state = state
+        self.city = city
+
+    @classmethod
+    def from_cep_data(cls, cep: str, data: Mapping[str, Any]) -> "CepRecord":
+        if not Validation.has_valid_coordinates(dict(data)):
+            raise InvalidCepError(f"CEP {cep} not have valid coordinates.")
+        return cls(
+            Validation.normalize_cep(str(data.get("cep") or cep)),
+            Coordinates.from_cep_data(data),
+            data.get("state"),
+            data.get("city"),
+        )
+
+    def to_cep_data(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "cep": self.cep,
+            "location": {
+                "type": "Point",
+                "coordinates": {
+                    "latitude": self.coordinates.latitude,
+                    "longitude": self.coordinates.longitude,
+                },
+            },
+        }
+        if self.state is not None:
+            data["state"] = self.state
+        if self.city is not None:
+            data["city"] = self.city
+        return data
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CepRecord):
+            return NotImplemented
+        return (self.cep, self.coordinates, self.state, self.city) == (
+            other.cep,
+            other.coordinates,
+            other.state,
+            other.city,
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.cep, self.coordinates))
+
+    def __repr__(self) -> str:
+        return (
+            f"CepRecord(cep={self.cep!r}, coordinates={self.coordinates!r}, "
+            f"state={self.state!r}, city={self.city!r})"
+        )
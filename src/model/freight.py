@@ -1,18 +1,27 @@
-from typing import cast
+from typing import Optional, cast
 
 from exceptions import DistanceInvalidError, WeightInvalidError
 from strategies.freight_strategy import FreightStrategy
 
 
 class Freight:
-    def __init__(self, distance: float, weight: float, strategy: FreightStrategy):
+    # Sem __dict__ por instância: muitas cotações em memória custam bem menos.
+    __slots__ = ("_distance", "_weight", "_value")
+
+    def __init__(
+        self,
+        distance: float,
+        weight: float,
+        strategy: FreightStrategy,
+        destination_cep: Optional[str] = None,
+    ):
         if distance <= 0:
             raise DistanceInvalidError("Distance must be a positive value.")
         if weight <= 0:
             raise WeightInvalidError("Weight must be a positive value.")
         self._distance = distance
         self._weight = weight
-        self._value = cast(float, strategy.calculate(distance, weight))
+        self._value = cast(float, strategy.calculate(distance, weight, destination_cep))
 
     @property
     def value(self) -> float:
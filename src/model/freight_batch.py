@@ -0,0 +1,206 @@
+import csv
+import json
+import math
+from array import array
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from factories.freight_factory import FreightStrategyFactory
+from exceptions import FreightTypeInvalidError
+from lazy import numpy_module
+from model.freight import Freight
+
+COLUMNS = ("distance", "weight", "option", "value")
+# Formato de cada coluna no estilo do Arrow C Data Interface
+ARROW_FORMATS = {"d": "g", "h": "s"}
+
+
+class FreightRow:
+    # Visão de uma linha: lê direto das colunas do lote, sem copiar.
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch: "FreightBatch", index: int):
+        self._batch = batch
+        self._index = index
+
+    @property
+    def distance(self) -> float:
+        return self._batch.distances[self._index]
+
+    @property
+    def weight(self) -> float:
+        return self._batch.weights[self._index]
+
+    @property
+    def option(self) -> int:
+        return self._batch.options[self._index]
+
+    @property
+    def value(self) -> float:
+        return self._batch.values[self._index]
+
+    @property
+    def valid(self) -> bool:
+        return not math.isnan(self.value)
+
+    def __repr__(self) -> str:
+        return (
+            f"FreightRow(distance={self.distance}, weight={self.weight}, "
+            f"option={self.option}, value={self.value})"
+        )
+
+
+class FreightBatch:
+    # Cotações em colunas contíguas e tipadas (8 + 8 + 2 + 8 bytes por linha),
+    # em vez de um objeto por cotação. Linhas sem preço (entrada inválida,
+    # opção inexistente, fora da tarifa) têm value NaN.
+    __slots__ = ("distances", "weights", "options", "values")
+
+    def __init__(
+        self,
+        distances: Iterable[float] = (),
+        weights: Iterable[float] = (),
+        options: Iterable[int] = (),
+        values: Iterable[float] = (),
+    ):
+        self.distances = array("d", distances)
+        self.weights = array("d", weights)
+        self.options = array("h", options)
+        self.values = array("d", values)
+        if not (
+            len(self.distances)
+            == len(self.weights)
+            == len(self.options)
+            == len(self.values)
+        ):
+            raise ValueError("Batch columns must have the same length.")
+
+    @classmethod
+    def price(
+        cls,
+        distances: Sequence[float],
+        weights: Sequence[float],
+        options: Sequence[int],
+        destination_ceps: Optional[Sequence[Optional[str]]] = None,
+        factory: Optional[FreightStrategyFactory] = None,
+    ) -> "FreightBatch":
+        # Uma chamada de calculate_batch por opção, em vez de um Freight por linha.
+        batch = cls(distances, weights, options, [math.nan] * len(options))
+        factory = factory or FreightStrategyFactory()
+        rows_by_option: Dict[int, List[int]] = {}
+        for row, option in enumerate(batch.options):
+            rows_by_option.setdefault(option, []).append(row)
+
+        for option, rows in rows_by_option.items():
+            try:
+                strategy = factory.create_strategy(option)
+            except FreightTypeInvalidError:
+                continue
+            values, _ = strategy.calculate_batch(
+                [batch.distances[row] for row in rows],
+                [batch.weights[row] for row in rows],
+                (
+                    None
+                    if destination_ceps is None
+                    else [destination_ceps[row] for row in rows]
+                ),
+            )
+            if hasattr(values, "tolist"):
+                values = values.tolist()
+            for row, value in zip(rows, values):
+                batch.values[row] = value
+        return batch
+
+    @classmethod
+    def from_freights(cls, quotes: Iterable[Tuple[Freight, int]]) -> "FreightBatch":
+        batch = cls()
+        for freight, option in quotes:
+            batch.append(freight.distance, freight.weight, option, freight.value)
+        return batch
+
+    def append(self, distance: float, weight: float, option: int, value: float) -> None:
+        self.distances.append(distance)
+        self.weights.append(weight)
+        self.options.append(option)
+        self.values.append(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, index: int) -> FreightRow:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("FreightBatch index out of range.")
+        return FreightRow(self, index)
+
+    def __iter__(self) -> Iterator[FreightRow]:
+        for index in range(len(self)):
+            yield FreightRow(self, index)
+
+    def valid_mask(self) -> List[bool]:
+        return [not math.isnan(value) for value in self.values]
+
+    def columns(self) -> Dict[str, array]:
+        return {
+            "distance": self.distances,
+            "weight": self.weights,
+            "option": self.options,
+            "value": self.values,
+        }
+
+    def to_numpy(self) -> Dict[str, Any]:
+        # Arrays NumPy sobre a mesma memória das colunas (sem cópia); enquanto
+        # existirem, o lote não aceita append (o array não pode ser realocado).
+        np = numpy_module()
+        if np is None:
+            raise RuntimeError("NumPy is not installed.")
+        return {
+            name: np.frombuffer(column, dtype=column.typecode)
+            for name, column in self.columns().items()
+        }
+
+    def to_buffers(self) -> Dict[str, Dict[str, Any]]:
+        # Estilo Arrow: por coluna, o formato, o buffer de dados (memoryview
+        # sobre o array, sem cópia) e, em value, o bitmap de validade
+        # (bit i = 1 se a linha i tem preço; ordem LSB como no Arrow).
+        buffers: Dict[str, Dict[str, Any]] = {}
+        for name, column in self.columns().items():
+            buffers[name] = {
+                "format": ARROW_FORMATS[column.typecode],
+                "length": len(column),
+                "data": memoryview(column),
+                "validity": None,
+            }
+        buffers["value"]["validity"] = self._validity_bitmap()
+        return buffers
+
+    def _validity_bitmap(self) -> bytes:
+        bitmap = bytearray((len(self) + 7) // 8)
+        for index, value in enumerate(self.values):
+            if not math.isnan(value):
+                bitmap[index >> 3] |= 1 << (index & 7)
+        return bytes(bitmap)
+
+    def to_csv(self, file: IO[str]) -> int:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(COLUMNS)
+        for row in zip(self.distances, self.weights, self.options, self.values):
+            writer.writerow(row if not math.isnan(row[3]) else (*row[:3], ""))
+        return len(self)
+
+    def to_jsonl(self, file: IO[str]) -> int:
+        for distance, weight, option, value in zip(
+            self.distances, self.weights, self.options, self.values
+        ):
+            file.write(
+                json.dumps(
+                    {
+                        "distance": distance,
+                        "weight": weight,
+                        "option": option,
+                        "value": None if math.isnan(value) else value,
+                    }
+                )
+                + "\n"
+            )
+        return len(self)
@@ -1,55 +1,166 @@
-import json
+from __future__ import annotations
+
+import inspect
+import logging
+import math
 import os
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Callable, Optional, TypeVar, cast
-import redis
-from dotenv import load_dotenv
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    cast,
+)
+from config import load_env
+from lazy import lazy_import
+from metrics import REGISTRY
+from provider.cache_keys import KeyBuilder, build_cache_key, format_cache_key
+from provider.serializers import JsonSerializer, register_serializer, serializer_for
+from provider.single_flight import AsyncSingleFlight, SingleFlight
+
+if TYPE_CHECKING:
+    import asyncio
+    import pybreaker
+    import redis
+    import redis.asyncio as redis_asyncio
+
+    from provider.resilience import Breaker
+else:
+    # A conexão com o Redis (e o import do cliente) só acontece no primeiro
+    # uso do cache.
+    asyncio = lazy_import("asyncio")
+    pybreaker = lazy_import("pybreaker")
+    redis = lazy_import("redis")
+    redis_asyncio = lazy_import("redis.asyncio")
 
-load_dotenv()
+load_env()
+
+logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
-REDIS_HOST = os.getenv("REDIS_HOST")
-REDIS_PORT = os.getenv("REDIS_PORT")
-REDIS_DB = os.getenv("REDIS_DB")
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 REDIS_EXPIRY = 3600
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+REDIS_RETRY_INTERVAL = float(os.getenv("REDIS_RETRY_INTERVAL", "5"))
+CACHE_LOCK_POLL_INTERVAL = float(os.getenv("CACHE_LOCK_POLL_INTERVAL", "0.05"))
+# Chaves no formato anterior às chaves canônicas (prefix:name:<args>:<kwargs>):
+# num miss, a entrada antiga é lida e regravada na chave nova com o TTL que lhe
+# restava. Depois que as antigas expirarem, CACHE_LEGACY_KEYS=false poupa a
+# leitura extra.
+CACHE_LEGACY_KEYS = (os.getenv("CACHE_LEGACY_KEYS") or "true").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+
+# Remove a trava apenas se ela ainda pertence a quem a criou.
+_UNLOCK_SCRIPT = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('del', KEYS[1]) end return 0"
+)
+
+
+def _decode(key: str, value: Any) -> Any:
+    return serializer_for(key).loads(value)
+
+
+def _encode(key: str, value: Any) -> Optional[bytes]:
+    try:
+        return serializer_for(key).dumps(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _encode_many(mapping: Mapping[str, Any]) -> Dict[str, bytes]:
+    payloads = {}
+    for key, value in mapping.items():
+        payload = _encode(key, value)
+        if payload is not None:
+            payloads[key] = payload
+    return payloads
 
 
 class CacheClient:
     _instance = None
     _redis: Optional[redis.Redis] = None
+    _lock = threading.Lock()
+    _probe_lock: threading.Lock
+    _healthy: bool
+    _retry_at: float
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(CacheClient, cls).__new__(cls)
-            try:
-                cls._instance._redis = redis.Redis(
-                    host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True
-                )
-            except redis.ConnectionError:
-                cls._instance._redis = None
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(CacheClient, cls).__new__(cls)
+                    instance._healthy = False
+                    instance._retry_at = 0.0
+                    instance._probe_lock = threading.Lock()
+                    instance._connect()
+                    cls._instance = instance
         return cls._instance
 
+    def _connect(self) -> None:
+        try:
+            self._redis = redis.Redis(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                decode_responses=False,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            )
+        except redis.ConnectionError:
+            self._redis = None
+
+    def _mark_down(self) -> None:
+        self._healthy = False
+        self._retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+
     def get(self, key: str) -> Any:
         if not self._redis:
             return None
 
         try:
             value = self._redis.get(key)
-            if isinstance(value, (str, bytes, bytearray)):
-                return json.loads(value)
-            return None
         except Exception:
+            self._mark_down()
             return None
 
+        return _decode(key, value)
+
     def set(self, key: str, value: Any, expiry: int = REDIS_EXPIRY) -> bool:
         if not self._redis:
             return False
 
+        payload = _encode(key, value)
+        if payload is None:
+            return False
+
         try:
-            self._redis.setex(key, expiry, json.dumps(value))
+            self._redis.setex(key, expiry, payload)
             return True
         except Exception:
+            self._mark_down()
             return False
 
     def delete(self, key: str) -> bool:
@@ -60,54 +171,1142 @@ class CacheClient:
             self._redis.delete(key)
             return True
         except Exception:
+            self._mark_down()
+            return False
+
+    def get_many(self, keys: Sequence[str]) -> List[Any]:
+        if not self._redis or not keys:
+            return [None] * len(keys)
+
+        try:
+            values = self._redis.mget(keys)
+        except Exception:
+            self._mark_down()
+            return [None] * len(keys)
+
+        return [_decode(key, value) for key, value in zip(keys, values)]
+
+    def set_many(self, mapping: Mapping[str, Any], expiry: int = REDIS_EXPIRY) -> bool:
+        if not self._redis:
+            return False
+
+        payloads = _encode_many(mapping)
+        if not payloads:
+            return not mapping
+
+        try:
+            pipeline = self._redis.pipeline(transaction=False)
+            for key, payload in payloads.items():
+                pipeline.setex(key, expiry, payload)
+            pipeline.execute()
+            return len(payloads) == len(mapping)
+        except Exception:
+            self._mark_down()
             return False
 
+    def get_many_with_ttl(
+        self, keys: Sequence[str]
+    ) -> List[Tuple[Any, Optional[float]]]:
+        if not self._redis or not keys:
+            return [(None, None)] * len(keys)
+
+        try:
+            pipeline = self._redis.pipeline(transaction=False)
+            pipeline.mget(keys)
+            for key in keys:
+                pipeline.pttl(key)
+            values, *ttls = pipeline.execute()
+        except Exception:
+            self._mark_down()
+            return [(None, None)] * len(keys)
+
+        return [
+            (
+                _decode(key, value),
+                ttl / 1000 if ttl is not None and ttl >= 0 else None,
+            )
+            for key, value, ttl in zip(keys, values, ttls)
+        ]
+
+    def increment(self, key: str, fields: Mapping[str, int]) -> bool:
+        if not self._redis or not fields:
+            return False
+
+        try:
+            pipeline = self._redis.pipeline(transaction=False)
+            for field, amount in fields.items():
+                pipeline.hincrby(key, field, amount)
+            pipeline.execute()
+            return True
+        except Exception:
+            self._mark_down()
+            return False
+
+    def get_counts(self, key: str) -> Dict[str, int]:
+        if not self._redis:
+            return {}
+
+        try:
+            counts = self._redis.hgetall(key)
+        except Exception:
+            self._mark_down()
+            return {}
+
+        return {
+            (field.decode() if isinstance(field, bytes) else field): int(value)
+            for field, value in counts.items()
+        }
+
+    def append_capped(self, key: str, value: Any, max_length: int) -> bool:
+        # Lista circular: guarda só os max_length valores mais recentes.
+        if not self._redis:
+            return False
+
+        payload = _encode(key, value)
+        if payload is None:
+            return False
+
+        try:
+            pipeline = self._redis.pipeline(transaction=False)
+            pipeline.lpush(key, payload)
+            pipeline.ltrim(key, 0, max_length - 1)
+            pipeline.execute()
+            return True
+        except Exception:
+            self._mark_down()
+            return False
+
+    def get_list(self, key: str, limit: int = -1) -> List[Any]:
+        if not self._redis:
+            return []
+
+        try:
+            payloads = self._redis.lrange(key, 0, limit - 1 if limit > 0 else -1)
+        except Exception:
+            self._mark_down()
+            return []
+
+        return [_decode(key, payload) for payload in payloads]
+
+    def try_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if not self._redis:
+            return token
+
+        try:
+            acquired = self._redis.set(key, token, nx=True, px=int(ttl * 1000))
+        except Exception:
+            self._mark_down()
+            return token
+
+        return token if acquired else None
+
+    def unlock(self, key: str, token: str) -> None:
+        if not self._redis:
+            return
+
+        try:
+            self._redis.eval(_UNLOCK_SCRIPT, 1, key, token)
+        except Exception:
+            self._mark_down()
+
     def is_available(self) -> bool:
+        if self._healthy:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        return self._probe()
+
+    def _probe(self) -> bool:
+        # Só uma thread testa a conexão; as demais seguem sem cache até lá.
+        if not self._probe_lock.acquire(blocking=False):
+            return False
+        try:
+            self._retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+            if not self._redis:
+                self._connect()
+            if not self._redis:
+                return False
+            try:
+                self._healthy = bool(self._redis.ping())
+            except Exception:
+                self._healthy = False
+            return self._healthy
+        finally:
+            self._probe_lock.release()
+
+
+class AsyncCacheClient:
+    # Um cliente por event loop: as conexões do redis.asyncio ficam presas ao
+    # loop em que foram abertas.
+    _instances: weakref.WeakKeyDictionary[
+        asyncio.AbstractEventLoop, AsyncCacheClient
+    ] = weakref.WeakKeyDictionary()
+    _redis: Optional[redis_asyncio.Redis] = None
+    _lock = threading.Lock()
+    _probing: bool
+    _healthy: bool
+    _retry_at: float
+
+    def __new__(cls):
+        loop = asyncio.get_running_loop()
+        instance = cls._instances.get(loop)
+        if instance is None:
+            with cls._lock:
+                instance = cls._instances.get(loop)
+                if instance is None:
+                    instance = super(AsyncCacheClient, cls).__new__(cls)
+                    instance._healthy = False
+                    instance._retry_at = 0.0
+                    instance._probing = False
+                    instance._connect()
+                    cls._instances[loop] = instance
+        return instance
+
+    def _connect(self) -> None:
+        try:
+            self._redis = redis_asyncio.Redis(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                decode_responses=False,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            )
+        except redis.ConnectionError:
+            self._redis = None
+
+    def _mark_down(self) -> None:
+        self._healthy = False
+        self._retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+
+    async def get(self, key: str) -> Any:
+        if not self._redis:
+            return None
+
+        try:
+            value = await self._redis.get(key)
+        except Exception:
+            self._mark_down()
+            return None
+
+        return _decode(key, value)
+
+    async def set(self, key: str, value: Any, expiry: int = REDIS_EXPIRY) -> bool:
+        if not self._redis:
+            return False
+
+        payload = _encode(key, value)
+        if payload is None:
+            return False
+
+        try:
+            await self._redis.setex(key, expiry, payload)
+            return True
+        except Exception:
+            self._mark_down()
+            return False
+
+    async def delete(self, key: str) -> bool:
+        if not self._redis:
+            return False
+
+        try:
+            await self._redis.delete(key)
+            return True
+        except Exception:
+            self._mark_down()
+            return False
+
+    async def get_many(self, keys: Sequence[str]) -> List[Any]:
+        if not self._redis or not keys:
+            return [None] * len(keys)
+
+        try:
+            values = await self._redis.mget(keys)
+        except Exception:
+            self._mark_down()
+            return [None] * len(keys)
+
+        return [_decode(key, value) for key, value in zip(keys, values)]
+
+    async def set_many(
+        self, mapping: Mapping[str, Any], expiry: int = REDIS_EXPIRY
+    ) -> bool:
         if not self._redis:
             return False
 
+        payloads = _encode_many(mapping)
+        if not payloads:
+            return not mapping
+
+        try:
+            pipeline = self._redis.pipeline(transaction=False)
+            for key, payload in payloads.items():
+                pipeline.setex(key, expiry, payload)
+            await pipeline.execute()
+            return len(payloads) == len(mapping)
+        except Exception:
+            self._mark_down()
+            return False
+
+    async def get_many_with_ttl(
+        self, keys: Sequence[str]
+    ) -> List[Tuple[Any, Optional[float]]]:
+        if not self._redis or not keys:
+            return [(None, None)] * len(keys)
+
+        try:
+            pipeline = self._redis.pipeline(transaction=False)
+            pipeline.mget(keys)
+            for key in keys:
+                pipeline.pttl(key)
+            values, *ttls = await pipeline.execute()
+        except Exception:
+            self._mark_down()
+            return [(None, None)] * len(keys)
+
+        return [
+            (
+                _decode(key, value),
+                ttl / 1000 if ttl is not None and ttl >= 0 else None,
+            )
+            for key, value, ttl in zip(keys, values, ttls)
+        ]
+
+    async def try_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if not self._redis:
+            return token
+
+        try:
+            acquired = await self._redis.set(key, token, nx=True, px=int(ttl * 1000))
+        except Exception:
+            self._mark_down()
+            return token
+
+        return token if acquired else None
+
+    async def unlock(self, key: str, token: str) -> None:
+        if not self._redis:
+            return
+
         try:
-            return bool(self._redis.ping())
+            await self._redis.eval(_UNLOCK_SCRIPT, 1, key, token)
         except Exception:
+            self._mark_down()
+
+    async def is_available(self) -> bool:
+        if self._healthy:
+            return True
+        if self._probing or time.monotonic() < self._retry_at:
             return False
 
+        self._probing = True
+        try:
+            self._retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+            if not self._redis:
+                self._connect()
+            if not self._redis:
+                return False
+            try:
+                self._healthy = bool(await self._redis.ping())
+            except Exception:
+                self._healthy = False
+            return self._healthy
+        finally:
+            self._probing = False
+
+
+class LocalCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheStats:
+    def __init__(self):
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tier: str, outcome: str) -> None:
+        with self._lock:
+            self._counts[(tier, outcome)] = self._counts.get((tier, outcome), 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                tier: {
+                    "hits": self._counts.get((tier, "hits"), 0),
+                    "misses": self._counts.get((tier, "misses"), 0),
+                }
+                for tier in ("l1", "l2")
+            }
+
+
+_registry_lock = threading.Lock()
+_local_caches: Dict[str, LocalCache] = {}
+_stats: Dict[str, CacheStats] = {}
+
+
+def _get_stats(prefix: str) -> CacheStats:
+    stats = _stats.get(prefix)
+    if stats is None:
+        with _registry_lock:
+            stats = _stats.setdefault(prefix, CacheStats())
+    return stats
+
+
+def configure_local_cache(prefix: str, max_entries: int, ttl: float) -> LocalCache:
+    with _registry_lock:
+        local_cache = _local_caches.get(prefix)
+        if local_cache is None:
+            local_cache = _local_caches[prefix] = LocalCache(max_entries, ttl)
+        else:
+            local_cache.max_entries = max_entries
+            local_cache.ttl = ttl
+        return local_cache
+
+
+def clear_local_caches() -> None:
+    with _registry_lock:
+        local_caches = list(_local_caches.values())
+    for local_cache in local_caches:
+        local_cache.clear()
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Dict[str, int]]]:
+    with _registry_lock:
+        prefixes = list(_stats)
+    return {prefix: _stats[prefix].snapshot() for prefix in prefixes}
+
+
+def _cache_lookup_counts() -> Dict[Tuple[str, ...], float]:
+    outcomes = {"hits": "hit", "misses": "miss"}
+    return {
+        (prefix, tier, outcomes[outcome]): count
+        for prefix, tiers in get_cache_stats().items()
+        for tier, counts in tiers.items()
+        for outcome, count in counts.items()
+    }
+
+
+REGISTRY.counter(
+    "cache_lookups_total",
+    "Cache lookups by prefix, tier and outcome.",
+    ("prefix", "tier", "outcome"),
+    collect=_cache_lookup_counts,
+)
+
+
+def get_cached(prefix: str, key: str) -> Any:
+    stats = _get_stats(prefix)
+    local_cache = _local_caches.get(prefix)
+    if local_cache is not None:
+        value = local_cache.get(key)
+        if value is not None:
+            stats.record("l1", "hits")
+            return value
+        stats.record("l1", "misses")
+
+    cache_client = CacheClient()
+    if not cache_client.is_available():
+        return None
+
+    value = cache_client.get(key)
+    if value is None:
+        stats.record("l2", "misses")
+        return None
+
+    stats.record("l2", "hits")
+    if local_cache is not None:
+        local_cache.set(key, value)
+    return value
+
+
+def set_cached(prefix: str, key: str, value: Any, expiry: int = REDIS_EXPIRY) -> None:
+    local_cache = _local_caches.get(prefix)
+    if local_cache is not None:
+        local_cache.set(key, value)
+
+    cache_client = CacheClient()
+    if cache_client.is_available():
+        cache_client.set(key, value, expiry)
+
+
+def get_cached_many(prefix: str, keys: Sequence[str]) -> Dict[str, Any]:
+    stats = _get_stats(prefix)
+    local_cache = _local_caches.get(prefix)
+    found: Dict[str, Any] = {}
+    if local_cache is not None:
+        for key in keys:
+            value = local_cache.get(key)
+            if value is not None:
+                found[key] = value
+                stats.record("l1", "hits")
+            else:
+                stats.record("l1", "misses")
+
+    missing = [key for key in keys if key not in found]
+    cache_client = CacheClient()
+    if not missing or not cache_client.is_available():
+        return found
+
+    for key, value in zip(missing, cache_client.get_many(missing)):
+        if value is None:
+            stats.record("l2", "misses")
+            continue
+        stats.record("l2", "hits")
+        found[key] = value
+        if local_cache is not None:
+            local_cache.set(key, value)
+    return found
+
+
+def set_cached_many(
+    prefix: str, mapping: Mapping[str, Any], expiry: int = REDIS_EXPIRY
+) -> None:
+    local_cache = _local_caches.get(prefix)
+    if local_cache is not None:
+        for key, value in mapping.items():
+            local_cache.set(key, value)
+
+    cache_client = CacheClient()
+    if mapping and cache_client.is_available():
+        cache_client.set_many(mapping, expiry)
+
+
+def get_cached_entries(
+    prefix: str, keys: Sequence[str]
+) -> Dict[str, Tuple[Any, Optional[float]]]:
+    # Como get_cached_many, mas devolve também o TTL restante no Redis
+    # (None para acertos no L1) e não preenche o L1 sozinho.
+    stats = _get_stats(prefix)
+    local_cache = _local_caches.get(prefix)
+    found: Dict[str, Tuple[Any, Optional[float]]] = {}
+    if local_cache is not None:
+        for key in keys:
+            value = local_cache.get(key)
+            if value is not None:
+                found[key] = (value, None)
+                stats.record("l1", "hits")
+            else:
+                stats.record("l1", "misses")
+
+    missing = [key for key in keys if key not in found]
+    cache_client = CacheClient()
+    if not missing or not cache_client.is_available():
+        return found
+
+    for key, entry in zip(missing, cache_client.get_many_with_ttl(missing)):
+        if entry[0] is None:
+            stats.record("l2", "misses")
+            continue
+        stats.record("l2", "hits")
+        found[key] = entry
+    return found
+
+
+async def get_cached_entries_async(
+    prefix: str, keys: Sequence[str]
+) -> Dict[str, Tuple[Any, Optional[float]]]:
+    stats = _get_stats(prefix)
+    local_cache = _local_caches.get(prefix)
+    found: Dict[str, Tuple[Any, Optional[float]]] = {}
+    if local_cache is not None:
+        for key in keys:
+            value = local_cache.get(key)
+            if value is not None:
+                found[key] = (value, None)
+                stats.record("l1", "hits")
+            else:
+                stats.record("l1", "misses")
+
+    missing = [key for key in keys if key not in found]
+    cache_client = AsyncCacheClient()
+    if not missing or not await cache_client.is_available():
+        return found
+
+    entries = await cache_client.get_many_with_ttl(missing)
+    for key, entry in zip(missing, entries):
+        if entry[0] is None:
+            stats.record("l2", "misses")
+            continue
+        stats.record("l2", "hits")
+        found[key] = entry
+    return found
+
+
+def _legacy_ttl(remaining: Optional[float], expiry: int) -> int:
+    return expiry if remaining is None else max(1, math.ceil(remaining))
+
+
+def migrate_legacy_entries(
+    legacy_keys: Mapping[str, str], expiry: int
+) -> Dict[str, Tuple[Any, Optional[float]]]:
+    # legacy_keys: chave nova -> chave antiga. Devolve, pela chave nova, as
+    # entradas encontradas no formato antigo (já regravadas no novo).
+    if not CACHE_LEGACY_KEYS or not legacy_keys:
+        return {}
+    cache_client = CacheClient()
+    if not cache_client.is_available():
+        return {}
+
+    keys = list(legacy_keys)
+    found: Dict[str, Tuple[Any, Optional[float]]] = {}
+    entries = cache_client.get_many_with_ttl([legacy_keys[key] for key in keys])
+    for key, (value, remaining) in zip(keys, entries):
+        if value is None:
+            continue
+        cache_client.set(key, value, _legacy_ttl(remaining, expiry))
+        found[key] = (value, remaining)
+    return found
+
+
+async def migrate_legacy_entries_async(
+    legacy_keys: Mapping[str, str], expiry: int
+) -> Dict[str, Tuple[Any, Optional[float]]]:
+    if not CACHE_LEGACY_KEYS or not legacy_keys:
+        return {}
+    cache_client = AsyncCacheClient()
+    if not await cache_client.is_available():
+        return {}
+
+    keys = list(legacy_keys)
+    found: Dict[str, Tuple[Any, Optional[float]]] = {}
+    entries = await cache_client.get_many_with_ttl([legacy_keys[key] for key in keys])
+    for key, (value, remaining) in zip(keys, entries):
+        if value is None:
+            continue
+        await cache_client.set(key, value, _legacy_ttl(remaining, expiry))
+        found[key] = (value, remaining)
+    return found
+
+
+async def get_cached_async(prefix: str, key: str) -> Any:
+    stats = _get_stats(prefix)
+    local_cache = _local_caches.get(prefix)
+    if local_cache is not None:
+        value = local_cache.get(key)
+        if value is not None:
+            stats.record("l1", "hits")
+            return value
+        stats.record("l1", "misses")
+
+    cache_client = AsyncCacheClient()
+    if not await cache_client.is_available():
+        return None
+
+    value = await cache_client.get(key)
+    if value is None:
+        stats.record("l2", "misses")
+        return None
+
+    stats.record("l2", "hits")
+    if local_cache is not None:
+        local_cache.set(key, value)
+    return value
+
+
+async def set_cached_async(
+    prefix: str, key: str, value: Any, expiry: int = REDIS_EXPIRY
+) -> None:
+    local_cache = _local_caches.get(prefix)
+    if local_cache is not None:
+        local_cache.set(key, value)
+
+    cache_client = AsyncCacheClient()
+    if await cache_client.is_available():
+        await cache_client.set(key, value, expiry)
+
+
+_single_flight = SingleFlight()
+_async_single_flight = AsyncSingleFlight()
+
+
+def _load_with_lock(
+    prefix: str,
+    key: str,
+    lock_timeout: float,
+    compute: Callable[[], T],
+    policy: Optional[StalePolicy] = None,
+) -> T:
+    cache_client = CacheClient()
+    if not cache_client.is_available():
+        return compute()
+
+    lock_key = f"{key}:lock"
+    token = cache_client.try_lock(lock_key, lock_timeout)
+    if token is None:
+        # Outro processo está buscando o mesmo valor: espera ele preencher o cache.
+        # Um valor EXPIRED (guardado só para o circuito aberto) não conta.
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(CACHE_LOCK_POLL_INTERVAL)
+            value, remaining = cache_client.get_many_with_ttl([key])[0]
+            if _filled(policy, value, remaining):
+                _set_local(prefix, key, value)
+                return value
+        return compute()
+
+    try:
+        return compute()
+    finally:
+        cache_client.unlock(lock_key, token)
+
+
+async def _load_with_lock_async(
+    prefix: str,
+    key: str,
+    lock_timeout: float,
+    compute: Callable[[], Awaitable[Any]],
+    policy: Optional[StalePolicy] = None,
+) -> Any:
+    cache_client = AsyncCacheClient()
+    if not await cache_client.is_available():
+        return await compute()
+
+    lock_key = f"{key}:lock"
+    token = await cache_client.try_lock(lock_key, lock_timeout)
+    if token is None:
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(CACHE_LOCK_POLL_INTERVAL)
+            value, remaining = (await cache_client.get_many_with_ttl([key]))[0]
+            if _filled(policy, value, remaining):
+                _set_local(prefix, key, value)
+                return value
+        return await compute()
+
+    try:
+        return await compute()
+    finally:
+        await cache_client.unlock(lock_key, token)
+
+
+def _filled(
+    policy: Optional[StalePolicy], value: Any, remaining: Optional[float]
+) -> bool:
+    if value is None:
+        return False
+    return policy is None or policy.freshness(remaining) != EXPIRED
+
+
+def _set_local(prefix: str, key: str, value: Any) -> None:
+    local_cache = _local_caches.get(prefix)
+    if local_cache is not None:
+        local_cache.set(key, value)
+
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+
+
+class StalePolicy:
+    # stale_after: idade (s) a partir da qual o valor é servido e renovado em
+    # segundo plano. stale_if_error: tempo extra (s) após o expiry em que o
+    # valor só é servido se o circuit breaker estiver aberto.
+    def __init__(
+        self,
+        expiry: int,
+        stale_after: Optional[int] = None,
+        stale_if_error: int = 0,
+        breaker: Optional[Breaker] = None,
+    ):
+        self.expiry = expiry
+        self.stale_after = stale_after
+        self.stale_if_error = stale_if_error
+        self.breaker = breaker
+
+    @property
+    def enabled(self) -> bool:
+        return self.stale_after is not None or self.stale_if_error > 0
+
+    @property
+    def storage_expiry(self) -> int:
+        return self.expiry + self.stale_if_error
+
+    def freshness(self, remaining: Optional[float]) -> str:
+        if remaining is None:
+            return FRESH
+        age = self.storage_expiry - remaining
+        if age >= self.expiry:
+            return EXPIRED
+        if self.stale_after is not None and age >= self.stale_after:
+            return STALE
+        return FRESH
+
+    def can_refresh(self) -> bool:
+        return (
+            self.breaker is None or self.breaker.current_state != pybreaker.STATE_OPEN
+        )
+
+
+CACHE_REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", "2"))
+
+_refresh_lock = threading.Lock()
+_refreshing: Set[str] = set()
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_tasks: Set["asyncio.Task[Any]"] = set()
+
+
+def _start_refresh(key: str) -> bool:
+    with _refresh_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+        return True
+
+
+def _finish_refresh(key: str) -> None:
+    with _refresh_lock:
+        _refreshing.discard(key)
+
+
+def _refresh_in_background(key: str, compute: Callable[[], Any]) -> None:
+    global _refresh_executor
+
+    if not _start_refresh(key):
+        return
+
+    def run() -> None:
+        try:
+            compute()
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            _finish_refresh(key)
+
+    with _refresh_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=CACHE_REFRESH_WORKERS, thread_name_prefix="cache-refresh"
+            )
+        executor = _refresh_executor
+    executor.submit(run)
+
+
+def _refresh_in_background_async(
+    key: str, compute: Callable[[], Awaitable[Any]]
+) -> None:
+    if not _start_refresh(key):
+        return
+
+    async def run() -> None:
+        try:
+            await compute()
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            _finish_refresh(key)
+
+    task = asyncio.get_running_loop().create_task(run())
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
 
 def cached(
-    prefix: str, expiry: int = REDIS_EXPIRY
+    prefix: str,
+    expiry: int = REDIS_EXPIRY,
+    l1_max_entries: Optional[int] = None,
+    l1_ttl: Optional[float] = None,
+    coalesce: bool = True,
+    lock_timeout: Optional[float] = None,
+    stale_after: Optional[int] = None,
+    stale_if_error: int = 0,
+    breaker: Optional[Breaker] = None,
+    serializer: Optional[JsonSerializer] = None,
+    key_builder: Optional[KeyBuilder] = None,
+    cache_if: Optional[Callable[[Any], bool]] = None,
+    key_name: Optional[str] = None,
+    legacy_keys: bool = False,
 ) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    # legacy_keys: num miss, procura também a chave no formato antigo (sem
+    # key_builder) e a migra; ver CACHE_LEGACY_KEYS.
+    policy = StalePolicy(expiry, stale_after, stale_if_error, breaker)
+    if serializer is not None:
+        register_serializer(prefix, serializer)
+
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        migrate_legacy = legacy_keys and key_builder is not None
+
+        def legacy_key(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+            return build_cache_key(prefix, func, args, kwargs, None, key_name)
+
+        if l1_max_entries:
+            configure_local_cache(
+                prefix, l1_max_entries, l1_ttl if l1_ttl is not None else expiry
+            )
+
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> T:
-            cache_client = CacheClient()
+            cache_key = build_cache_key(
+                prefix, func, args, kwargs, key_builder, key_name
+            )
 
-            if not cache_client.is_available():
-                return func(*args, **kwargs)
+            def compute() -> T:
+                result = func(*args, **kwargs)
+                if cache_if is None or cache_if(result):
+                    set_cached(prefix, cache_key, result, policy.storage_expiry)
+                return result
 
-            cache_key = f"{prefix}:{func.__name__}:"
+            def load() -> T:
+                if lock_timeout:
+                    return _load_with_lock(
+                        prefix, cache_key, lock_timeout, compute, policy
+                    )
+                return compute()
 
-            if (
-                args
-                and hasattr(args[0], "__class__")
-                and args[0].__class__.__name__ in func.__qualname__
-            ):
-                key_args = args[1:]
+            fallback = None
+            if policy.enabled:
+                entry = get_cached_entries(prefix, [cache_key]).get(cache_key)
+                if entry is None and migrate_legacy:
+                    entry = migrate_legacy_entries(
+                        {cache_key: legacy_key(args, kwargs)}, policy.storage_expiry
+                    ).get(cache_key)
+                if entry is not None:
+                    value, remaining = entry
+                    freshness = policy.freshness(remaining)
+                    if freshness == EXPIRED:
+                        fallback = value
+                    else:
+                        _fill_local_cache(prefix, cache_key, value, remaining)
+                        if freshness == STALE and policy.can_refresh():
+                            _refresh_in_background(cache_key, compute)
+                        return value
             else:
-                key_args = args
+                cached_result = get_cached(prefix, cache_key)
+                if cached_result is not None:
+                    return cached_result
+                if migrate_legacy:
+                    entry = migrate_legacy_entries(
+                        {cache_key: legacy_key(args, kwargs)}, policy.storage_expiry
+                    ).get(cache_key)
+                    if entry is not None:
+                        _fill_local_cache(prefix, cache_key, *entry)
+                        return entry[0]
 
-            args_str = str(key_args)
-            kwargs_str = str(sorted(kwargs.items()))
-            cache_key += f"{args_str}:{kwargs_str}"
+            try:
+                if coalesce:
+                    return cast(T, _single_flight.do(cache_key, load))
+                return load()
+            except pybreaker.CircuitBreakerError:
+                if fallback is None:
+                    raise
+                return fallback
 
-            cached_result = cache_client.get(cache_key)
-            if cached_result is not None:
-                return cached_result
+        coroutine = cast(Callable[..., Awaitable[Any]], func)
 
-            result = func(*args, **kwargs)
+        @wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            cache_key = build_cache_key(
+                prefix, func, args, kwargs, key_builder, key_name
+            )
 
-            cache_client.set(cache_key, result, expiry)
+            async def compute() -> Any:
+                result = await coroutine(*args, **kwargs)
+                if cache_if is None or cache_if(result):
+                    await set_cached_async(
+                        prefix, cache_key, result, policy.storage_expiry
+                    )
+                return result
 
-            return result
+            async def load() -> Any:
+                if lock_timeout:
+                    return await _load_with_lock_async(
+                        prefix, cache_key, lock_timeout, compute, policy
+                    )
+                return await compute()
+
+            fallback = None
+            if policy.enabled:
+                entries = await get_cached_entries_async(prefix, [cache_key])
+                entry = entries.get(cache_key)
+                if entry is None and migrate_legacy:
+                    migrated = await migrate_legacy_entries_async(
+                        {cache_key: legacy_key(args, kwargs)}, policy.storage_expiry
+                    )
+                    entry = migrated.get(cache_key)
+                if entry is not None:
+                    value, remaining = entry
+                    freshness = policy.freshness(remaining)
+                    if freshness == EXPIRED:
+                        fallback = value
+                    else:
+                        _fill_local_cache(prefix, cache_key, value, remaining)
+                        if freshness == STALE and policy.can_refresh():
+                            _refresh_in_background_async(cache_key, compute)
+                        return value
+            else:
+                cached_result = await get_cached_async(prefix, cache_key)
+                if cached_result is not None:
+                    return cached_result
+                if migrate_legacy:
+                    migrated = await migrate_legacy_entries_async(
+                        {cache_key: legacy_key(args, kwargs)}, policy.storage_expiry
+                    )
+                    if cache_key in migrated:
+                        _fill_local_cache(prefix, cache_key, *migrated[cache_key])
+                        return migrated[cache_key][0]
+
+            try:
+                if coalesce:
+                    return await _async_single_flight.do(cache_key, load)
+                return await load()
+            except pybreaker.CircuitBreakerError:
+                if fallback is None:
+                    raise
+                return fallback
 
+        if inspect.iscoroutinefunction(func):
+            return cast(Callable[..., T], async_wrapper)
         return cast(Callable[..., T], wrapper)
 
     return decorator
+
+
+def _fill_local_cache(
+    prefix: str, key: str, value: Any, remaining: Optional[float]
+) -> None:
+    local_cache = _local_caches.get(prefix)
+    if local_cache is not None and remaining is not None:
+        local_cache.set(key, value)
+
+
+def cached_many(
+    prefix: str,
+    key_name: str,
+    expiry: int = REDIS_EXPIRY,
+    stale_after: Optional[int] = None,
+    stale_if_error: int = 0,
+    breaker: Optional[Breaker] = None,
+    serializer: Optional[JsonSerializer] = None,
+    key_builder: Optional[KeyBuilder] = None,
+    legacy_keys: bool = False,
+) -> Callable[[Callable[..., Dict[Any, Any]]], Callable[..., Dict[Any, Any]]]:
+    # O último argumento posicional é a lista de itens; o resultado é um
+    # dicionário item -> valor. Exceções no resultado não vão para o cache.
+    policy = StalePolicy(expiry, stale_after, stale_if_error, breaker)
+    if serializer is not None:
+        register_serializer(prefix, serializer)
+
+    def decorator(func: Callable[..., Dict[Any, Any]]) -> Callable[..., Dict[Any, Any]]:
+        def fetch(
+            head: List[Any],
+            items: List[Any],
+            kwargs: Dict[str, Any],
+            keys: Dict[Any, str],
+        ) -> Dict[Any, Any]:
+            fetched = func(*head, items, **kwargs)
+            set_cached_many(
+                prefix,
+                {
+                    keys[item]: value
+                    for item, value in fetched.items()
+                    if item in keys
+                    and value is not None
+                    and not isinstance(value, BaseException)
+                },
+                policy.storage_expiry,
+            )
+            return fetched
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Dict[Any, Any]:
+            *head, items = args
+            keys = {
+                item: format_cache_key(prefix, key_name, (item,), {}, key_builder)
+                for item in dict.fromkeys(items)
+            }
+
+            if policy.enabled:
+                entries = get_cached_entries(prefix, list(keys.values()))
+            else:
+                entries = {
+                    key: (value, None)
+                    for key, value in get_cached_many(
+                        prefix, list(keys.values())
+                    ).items()
+                }
+            if legacy_keys and key_builder is not None:
+                entries.update(
+                    migrate_legacy_entries(
+                        {
+                            key: format_cache_key(prefix, key_name, (item,), {})
+                            for item, key in keys.items()
+                            if key not in entries
+                        },
+                        policy.storage_expiry,
+                    )
+                )
+            results: Dict[Any, Any] = {}
+            fallbacks: Dict[Any, Any] = {}
+            stale: List[Any] = []
+            for item, key in keys.items():
+                if key not in entries:
+                    continue
+                value, remaining = entries[key]
+                freshness = policy.freshness(remaining)
+                if freshness == EXPIRED:
+                    fallbacks[item] = value
+                    continue
+                _fill_local_cache(prefix, key, value, remaining)
+                results[item] = value
+                if freshness == STALE:
+                    stale.append(item)
+
+            if stale and policy.can_refresh():
+                refresh_key = f"{prefix}:{key_name}:many:{stale!r}"
+                _refresh_in_background(
+                    refresh_key, lambda: fetch(head, stale, kwargs, keys)
+                )
+
+            missing = [item for item in keys if item not in results]
+            if missing:
+                fetched = fetch(head, missing, kwargs, keys)
+                for item, value in fetched.items():
+                    if (
+                        isinstance(value, pybreaker.CircuitBreakerError)
+                        and item in fallbacks
+                    ):
+                        value = fallbacks[item]
+                    results[item] = value
+
+            return {item: results[item] for item in keys if item in results}
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,75 @@
+import hashlib
+import inspect
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import load_env
+
+from validation import Validation
+
+load_env()
+
+# 6 casas decimais ~ 0,1 m: absorve ruído de ponto flutuante sem juntar endereços
+CACHE_COORDINATE_PRECISION = int(os.getenv("CACHE_COORDINATE_PRECISION", "6"))
+
+KeyBuilder = Callable[..., Tuple[Any, ...]]
+
+
+@lru_cache(maxsize=None)
+def _is_method(func: Callable[..., Any]) -> bool:
+    try:
+        parameters = list(inspect.signature(func).parameters)
+    except (TypeError, ValueError):
+        return False
+    return bool(parameters) and parameters[0] in ("self", "cls")
+
+
+def build_cache_key(
+    prefix: str,
+    func: Callable[..., Any],
+    args: Tuple[Any, ...],
+    kwargs: Dict[str, Any],
+    key_builder: Optional[KeyBuilder] = None,
+    key_name: Optional[str] = None,
+) -> str:
+    key_args = args[1:] if args and _is_method(func) else args
+    return format_cache_key(
+        prefix, key_name or func.__name__, key_args, kwargs, key_builder
+    )
+
+
+def format_cache_key(
+    prefix: str,
+    name: str,
+    key_args: Tuple[Any, ...],
+    kwargs: Dict[str, Any],
+    key_builder: Optional[KeyBuilder] = None,
+) -> str:
+    if key_builder is not None:
+        parts = repr(key_builder(*key_args, **kwargs)).encode()
+        digest = hashlib.blake2b(parts, digest_size=12).hexdigest()
+        return f"{prefix}:{name}:{digest}"
+
+    args_str = str(key_args)
+    kwargs_str = str(sorted(kwargs.items()))
+    return f"{prefix}:{name}:{args_str}:{kwargs_str}"
+
+
+def cep_key(cep: str) -> Tuple[Any, ...]:
+    return (Validation.normalize_cep(cep),)
+
+
+def cep_pair_key(
+    origin_cep: str, destination_cep: str, *args: Any, **kwargs: Any
+) -> Tuple[Any, ...]:
+    return Validation.normalize_cep(origin_cep), Validation.normalize_cep(
+        destination_cep
+    )
+
+
+def coordinates_key(*coordinates: float) -> Tuple[Any, ...]:
+    # round() pode devolver -0.0; somar 0.0 normaliza o sinal do zero
+    return tuple(
+        round(float(value), CACHE_COORDINATE_PRECISION) + 0.0 for value in coordinates
+    )
@@ -1,7 +1,59 @@
 from abc import ABC, abstractmethod
+from typing import Dict, Sequence, Union
+
+from concurrency import BATCH_MAX_WORKERS, run_concurrently
+from exceptions import CepNotFoundError
+from model.cep import CepRecord
 
 
 class CepProvider(ABC):
     @abstractmethod
     def get_cep_data(self, cep: str) -> dict:
         pass
+
+    def get_cep_record(self, cep: str) -> CepRecord:
+        return CepRecord.from_cep_data(cep, self.get_cep_data(cep))
+
+    def get_cep_data_many(
+        self, ceps: Sequence[str], max_workers: int = BATCH_MAX_WORKERS
+    ) -> Dict[str, Union[dict, Exception]]:
+        return run_concurrently(self.get_cep_data, ceps, max_workers)
+
+
+class TieredCepProvider(CepProvider):
+    # Consulta os provedores em ordem; só passa adiante os CEPs não encontrados.
+    def __init__(self, *providers: CepProvider):
+        if not providers:
+            raise ValueError("At least one CEP provider is required.")
+        self._providers = providers
+
+    def get_cep_data(self, cep: str) -> dict:
+        for provider in self._providers[:-1]:
+            try:
+                return provider.get_cep_data(cep)
+            except CepNotFoundError:
+                continue
+        return self._providers[-1].get_cep_data(cep)
+
+    def get_cep_data_many(
+        self, ceps: Sequence[str], max_workers: int = BATCH_MAX_WORKERS
+    ) -> Dict[str, Union[dict, Exception]]:
+        results: Dict[str, Union[dict, Exception]] = {}
+        pending = list(dict.fromkeys(ceps))
+        for provider in self._providers:
+            if not pending:
+                break
+            found = provider.get_cep_data_many(pending, max_workers=max_workers)
+            results.update(found)
+            if provider is self._providers[-1]:
+                break
+            pending = [
+                cep for cep in pending if isinstance(found.get(cep), CepNotFoundError)
+            ]
+        return {cep: results[cep] for cep in ceps if cep in results}
+
+
+class AsyncCepProvider(ABC):
+    @abstractmethod
+    async def get_cep_data(self, cep: str) -> dict:
+        pass
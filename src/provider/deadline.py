@@ -0,0 +1,49 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from exceptions import DeadlineExceededError
+
+# Instante (time.monotonic) em que a requisição atual deixa de valer a pena.
+# Vive num ContextVar para atravessar decorators, threads e tasks sem mudar
+# a assinatura dos provedores.
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "deadline", default=None
+)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    # Um prazo aninhado nunca estende o prazo de quem chamou.
+    if not seconds or seconds <= 0:
+        yield
+        return
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        expires_at = min(expires_at, current)
+    token = _deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+    return expires_at - time.monotonic()
+
+
+def check_deadline() -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceededError("Request deadline exceeded.")
+
+
+def cap_timeout(timeout: float) -> float:
+    check_deadline()
+    left = remaining()
+    return timeout if left is None else min(timeout, left)
@@ -1,4 +1,36 @@
+import logging
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+from exceptions import ExternalAPIError
+from lazy import lazy_import
+
+if TYPE_CHECKING:
+    import pybreaker
+else:
+    pybreaker = lazy_import("pybreaker")
+
+logger = logging.getLogger(__name__)
+
+Coordinate = Tuple[float, float]
+
+
+class Distance(float):
+    # Distância em km que lembra quem a calculou; estimated indica que não
+    # veio de um roteador (ex.: linha reta com fator de desvio).
+    provider: str
+    estimated: bool
+
+    def __new__(
+        cls, value: float, provider: str, estimated: bool = False
+    ) -> "Distance":
+        distance = super().__new__(cls, value)
+        distance.provider = provider
+        distance.estimated = estimated
+        return distance
+
+    def __reduce__(self):
+        return Distance, (float(self), self.provider, self.estimated)
 
 
 class DistanceProvider(ABC):
@@ -7,3 +39,52 @@ class DistanceProvider(ABC):
         self, origin_lon: float, origin_lat: float, dest_lon: float, dest_lat: float
     ) -> float:
         pass
+
+    def get_distance_matrix(
+        self, sources: Sequence[Coordinate], destinations: Sequence[Coordinate]
+    ) -> List[List[Optional[float]]]:
+        return [
+            [
+                self.get_distance(origin_lon, origin_lat, dest_lon, dest_lat)
+                for dest_lon, dest_lat in destinations
+            ]
+            for origin_lon, origin_lat in sources
+        ]
+
+
+class FallbackDistanceProvider(DistanceProvider):
+    # Modo degradado: se o provedor principal falhar ou estiver com o circuito
+    # aberto, responde com o provedor reserva (normalmente uma estimativa).
+    def __init__(self, primary: DistanceProvider, fallback: DistanceProvider):
+        self._primary = primary
+        self._fallback = fallback
+
+    def get_distance(
+        self, origin_lon: float, origin_lat: float, dest_lon: float, dest_lat: float
+    ) -> float:
+        try:
+            return self._primary.get_distance(
+                origin_lon, origin_lat, dest_lon, dest_lat
+            )
+        except (ExternalAPIError, pybreaker.CircuitBreakerError) as e:
+            logger.warning(f"Distance provider degraded, using fallback: {e}")
+            return self._fallback.get_distance(
+                origin_lon, origin_lat, dest_lon, dest_lat
+            )
+
+    def get_distance_matrix(
+        self, sources: Sequence[Coordinate], destinations: Sequence[Coordinate]
+    ) -> List[List[Optional[float]]]:
+        try:
+            return self._primary.get_distance_matrix(sources, destinations)
+        except (ExternalAPIError, pybreaker.CircuitBreakerError) as e:
+            logger.warning(f"Distance provider degraded, using fallback: {e}")
+            return self._fallback.get_distance_matrix(sources, destinations)
+
+
+class AsyncDistanceProvider(ABC):
+    @abstractmethod
+    async def get_distance(
+        self, origin_lon: float, origin_lat: float, dest_lon: float, dest_lat: float
+    ) -> float:
+        pass
@@ -0,0 +1,243 @@
+import contextvars
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import wraps
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    List,
+    Optional,
+    Set,
+    TypeVar,
+    cast,
+)
+
+from config import load_env
+from lazy import lazy_import
+from provider.resilience import (
+    RateLimiter,
+    RetryBudget,
+    brasil_api_limiter,
+    osrm_api_limiter,
+    release_after_error,
+)
+
+if TYPE_CHECKING:
+    import asyncio
+else:
+    asyncio = lazy_import("asyncio")
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Se a chamada não responder até o percentil HEDGE_PERCENTILE das latências
+# observadas, uma segunda chamada idêntica é disparada e vence a primeira que
+# responder. Enquanto não há amostras suficientes usa HEDGE_DEFAULT_DELAY.
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "1.0"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MAX_SAMPLES = int(os.getenv("HEDGE_MAX_SAMPLES", "1000"))
+# No máximo HEDGE_BUDGET_RATIO chamadas extras por chamada na janela
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+HEDGE_BUDGET_WINDOW = int(os.getenv("HEDGE_BUDGET_WINDOW", "10"))
+HEDGE_MAX_WORKERS = int(os.getenv("HEDGE_MAX_WORKERS", "32"))
+
+_RECOMPUTE_EVERY = 50
+
+
+def _flag(name: str) -> bool:
+    return (os.getenv(name) or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class HedgePolicy:
+    def __init__(
+        self,
+        name: str,
+        enabled: bool = False,
+        percentile: float = HEDGE_PERCENTILE,
+        default_delay: float = HEDGE_DEFAULT_DELAY,
+        min_delay: float = HEDGE_MIN_DELAY,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        budget: Optional[RetryBudget] = None,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        self.name = name
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.budget = budget or RetryBudget(HEDGE_BUDGET_RATIO, 0, HEDGE_BUDGET_WINDOW)
+        self.limiter = limiter
+        self._delay = max(min_delay, default_delay)
+        self._latencies: Deque[float] = deque(maxlen=HEDGE_MAX_SAMPLES)
+        self._recorded = 0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        return self._delay
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+            self._recorded += 1
+            if (
+                len(self._latencies) < self.min_samples
+                or self._recorded % _RECOMPUTE_EVERY
+            ):
+                return
+            ordered = sorted(self._latencies)
+            index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+            self._delay = max(self.min_delay, ordered[index])
+
+    def record_request(self) -> None:
+        self.budget.record_request()
+
+    def try_hedge(self) -> bool:
+        # A chamada extra respeita o orçamento e o rate limit do serviço, mas
+        # nunca espera por eles: sem vaga, segue só com a chamada original.
+        if not self.budget.try_retry():
+            return False
+        if self.limiter is not None and not self.limiter.try_acquire():
+            return False
+        logger.debug(f"Hedging {self.name} call after {self._delay:.3f}s")
+        return True
+
+    def finish_hedge(self, started: float, error: Optional[Exception] = None) -> None:
+        if self.limiter is None:
+            return
+        if error is None:
+            self.limiter.release(time.monotonic() - started)
+        else:
+            release_after_error(self.limiter, started, error)
+
+    def cancel_hedge(self) -> None:
+        if self.limiter is not None:
+            self.limiter.release()
+
+
+_executor_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="hedge"
+            )
+        return _executor
+
+
+def with_hedging(policy: HedgePolicy) -> Callable[[F], F]:
+    # Fica dentro do circuit breaker: o breaker vê um único resultado por
+    # chamada, e só conta falha quando todas as tentativas falham.
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not policy.enabled:
+                return func(*args, **kwargs)
+            policy.record_request()
+            context = contextvars.copy_context()
+
+            def attempt(hedge: bool) -> Any:
+                started = time.monotonic()
+                try:
+                    result = context.copy().run(func, *args, **kwargs)
+                except Exception as e:
+                    if hedge:
+                        policy.finish_hedge(started, e)
+                    raise
+                policy.record(time.monotonic() - started)
+                if hedge:
+                    policy.finish_hedge(started)
+                return result
+
+            executor = _hedge_executor()
+            primary = executor.submit(attempt, False)
+            done, _ = wait([primary], timeout=policy.delay())
+            if done or not policy.try_hedge():
+                return primary.result()
+
+            # A chamada perdedora não é interrompida (requests é bloqueante);
+            # seu resultado é descartado.
+            pending: Set["Future[Any]"] = {primary, executor.submit(attempt, True)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        for other in pending:
+                            other.cancel()
+                        return future.result()
+            return primary.result()
+
+        @wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not policy.enabled:
+                return await func(*args, **kwargs)
+            policy.record_request()
+
+            async def attempt(hedge: bool) -> Any:
+                started = time.monotonic()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    if hedge:
+                        policy.finish_hedge(started, e)
+                    raise
+                except asyncio.CancelledError:
+                    if hedge:
+                        policy.cancel_hedge()
+                    raise
+                policy.record(time.monotonic() - started)
+                if hedge:
+                    policy.finish_hedge(started)
+                return result
+
+            tasks: List["asyncio.Task[Any]"] = [asyncio.ensure_future(attempt(False))]
+            try:
+                done, _ = await asyncio.wait(tasks, timeout=policy.delay())
+                if done or not policy.try_hedge():
+                    return await tasks[0]
+
+                tasks.append(asyncio.ensure_future(attempt(True)))
+                pending = set(tasks)
+                while pending:
+                    finished, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in finished:
+                        if not task.cancelled() and task.exception() is None:
+                            return task.result()
+                return tasks[0].result()
+            finally:
+                # A perdedora (ou tudo, se quem chamou foi cancelado) é cancelada.
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+
+        if inspect.iscoroutinefunction(func):
+            return cast(F, async_wrapper)
+        return cast(F, wrapper)
+
+    return decorator
+
+
+brasil_api_hedging = HedgePolicy(
+    "brasil_api", enabled=_flag("BRASIL_API_HEDGE"), limiter=brasil_api_limiter
+)
+osrm_api_hedging = HedgePolicy(
+    "osrm_api", enabled=_flag("OSRM_API_HEDGE"), limiter=osrm_api_limiter
+)
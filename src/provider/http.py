@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Tuple
+
+from config import load_env
+from exceptions import DeadlineExceededError
+from lazy import lazy_import
+from metrics import REGISTRY
+from provider.deadline import cap_timeout, remaining
+
+if TYPE_CHECKING:
+    import asyncio
+    import requests
+else:
+    asyncio = lazy_import("asyncio")
+    requests = lazy_import("requests")
+
+load_env()
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off")
+
+
+_request_seconds = REGISTRY.histogram(
+    "upstream_request_seconds", "Latency of upstream HTTP requests.", ("service",)
+)
+_responses = REGISTRY.counter(
+    "upstream_responses_total",
+    "Upstream HTTP responses by status code (or timeout/error).",
+    ("service", "status"),
+)
+
+
+class HttpClient:
+    _instances: Dict[str, "HttpClient"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, service: str):
+        self.service = service.lower()
+        self.pool_size = int(os.getenv(f"{service}_POOL_SIZE", "10"))
+        self.timeout: Tuple[float, float] = (
+            float(os.getenv(f"{service}_CONNECT_TIMEOUT", "3.05")),
+            float(os.getenv(f"{service}_READ_TIMEOUT", "10")),
+        )
+        self.keep_alive = _env_flag(f"{service}_KEEP_ALIVE", True)
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if not self.keep_alive:
+            self.session.headers["Connection"] = "close"
+
+        # requests is blocking; the async providers run it on a pool no larger
+        # than the connection pool, so awaiting callers queue instead of
+        # opening extra connections.
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.pool_size, thread_name_prefix=f"{service.lower()}-http"
+        )
+
+    @classmethod
+    def for_service(cls, service: str) -> "HttpClient":
+        client = cls._instances.get(service)
+        if client is None:
+            with cls._lock:
+                client = cls._instances.get(service)
+                if client is None:
+                    client = cls(service)
+                    cls._instances[service] = client
+        return client
+
+    def get(self, url: str) -> requests.Response:
+        # Os timeouts nunca passam do que resta do prazo da requisição.
+        connect_timeout, read_timeout = self.timeout
+        timeout = (cap_timeout(connect_timeout), cap_timeout(read_timeout))
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, timeout=timeout)
+        except requests.Timeout as e:
+            self._observe(started, "timeout")
+            left = remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceededError("Request deadline exceeded.") from e
+            raise
+        except requests.RequestException:
+            self._observe(started, "error")
+            raise
+        self._observe(started, str(response.status_code))
+        return response
+
+    def _observe(self, started: float, status: str) -> None:
+        _request_seconds.observe(time.perf_counter() - started, self.service)
+        _responses.inc(self.service, status)
+
+    async def get_async(self, url: str) -> requests.Response:
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(context.run, self.get, url)
+        )
@@ -1,57 +1,600 @@
+from __future__ import annotations
+
+import inspect
 import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from functools import wraps
-from typing import Any, Callable, TypeVar, cast
-
-import pybreaker
-import requests
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type,
-    RetryError,
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
 )
 
-from exceptions import ExternalAPIError
+from config import load_env
+from exceptions import DeadlineExceededError, ExternalAPIError, RateLimitError
+from lazy import lazy_import
+from metrics import REGISTRY
+from provider.deadline import remaining
+
+if TYPE_CHECKING:
+    import asyncio
+    import pybreaker
+    import requests
+    import tenacity
+else:
+    # Só são importados no primeiro uso (o pybreaker, por sua vez, importa o
+    # redis), não ao carregar a aplicação.
+    asyncio = lazy_import("asyncio")
+    pybreaker = lazy_import("pybreaker")
+    requests = lazy_import("requests")
+    tenacity = lazy_import("tenacity")
+
+load_env()
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 F = TypeVar("F", bound=Callable[..., Any])
 
-brasil_api_breaker = pybreaker.CircuitBreaker(
+
+class LazyCircuitBreaker:
+    # O pybreaker.CircuitBreaker só é criado no primeiro acesso; até lá o
+    # circuito está fechado e sem falhas. Os demais atributos são repassados.
+    def __init__(self, name: str, **options: Any):
+        self.name = name
+        self._options = options
+        self._breaker: Optional[pybreaker.CircuitBreaker] = None
+
+    @property
+    def created(self) -> bool:
+        return self._breaker is not None
+
+    def _create(self) -> pybreaker.CircuitBreaker:
+        with _breakers_lock:
+            if self._breaker is None:
+                self._breaker = pybreaker.CircuitBreaker(
+                    name=self.name,
+                    listeners=[cast("pybreaker.CircuitBreakerListener", monitor)],
+                    **self._options,
+                )
+            return self._breaker
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._breaker or self._create(), attribute)
+
+
+Breaker = Union["pybreaker.CircuitBreaker", LazyCircuitBreaker]
+
+_breakers_lock = threading.Lock()
+
+brasil_api_breaker = LazyCircuitBreaker(
+    "brasil_api_breaker",
     fail_max=3,
     reset_timeout=30,
-    exclude=[ValueError, TypeError],
-    name="brasil_api_breaker",
+    exclude=[ValueError, TypeError, DeadlineExceededError],
 )
 
-osrm_api_breaker = pybreaker.CircuitBreaker(
+osrm_api_breaker = LazyCircuitBreaker(
+    "osrm_api_breaker",
     fail_max=3,
     reset_timeout=30,
-    exclude=[ValueError, TypeError],
-    name="osrm_api_breaker",
+    exclude=[ValueError, TypeError, DeadlineExceededError],
+)
+
+# AIMD (opcional): reduz a taxa pela metade a cada 429/timeout e volta a subir
+# aos poucos, sem passar de *_RATE_LIMIT_MAX (por padrão, o próprio *_RATE_LIMIT)
+RATE_LIMIT_ADAPTIVE = (os.getenv("RATE_LIMIT_ADAPTIVE") or "false").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+# Tempo máximo esperando por uma vaga antes de desistir da chamada
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "10"))
+RATE_LIMIT_DECREASE_FACTOR = 0.5
+
+
+class RateLimiter:
+    # Token bucket (rate req/s, rajadas de até burst) somado a um limite de
+    # chamadas simultâneas. Com adaptive, a taxa segue AIMD entre min_rate e
+    # max_rate conforme os 429, timeouts e a latência observada.
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        adaptive: bool = False,
+        min_rate: Optional[float] = None,
+        max_rate: Optional[float] = None,
+        latency_target: Optional[float] = None,
+        max_wait: float = RATE_LIMIT_MAX_WAIT,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.adaptive = adaptive
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.latency_target = latency_target
+        self.max_wait = max_wait
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = (
+            threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        )
+
+    def _reserve(self) -> float:
+        # Retorna 0 se conseguiu um token, senão quanto esperar para tentar de novo.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        # Sem espera: usado por chamadas opcionais (ex.: hedging).
+        if self._in_flight and not self._in_flight.acquire(blocking=False):
+            return False
+        if self._reserve() > 0:
+            self._release_slot()
+            return False
+        return True
+
+    def _timed_out(self) -> RateLimitError:
+        return RateLimitError(f"Rate limit for {self.name} not acquired in time")
+
+    def _max_wait(self) -> float:
+        left = remaining()
+        return self.max_wait if left is None else max(0.0, min(self.max_wait, left))
+
+    def acquire(self) -> None:
+        max_wait = self._max_wait()
+        deadline = time.monotonic() + max_wait
+        if self._in_flight and not self._in_flight.acquire(timeout=max_wait):
+            raise self._timed_out()
+        try:
+            while True:
+                wait = self._reserve()
+                if wait <= 0:
+                    return
+                if time.monotonic() + wait > deadline:
+                    raise self._timed_out()
+                time.sleep(wait)
+        except BaseException:
+            self._release_slot()
+            raise
+
+    async def acquire_async(self) -> None:
+        # Mesmo estado compartilhado com as chamadas síncronas, sem bloquear o loop.
+        deadline = time.monotonic() + self._max_wait()
+        if self._in_flight:
+            while not self._in_flight.acquire(blocking=False):
+                if time.monotonic() > deadline:
+                    raise self._timed_out()
+                await asyncio.sleep(0.01)
+        try:
+            while True:
+                wait = self._reserve()
+                if wait <= 0:
+                    return
+                if time.monotonic() + wait > deadline:
+                    raise self._timed_out()
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        throttled: bool = False,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        self._release_slot()
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if not self.adaptive:
+                return
+            slow = (
+                self.latency_target is not None
+                and latency is not None
+                and latency > self.latency_target
+            )
+            if throttled or slow:
+                # Uma redução por janela de 1s: rajadas de erros da mesma
+                # sobrecarga não derrubam a taxa até o mínimo.
+                if now - self._last_decrease >= 1.0:
+                    self._last_decrease = now
+                    self.rate = max(
+                        self.min_rate, self.rate * RATE_LIMIT_DECREASE_FACTOR
+                    )
+                    logger.warning(
+                        f"Rate limit {self.name} decreased to {self.rate:.2f} req/s"
+                    )
+            elif latency is not None:
+                # +1 req/s a cada segundo de uso pleno da taxa atual
+                self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+
+    def _release_slot(self) -> None:
+        if self._in_flight:
+            self._in_flight.release()
+
+
+def _limiter_from_env(service: str, rate: float, max_in_flight: int) -> RateLimiter:
+    # Os limites valem por processo: com o server pré-forkado, a taxa efetiva
+    # contra o serviço é *_RATE_LIMIT × SERVER_WORKERS.
+    rate = float(os.getenv(f"{service}_RATE_LIMIT", str(rate)))
+    latency_target = float(os.getenv(f"{service}_LATENCY_TARGET", "2.0"))
+    return RateLimiter(
+        name=service.lower(),
+        rate=rate,
+        burst=int(os.getenv(f"{service}_RATE_BURST", str(int(rate * 2)))),
+        max_in_flight=int(os.getenv(f"{service}_MAX_IN_FLIGHT", str(max_in_flight)))
+        or None,
+        adaptive=RATE_LIMIT_ADAPTIVE,
+        max_rate=float(os.getenv(f"{service}_RATE_LIMIT_MAX") or rate),
+        latency_target=latency_target or None,
+    )
+
+
+brasil_api_limiter = _limiter_from_env("BRASIL_API", rate=10, max_in_flight=8)
+osrm_api_limiter = _limiter_from_env("OSRM_API", rate=5, max_in_flight=4)
+
+
+def _throttling(error: BaseException) -> Tuple[bool, Optional[float]]:
+    # Procura na cadeia de causas um 429 (com Retry-After) ou um timeout.
+    current: Optional[BaseException] = error
+    while current is not None:
+        if isinstance(current, requests.HTTPError):
+            response = current.response
+            if response is not None and response.status_code == 429:
+                return True, _retry_after(response)
+        if isinstance(current, requests.Timeout):
+            return True, None
+        current = current.__cause__
+    return False, None
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+def release_after_error(limiter: RateLimiter, started: float, error: Exception) -> None:
+    # Só 429 e timeouts indicam sobrecarga; outros erros não mexem na taxa.
+    throttled, retry_after = _throttling(error)
+    if throttled:
+        limiter.release(time.monotonic() - started, True, retry_after)
+    else:
+        limiter.release()
+
+
+def with_rate_limit(limiter: RateLimiter) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            limiter.acquire()
+            started = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except pybreaker.CircuitBreakerError:
+                # Circuito aberto: nenhuma chamada chegou ao serviço.
+                limiter.release()
+                raise
+            except Exception as e:
+                release_after_error(limiter, started, e)
+                raise
+            except BaseException:
+                limiter.release()
+                raise
+            limiter.release(time.monotonic() - started)
+            return result
+
+        @wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            await limiter.acquire_async()
+            started = time.monotonic()
+            try:
+                result = await func(*args, **kwargs)
+            except pybreaker.CircuitBreakerError:
+                limiter.release()
+                raise
+            except Exception as e:
+                release_after_error(limiter, started, e)
+                raise
+            except BaseException:
+                limiter.release()
+                raise
+            limiter.release(time.monotonic() - started)
+            return result
+
+        if inspect.iscoroutinefunction(func):
+            return cast(F, async_wrapper)
+        return cast(F, wrapper)
+
+    return decorator
+
+
+# Orçamento de retries do processo: numa janela de RETRY_BUDGET_WINDOW
+# segundos, no máximo RETRY_BUDGET_RATIO retries por chamada, mais um piso
+# de RETRY_BUDGET_MIN_PER_SECOND para processos com pouco tráfego.
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+RETRY_BUDGET_WINDOW = int(os.getenv("RETRY_BUDGET_WINDOW", "10"))
+
+
+class RetryBudget:
+    def __init__(self, ratio: float, min_per_second: float, window: int):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = max(1, window)
+        self._seconds = [0] * self.window
+        self._requests = [0] * self.window
+        self._retries = [0] * self.window
+        self._lock = threading.Lock()
+
+    def _slot(self) -> int:
+        second = int(time.monotonic())
+        index = second % self.window
+        if self._seconds[index] != second:
+            self._seconds[index] = second
+            self._requests[index] = 0
+            self._retries[index] = 0
+        return index
+
+    def _totals(self) -> Tuple[int, int]:
+        oldest = int(time.monotonic()) - self.window
+        live = [i for i, second in enumerate(self._seconds) if second > oldest]
+        return (
+            sum(self._requests[i] for i in live),
+            sum(self._retries[i] for i in live),
+        )
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._requests[self._slot()] += 1
+
+    def try_retry(self) -> bool:
+        with self._lock:
+            index = self._slot()
+            requests_made, retries = self._totals()
+            allowed = self.min_per_second * self.window + self.ratio * requests_made
+            if retries + 1 > allowed:
+                return False
+            self._retries[index] += 1
+            return True
+
+
+retry_budget = RetryBudget(
+    RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND, RETRY_BUDGET_WINDOW
 )
 
 
+def is_transient(error: BaseException) -> bool:
+    # Falhas de rede, 5xx e 429 (também quando embrulhadas em ExternalAPIError).
+    current: Optional[BaseException] = error
+    while current is not None:
+        if isinstance(current, (DeadlineExceededError, RateLimitError)):
+            return False
+        if isinstance(current, requests.HTTPError):
+            response = current.response
+            return (
+                response is None
+                or response.status_code == 429
+                or response.status_code >= 500
+            )
+        if isinstance(current, requests.RequestException):
+            return True
+        current = current.__cause__
+    return False
+
+
+_retry_attempts = REGISTRY.counter(
+    "retry_attempts_total",
+    "Attempts made by with_retry, including the first one.",
+    ("operation",),
+)
+_retry_giveups = REGISTRY.counter(
+    "retry_giveups_total",
+    "Transient failures not retried, by reason (attempts, deadline, budget).",
+    ("operation", "reason"),
+)
+
+
+def _retry_operation(retry_state: tenacity.RetryCallState) -> str:
+    return getattr(retry_state.fn, "__qualname__", "unknown")
+
+
+def _retrying(
+    func: Callable[..., Any], max_attempts: int, min_wait: float, max_wait: float
+) -> Callable[..., Any]:
+    backoff = tenacity.wait_exponential(multiplier=1, min=min_wait, max=max_wait)
+
+    def stop(retry_state: tenacity.RetryCallState) -> bool:
+        reason = None
+        if retry_state.attempt_number >= max_attempts:
+            reason = "attempts"
+        else:
+            # Não espera um back-off que termina depois do prazo da requisição.
+            left = remaining()
+            if left is not None and left <= backoff(retry_state):
+                reason = "deadline"
+            elif not retry_budget.try_retry():
+                logger.warning("Retry budget exhausted, not retrying")
+                reason = "budget"
+        if reason is None:
+            return False
+        _retry_giveups.inc(_retry_operation(retry_state), reason)
+        return True
+
+    def count_attempt(retry_state: tenacity.RetryCallState) -> None:
+        _retry_attempts.inc(_retry_operation(retry_state))
+
+    return tenacity.retry(
+        stop=stop,
+        wait=backoff,
+        retry=tenacity.retry_if_exception(is_transient),
+        before=count_attempt,
+        reraise=True,
+    )(func)
+
+
 def with_retry(
     max_attempts: int = 3, min_wait: float = 1.0, max_wait: float = 10.0
 ) -> Callable[[F], F]:
     def decorator(func: F) -> F:
+        # O tenacity só é importado (e o retry montado) na primeira chamada.
+        retried: Optional[Callable[..., Any]] = None
+
+        def build() -> Callable[..., Any]:
+            nonlocal retried
+            if retried is None:
+                retried = _retrying(func, max_attempts, min_wait, max_wait)
+            return retried
+
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
+            retry_budget.record_request()
             try:
-                return retry(
-                    stop=stop_after_attempt(max_attempts),
-                    wait=wait_exponential(multiplier=1, min=min_wait, max=max_wait),
-                    retry=retry_if_exception_type(requests.RequestException),
-                    reraise=True,
-                )(func)(*args, **kwargs)
-            except RetryError as e:
+                return build()(*args, **kwargs)
+            except tenacity.RetryError as e:
                 raise ExternalAPIError(
                     f"Service unavailable after {max_attempts} attempts"
                 ) from e
 
+        @wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            retry_budget.record_request()
+            try:
+                return await build()(*args, **kwargs)
+            except tenacity.RetryError as e:
+                raise ExternalAPIError(
+                    f"Service unavailable after {max_attempts} attempts"
+                ) from e
+
+        if inspect.iscoroutinefunction(func):
+            return cast(F, async_wrapper)
+        return cast(F, wrapper)
+
+    return decorator
+
+
+_trials_lock = threading.Lock()
+_trials_in_flight: Dict[int, bool] = {}
+
+
+# _enter_circuit/_record_failure/_record_success reuse pybreaker's state
+# machine through private attributes (_lock, _state_storage, state._handle_*).
+# pybreaker is pinned in the Pipfile and TestPybreakerInternals fails if an
+# upgrade changes them.
+def _enter_circuit(breaker: Breaker) -> bool:
+    # pybreaker holds the breaker lock for the whole guarded call, which
+    # serializes concurrent lookups; here the lock only guards state changes.
+    with breaker._lock:
+        if breaker.current_state == pybreaker.STATE_OPEN:
+            opened_at = breaker._state_storage.opened_at
+            timeout = timedelta(seconds=breaker.reset_timeout)
+            if opened_at and datetime.now(timezone.utc) < opened_at + timeout:
+                raise pybreaker.CircuitBreakerError(
+                    "Timeout not elapsed yet, circuit breaker still open"
+                )
+            breaker.half_open()
+
+        if breaker.current_state != pybreaker.STATE_HALF_OPEN:
+            return False
+
+        with _trials_lock:
+            if _trials_in_flight.get(id(breaker)):
+                raise pybreaker.CircuitBreakerError(
+                    "Trial call in progress, circuit breaker still half-open"
+                )
+            _trials_in_flight[id(breaker)] = True
+        return True
+
+
+def _leave_circuit(breaker: Breaker, trial: bool) -> None:
+    if trial:
+        with _trials_lock:
+            _trials_in_flight.pop(id(breaker), None)
+
+
+def _record_failure(breaker: Breaker, error: BaseException) -> None:
+    # Counts the failure; raises CircuitBreakerError only when it trips the
+    # circuit. Re-raising the original error is up to the caller.
+    with breaker._lock:
+        breaker.state._handle_error(error, reraise=False)
+
+
+def _record_success(breaker: Breaker) -> None:
+    with breaker._lock:
+        breaker.state._handle_success()
+
+
+def with_circuit_breaker(breaker: Breaker) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            trial = _enter_circuit(breaker)
+            try:
+                for listener in breaker.listeners:
+                    listener.before_call(
+                        cast("pybreaker.CircuitBreaker", breaker), func, *args, **kwargs
+                    )
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    _record_failure(breaker, e)
+                    raise
+                _record_success(breaker)
+                return result
+            finally:
+                _leave_circuit(breaker, trial)
+
+        @wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            trial = _enter_circuit(breaker)
+            try:
+                for listener in breaker.listeners:
+                    listener.before_call(
+                        cast("pybreaker.CircuitBreaker", breaker), func, *args, **kwargs
+                    )
+                try:
+                    result = await func(*args, **kwargs)
+                except asyncio.CancelledError:
+                    raise
+                except BaseException as e:
+                    _record_failure(breaker, e)
+                    raise
+                _record_success(breaker)
+                return result
+            finally:
+                _leave_circuit(breaker, trial)
+
+        if inspect.iscoroutinefunction(func):
+            return cast(F, async_wrapper)
         return cast(F, wrapper)
 
     return decorator
@@ -69,8 +612,60 @@ def log_circuit_half_open(breaker: pybreaker.CircuitBreaker) -> None:
     logger.info(f"Circuit {breaker.name} HALF-OPEN: The service is being tested")
 
 
-class CircuitBreakerMonitor(pybreaker.CircuitBreakerListener):
+_breakers = (brasil_api_breaker, osrm_api_breaker)
+_limiters = (brasil_api_limiter, osrm_api_limiter)
+
+
+def _breaker_state(breaker: LazyCircuitBreaker) -> int:
+    # Breakers ainda não criados estão fechados; exportar não os cria.
+    if not breaker.created:
+        return 0
+    return {
+        pybreaker.STATE_CLOSED: 0,
+        pybreaker.STATE_HALF_OPEN: 1,
+        pybreaker.STATE_OPEN: 2,
+    }[breaker.current_state]
+
+
+REGISTRY.gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open).",
+    ("breaker",),
+    collect=lambda: {(breaker.name,): _breaker_state(breaker) for breaker in _breakers},
+)
+REGISTRY.gauge(
+    "circuit_breaker_consecutive_failures",
+    "Failures counted towards opening the circuit.",
+    ("breaker",),
+    collect=lambda: {
+        (breaker.name,): breaker.fail_counter if breaker.created else 0
+        for breaker in _breakers
+    },
+)
+_breaker_failures = REGISTRY.counter(
+    "circuit_breaker_failures_total", "Failed calls seen by the breaker.", ("breaker",)
+)
+_breaker_transitions = REGISTRY.counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes by new state.",
+    ("breaker", "state"),
+)
+REGISTRY.gauge(
+    "rate_limit_requests_per_second",
+    "Current client-side rate limit per upstream.",
+    ("service",),
+    collect=lambda: {(limiter.name,): limiter.rate for limiter in _limiters},
+)
+
+
+class CircuitBreakerMonitor:
+    # Mesma interface do pybreaker.CircuitBreakerListener, sem herdar dele
+    # para não importar o pybreaker junto com este módulo.
+    def before_call(self, cb, func, *args, **kwargs):
+        pass
+
     def state_change(self, cb, old_state, new_state):
+        _breaker_transitions.inc(cb.name, new_state.name)
         if new_state.name == pybreaker.STATE_OPEN:
             log_circuit_open(cb)
         elif new_state.name == pybreaker.STATE_CLOSED:
@@ -79,6 +674,7 @@ class CircuitBreakerMonitor(pybreaker.CircuitBreakerListener):
             log_circuit_half_open(cb)
 
     def failure(self, cb, exc):
+        _breaker_failures.inc(cb.name)
         logger.error(f"Circuit breaker {cb.name} failed with error: {exc}")
 
     def success(self, cb):
@@ -86,5 +682,3 @@ class CircuitBreakerMonitor(pybreaker.CircuitBreakerListener):
 
 
 monitor = CircuitBreakerMonitor()
-brasil_api_breaker.add_listener(monitor)
-osrm_api_breaker.add_listener(monitor)
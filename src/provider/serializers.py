@@ -0,0 +1,105 @@
+import json
+import struct
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+
+class JsonSerializer:
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+    def loads(self, payload: Any) -> Any:
+        try:
+            if isinstance(payload, (str, bytes, bytearray)):
+                return json.loads(payload)
+            return None
+        except ValueError:
+            return None
+
+
+class VersionedSerializer(JsonSerializer, ABC):
+    # Registros binários começam com um byte de versão; JSON nunca começa
+    # com 0x01, então entradas antigas continuam legíveis pelo caminho JSON.
+    version = 1
+    record = struct.Struct("<")
+
+    def dumps(self, value: Any) -> bytes:
+        fields = self.pack(value)
+        if fields is None:
+            return super().dumps(value)
+        return bytes([self.version]) + self.record.pack(*fields)
+
+    def loads(self, payload: Any) -> Any:
+        if (
+            isinstance(payload, (bytes, bytearray))
+            and len(payload) == 1 + self.record.size
+            and payload[0] == self.version
+        ):
+            return self.unpack(self.record.unpack_from(payload, 1))
+        value = super().loads(payload)
+        return None if value is None else self.migrate(value)
+
+    @abstractmethod
+    def pack(self, value: Any) -> Optional[tuple]:
+        pass
+
+    @abstractmethod
+    def unpack(self, fields: tuple) -> Any:
+        pass
+
+    def migrate(self, value: Any) -> Any:
+        return value
+
+
+class CoordinatesSerializer(VersionedSerializer):
+    # Guarda só o que o cálculo de frete usa de um documento de CEP.
+    record = struct.Struct("<dd")
+
+    def pack(self, value: Any) -> Optional[tuple]:
+        try:
+            coordinates = value["location"]["coordinates"]
+            return float(coordinates["latitude"]), float(coordinates["longitude"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def unpack(self, fields: tuple) -> Any:
+        latitude, longitude = fields
+        return {
+            "location": {"coordinates": {"latitude": latitude, "longitude": longitude}}
+        }
+
+    def project(self, value: Any) -> Any:
+        # O formato de um acerto no cache; a busca na API devolve o mesmo.
+        fields = self.pack(value)
+        return value if fields is None else self.unpack(fields)
+
+    def migrate(self, value: Any) -> Any:
+        return self.project(value)
+
+
+class FloatSerializer(VersionedSerializer):
+    record = struct.Struct("<d")
+
+    def pack(self, value: Any) -> Optional[tuple]:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return (float(value),)
+
+    def unpack(self, fields: tuple) -> Any:
+        return fields[0]
+
+
+DEFAULT_SERIALIZER = JsonSerializer()
+
+_serializers_lock = threading.Lock()
+_serializers: Dict[str, JsonSerializer] = {}
+
+
+def register_serializer(prefix: str, serializer: JsonSerializer) -> None:
+    with _serializers_lock:
+        _serializers[prefix] = serializer
+
+
+def serializer_for(key: str) -> JsonSerializer:
+    return _serializers.get(key.split(":", 1)[0], DEFAULT_SERIALIZER)
@@ -1,15 +1,60 @@
+from __future__ import annotations
+
 import os
-import requests
-from dotenv import load_dotenv
-from typing import Any, Dict
+from config import load_env
+from typing import TYPE_CHECKING, Any, Dict, Sequence, Union
 
-from provider.cep import CepProvider
-from provider.resilience import brasil_api_breaker, with_retry
-from provider.cache import cached
+from provider.cep import AsyncCepProvider, CepProvider
+from provider.hedging import brasil_api_hedging, with_hedging
+from provider.http import HttpClient
+from provider.resilience import (
+    brasil_api_breaker,
+    brasil_api_limiter,
+    with_circuit_breaker,
+    with_rate_limit,
+    with_retry,
+)
+from provider.cache import cached, cached_many
+from provider.cache_keys import cep_key
+from provider.serializers import CoordinatesSerializer
+from concurrency import BATCH_MAX_WORKERS, run_concurrently
 from exceptions import ExternalAPIError, InvalidCepError
 from validation import Validation
+from lazy import lazy_import
+
+if TYPE_CHECKING:
+    import requests
+else:
+    requests = lazy_import("requests")
+
+load_env()
+
+# Nome fixo na chave: get_cep_data síncrono, assíncrono e em lote compartilham
+# entradas
+BRASIL_API_CACHE_KEY_NAME = "get_cep_data"
+BRASIL_API_L1_MAX_ENTRIES = int(os.getenv("BRASIL_API_L1_MAX_ENTRIES", "10000"))
+BRASIL_API_L1_TTL = float(os.getenv("BRASIL_API_L1_TTL", "300"))
+# Trava entre processos para buscas concorrentes da mesma chave (0 desativa)
+BRASIL_API_LOCK_TIMEOUT = float(os.getenv("BRASIL_API_LOCK_TIMEOUT", "0"))
+# Após STALE_AFTER segundos o valor é servido e renovado em segundo plano;
+# por STALE_IF_ERROR segundos após expirar, só é servido com o circuito aberto
+BRASIL_API_STALE_AFTER = int(os.getenv("BRASIL_API_STALE_AFTER", "43200"))
+BRASIL_API_STALE_IF_ERROR = int(os.getenv("BRASIL_API_STALE_IF_ERROR", "86400"))
+
+_coordinates_serializer = CoordinatesSerializer()
+
 
-load_dotenv()
+def _parse_cep_response(cep: str, response: requests.Response) -> Dict[str, Any]:
+    response.raise_for_status()
+    data: Dict[str, Any] = response.json()
+
+    if not Validation.has_valid_coordinates(data):
+        raise InvalidCepError(f"CEP {cep} not have valid coordinates.")
+
+    # Só as coordenadas, como num acerto do cache: o resultado não depende de
+    # qual camada respondeu.
+    projected: Dict[str, Any] = _coordinates_serializer.project(data)
+    return projected
 
 
 class BrasilApiProvider(CepProvider):
@@ -17,23 +62,89 @@ class BrasilApiProvider(CepProvider):
         self._base_url = os.getenv("BRASIL_API_URL")
         if not self._base_url:
             raise ValueError("BRASIL_API_URL not found in environment variables.")
+        self._http = HttpClient.for_service("BRASIL_API")
 
-    @cached(prefix="brasil_api", expiry=86400)  # Cache por 24 horas
-    @with_retry(max_attempts=3, min_wait=1.0, max_wait=5.0)
-    @brasil_api_breaker
+    @cached(
+        prefix="brasil_api",
+        expiry=86400,  # Cache por 24 horas
+        l1_max_entries=BRASIL_API_L1_MAX_ENTRIES,
+        l1_ttl=BRASIL_API_L1_TTL,
+        lock_timeout=BRASIL_API_LOCK_TIMEOUT or None,
+        stale_after=BRASIL_API_STALE_AFTER,
+        stale_if_error=BRASIL_API_STALE_IF_ERROR,
+        breaker=brasil_api_breaker,
+        serializer=_coordinates_serializer,
+        key_builder=cep_key,
+        key_name=BRASIL_API_CACHE_KEY_NAME,
+        legacy_keys=True,
+    )
     def get_cep_data(self, cep: str) -> Dict[str, Any]:
+        return self._fetch_cep_data(cep)
+
+    @cached_many(
+        prefix="brasil_api",
+        key_name=BRASIL_API_CACHE_KEY_NAME,
+        expiry=86400,
+        stale_after=BRASIL_API_STALE_AFTER,
+        stale_if_error=BRASIL_API_STALE_IF_ERROR,
+        breaker=brasil_api_breaker,
+        serializer=_coordinates_serializer,
+        key_builder=cep_key,
+        legacy_keys=True,
+    )
+    def get_cep_data_many(
+        self, ceps: Sequence[str], max_workers: int = BATCH_MAX_WORKERS
+    ) -> Dict[str, Union[Dict[str, Any], Exception]]:
+        return run_concurrently(self._fetch_cep_data, ceps, max_workers)
+
+    @with_retry(max_attempts=3, min_wait=1.0, max_wait=5.0)
+    @with_rate_limit(brasil_api_limiter)
+    @with_circuit_breaker(brasil_api_breaker)
+    @with_hedging(brasil_api_hedging)
+    def _fetch_cep_data(self, cep: str) -> Dict[str, Any]:
         if not Validation.is_valid_cep(cep):
             raise InvalidCepError(f"CEP {cep} inválido.")
 
         url = f"{self._base_url}{cep}"
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data: Dict[str, Any] = response.json()
+            response = self._http.get(url)
+            return _parse_cep_response(cep, response)
+        except requests.RequestException as e:
+            raise ExternalAPIError(f"Failed to fetch CEP data: {str(e)}") from e
+
+
+class AsyncBrasilApiProvider(AsyncCepProvider):
+    def __init__(self):
+        self._base_url = os.getenv("BRASIL_API_URL")
+        if not self._base_url:
+            raise ValueError("BRASIL_API_URL not found in environment variables.")
+        self._http = HttpClient.for_service("BRASIL_API")
 
-            if not Validation.has_valid_coordinates(data):
-                raise InvalidCepError(f"CEP {cep} not have valid coordinates.")
+    @cached(
+        prefix="brasil_api",
+        expiry=86400,  # Cache por 24 horas
+        l1_max_entries=BRASIL_API_L1_MAX_ENTRIES,
+        l1_ttl=BRASIL_API_L1_TTL,
+        lock_timeout=BRASIL_API_LOCK_TIMEOUT or None,
+        stale_after=BRASIL_API_STALE_AFTER,
+        stale_if_error=BRASIL_API_STALE_IF_ERROR,
+        breaker=brasil_api_breaker,
+        serializer=_coordinates_serializer,
+        key_builder=cep_key,
+        key_name=BRASIL_API_CACHE_KEY_NAME,
+        legacy_keys=True,
+    )
+    @with_retry(max_attempts=3, min_wait=1.0, max_wait=5.0)
+    @with_rate_limit(brasil_api_limiter)
+    @with_circuit_breaker(brasil_api_breaker)
+    @with_hedging(brasil_api_hedging)
+    async def get_cep_data(self, cep: str) -> Dict[str, Any]:
+        if not Validation.is_valid_cep(cep):
+            raise InvalidCepError(f"CEP {cep} inválido.")
 
-            return data
+        url = f"{self._base_url}{cep}"
+        try:
+            response = await self._http.get_async(url)
+            return _parse_cep_response(cep, response)
         except requests.RequestException as e:
-            raise ExternalAPIError(f"Failed to fetch CEP data: {str(e)}")
+            raise ExternalAPIError(f"Failed to fetch CEP data: {str(e)}") from e
@@ -0,0 +1,67 @@
+import math
+import os
+from typing import List, Optional, Sequence
+
+from config import load_env
+
+from lazy import numpy_module
+from provider.distance import Coordinate, Distance, DistanceProvider
+
+load_env()
+
+EARTH_RADIUS_KM = 6371.0088
+# Razão média entre a distância por estrada e a linha reta; ajuste com
+# tools/fit_detour_factor.py a partir de distâncias reais do OSRM.
+HAVERSINE_DETOUR_FACTOR = float(os.getenv("HAVERSINE_DETOUR_FACTOR", "1.3"))
+
+
+def haversine_km(
+    origin_lon: float, origin_lat: float, dest_lon: float, dest_lat: float
+) -> float:
+    lat1, lat2 = math.radians(origin_lat), math.radians(dest_lat)
+    half_dlat = (lat2 - lat1) / 2
+    half_dlon = math.radians(dest_lon - origin_lon) / 2
+    a = (
+        math.sin(half_dlat) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin(half_dlon) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class HaversineDistanceProvider(DistanceProvider):
+    name = "haversine"
+
+    def __init__(self, detour_factor: Optional[float] = None):
+        self.detour_factor = (
+            HAVERSINE_DETOUR_FACTOR if detour_factor is None else detour_factor
+        )
+
+    def get_distance(
+        self, origin_lon: float, origin_lat: float, dest_lon: float, dest_lat: float
+    ) -> float:
+        distance = haversine_km(origin_lon, origin_lat, dest_lon, dest_lat)
+        return Distance(distance * self.detour_factor, self.name, estimated=True)
+
+    def get_distance_matrix(
+        self, sources: Sequence[Coordinate], destinations: Sequence[Coordinate]
+    ) -> List[List[Optional[float]]]:
+        np = numpy_module()
+        if np is None or not sources or not destinations:
+            return super().get_distance_matrix(sources, destinations)
+
+        source_points = np.radians(np.asarray(sources, dtype=np.float64))
+        destination_points = np.radians(np.asarray(destinations, dtype=np.float64))
+        lon1, lat1 = source_points[:, 0:1], source_points[:, 1:2]
+        lon2, lat2 = destination_points[:, 0], destination_points[:, 1]
+
+        a = (
+            np.sin((lat2 - lat1) / 2) ** 2
+            + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        )
+        matrix = (
+            2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        ) * self.detour_factor
+        return [
+            [Distance(value, self.name, estimated=True) for value in row]
+            for row in matrix.tolist()
+        ]
@@ -0,0 +1,111 @@
+import mmap
+import os
+import struct
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from exceptions import CepNotFoundError, InvalidCepError
+from provider.cep import CepProvider
+from validation import Validation
+
+# Cabeçalho: assinatura, versão, 1 byte livre e quantidade de registros.
+# Registros: CEP como inteiro sem sinal seguido de latitude e longitude,
+# ordenados pelo CEP para permitir busca binária direto no arquivo mapeado.
+INDEX_MAGIC = b"CEPIDX"
+INDEX_VERSION = 1
+HEADER = struct.Struct("<6sBxQ")
+RECORD = struct.Struct("<Idd")
+
+
+class CepIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER.size:
+            raise ValueError(f"CEP index {path} is truncated.")
+        magic, version, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"CEP index {path} has an unsupported format.")
+        if len(self._mmap) != HEADER.size + count * RECORD.size:
+            raise ValueError(f"CEP index {path} is truncated.")
+        self._count = count
+
+    def lookup(self, cep: int) -> Optional[Tuple[float, float]]:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * RECORD.size
+            (current,) = struct.unpack_from("<I", self._mmap, offset)
+            if current < cep:
+                low = middle + 1
+            elif current > cep:
+                high = middle
+            else:
+                _, latitude, longitude = RECORD.unpack_from(self._mmap, offset)
+                return latitude, longitude
+        return None
+
+    def __len__(self) -> int:
+        return self._count
+
+
+_indexes_lock = threading.Lock()
+_indexes: Dict[str, CepIndex] = {}
+
+
+def open_cep_index(path: str) -> CepIndex:
+    # Um mapeamento por arquivo e processo; as páginas são compartilhadas
+    # entre workers pelo cache do sistema operacional.
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = CepIndex(path)
+        return index
+
+
+def write_cep_index(records: Iterable[Tuple[str, float, float]], path: str) -> int:
+    entries: Dict[int, Tuple[float, float]] = {}
+    for cep, latitude, longitude in records:
+        cep = Validation.normalize_cep(cep)
+        if not Validation.is_valid_cep(cep):
+            raise InvalidCepError(f"CEP {cep} inválido.")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError(f"CEP {cep} not have valid coordinates.")
+        entries[int(cep)] = (latitude, longitude)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(entries)))
+        for cep_number in sorted(entries):
+            file.write(RECORD.pack(cep_number, *entries[cep_number]))
+    os.replace(temporary_path, path)
+    return len(entries)
+
+
+class LocalCepIndexProvider(CepProvider):
+    def __init__(self, path: Optional[str] = None):
+        path = path or os.getenv("CEP_INDEX_PATH")
+        if not path:
+            raise ValueError("CEP_INDEX_PATH not found in environment variables.")
+        self._index = open_cep_index(path)
+
+    def get_cep_data(self, cep: str) -> Dict[str, Any]:
+        if not Validation.is_valid_cep(cep):
+            raise InvalidCepError(f"CEP {cep} inválido.")
+
+        cep = Validation.normalize_cep(cep)
+        coordinates = self._index.lookup(int(cep))
+        if coordinates is None:
+            raise CepNotFoundError(f"CEP {cep} not found in local index.")
+
+        latitude, longitude = coordinates
+        return {
+            "cep": cep,
+            "location": {
+                "type": "Point",
+                "coordinates": {"latitude": latitude, "longitude": longitude},
+            },
+        }
@@ -1,14 +1,80 @@
+from __future__ import annotations
+
 import os
-from typing import Dict, Any, List, cast
-import requests
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Sequence, Tuple, cast
+from config import load_env
 
 from exceptions import ExternalAPIError
-from provider.distance import DistanceProvider
-from provider.resilience import osrm_api_breaker, with_retry
-from provider.cache import cached
+from provider.distance import (
+    AsyncDistanceProvider,
+    Coordinate,
+    Distance,
+    DistanceProvider,
+)
+from provider.hedging import osrm_api_hedging, with_hedging
+from provider.http import HttpClient
+from provider.resilience import (
+    osrm_api_breaker,
+    osrm_api_limiter,
+    with_circuit_breaker,
+    with_rate_limit,
+    with_retry,
+)
+from lazy import lazy_import
+
+from provider.cache import (
+    EXPIRED,
+    StalePolicy,
+    cached,
+    get_cached_entries,
+    migrate_legacy_entries,
+    set_cached_many,
+)
+from provider.cache_keys import coordinates_key, format_cache_key
+from provider.serializers import FloatSerializer
+from provider.services.osrm_buckets import DistanceBuckets
+
+if TYPE_CHECKING:
+    import pybreaker
+    import requests
+else:
+    pybreaker = lazy_import("pybreaker")
+    requests = lazy_import("requests")
+
+load_env()
+
+OSRM_CACHE_PREFIX = "osrm_api"
+OSRM_CACHE_EXPIRY = 86400  # Cache por 24 horas
+# Nome fixo na chave: rota síncrona, assíncrona e matriz compartilham entradas
+OSRM_CACHE_KEY_NAME = "get_distance"
+
+OSRM_API_L1_MAX_ENTRIES = int(os.getenv("OSRM_API_L1_MAX_ENTRIES", "10000"))
+OSRM_API_L1_TTL = float(os.getenv("OSRM_API_L1_TTL", "300"))
+# Trava entre processos para buscas concorrentes da mesma chave (0 desativa)
+OSRM_API_LOCK_TIMEOUT = float(os.getenv("OSRM_API_LOCK_TIMEOUT", "0"))
+# Após STALE_AFTER segundos o valor é servido e renovado em segundo plano;
+# por STALE_IF_ERROR segundos após expirar, só é servido com o circuito aberto
+OSRM_API_STALE_AFTER = int(os.getenv("OSRM_API_STALE_AFTER", "43200"))
+OSRM_API_STALE_IF_ERROR = int(os.getenv("OSRM_API_STALE_IF_ERROR", "86400"))
 
-load_dotenv()
+# Limite padrão do osrm-routed (--max-table-size)
+OSRM_TABLE_MAX_COORDINATES = int(os.getenv("OSRM_TABLE_MAX_COORDINATES", "100"))
+
+_buckets = DistanceBuckets()
+
+_stale_policy = StalePolicy(
+    OSRM_CACHE_EXPIRY, OSRM_API_STALE_AFTER, OSRM_API_STALE_IF_ERROR, osrm_api_breaker
+)
+
+
+def _parse_route_response(response: requests.Response) -> float:
+    response.raise_for_status()
+    routes: List[Dict[str, Any]] = response.json().get("routes", [])
+    if not routes or "distance" not in routes[0]:
+        raise ExternalAPIError("Distance not found in OSRM response.")
+    distance_in_meters = cast(float, routes[0]["distance"])
+    distance_in_km = distance_in_meters / 1000
+    return distance_in_km
 
 
 class OSRMProvider(DistanceProvider):
@@ -16,22 +82,230 @@ class OSRMProvider(DistanceProvider):
         self._api_url = os.getenv("OSRM_API_URL")
         if not self._api_url:
             raise ValueError("OSRM_API_URL not found in environment variables.")
+        self._table_url = os.getenv("OSRM_TABLE_API_URL") or ""
+        if not self._table_url:
+            if "/route/" not in self._api_url:
+                raise ValueError(
+                    "OSRM_TABLE_API_URL not found in environment variables and "
+                    "OSRM_API_URL has no /route/ segment to derive it from."
+                )
+            self._table_url = self._api_url.replace("/route/", "/table/")
+        self._http = HttpClient.for_service("OSRM_API")
 
-    @cached(prefix="osrm_api", expiry=86400)  # Cache por 24 horas
-    @with_retry(max_attempts=3, min_wait=1.0, max_wait=5.0)
-    @osrm_api_breaker
     def get_distance(
         self, origin_lon: float, origin_lat: float, dest_lon: float, dest_lat: float
+    ) -> float:
+        route = (origin_lon, origin_lat, dest_lon, dest_lat)
+        bucket_key = _buckets.key_for(route)
+        if bucket_key is None:
+            return self._get_exact_distance(*route)
+
+        approximate = _buckets.lookup(bucket_key)
+        if approximate is not None and not _buckets.should_sample():
+            _buckets.record_hit()
+            return Distance(approximate, "osrm_bucket", estimated=True)
+
+        exact = self._get_exact_distance(*route)
+        _buckets.record_exact(bucket_key, route, exact, approximate)
+        return exact
+
+    @cached(
+        prefix=OSRM_CACHE_PREFIX,
+        expiry=OSRM_CACHE_EXPIRY,
+        l1_max_entries=OSRM_API_L1_MAX_ENTRIES,
+        l1_ttl=OSRM_API_L1_TTL,
+        lock_timeout=OSRM_API_LOCK_TIMEOUT or None,
+        stale_after=OSRM_API_STALE_AFTER,
+        stale_if_error=OSRM_API_STALE_IF_ERROR,
+        breaker=osrm_api_breaker,
+        serializer=FloatSerializer(),
+        key_builder=coordinates_key,
+        key_name=OSRM_CACHE_KEY_NAME,
+        legacy_keys=True,
+    )
+    @with_retry(max_attempts=3, min_wait=1.0, max_wait=5.0)
+    @with_rate_limit(osrm_api_limiter)
+    @with_circuit_breaker(osrm_api_breaker)
+    @with_hedging(osrm_api_hedging)
+    def _get_exact_distance(
+        self, origin_lon: float, origin_lat: float, dest_lon: float, dest_lat: float
     ) -> float:
         url = f"{self._api_url}{origin_lon},{origin_lat};{dest_lon},{dest_lat}"
         try:
-            response = requests.get(url)
+            response = self._http.get(url)
+            return _parse_route_response(response)
+        except requests.RequestException as e:
+            raise ExternalAPIError(
+                f"Failed to fetch distance from OSRM: {str(e)}"
+            ) from e
+
+    def get_distance_matrix(
+        self, sources: Sequence[Coordinate], destinations: Sequence[Coordinate]
+    ) -> List[List[Optional[float]]]:
+        matrix: List[List[Optional[float]]] = [
+            [None] * len(destinations) for _ in sources
+        ]
+        keys = {
+            (i, j): self._cache_key(source, destination)
+            for i, source in enumerate(sources)
+            for j, destination in enumerate(destinations)
+        }
+        cached_distances = get_cached_entries(OSRM_CACHE_PREFIX, list(keys.values()))
+        cached_distances.update(
+            migrate_legacy_entries(
+                {
+                    key: self._legacy_cache_key(sources[i], destinations[j])
+                    for (i, j), key in keys.items()
+                    if key not in cached_distances
+                },
+                _stale_policy.storage_expiry,
+            )
+        )
+
+        missing: List[Tuple[int, int]] = []
+        fallbacks: Dict[Tuple[int, int], float] = {}
+        for (i, j), key in keys.items():
+            if key not in cached_distances:
+                missing.append((i, j))
+                continue
+            distance, remaining = cached_distances[key]
+            if _stale_policy.freshness(remaining) == EXPIRED:
+                fallbacks[(i, j)] = distance
+                missing.append((i, j))
+            else:
+                matrix[i][j] = distance
+
+        if not missing:
+            return matrix
+
+        missing_set = set(missing)
+        source_indexes = sorted({i for i, _ in missing})
+        destination_indexes = sorted({j for _, j in missing})
+        source_size, destination_size = self._chunk_sizes(
+            len(source_indexes), len(destination_indexes)
+        )
+
+        for s in range(0, len(source_indexes), source_size):
+            source_chunk = source_indexes[s : s + source_size]
+            for d in range(0, len(destination_indexes), destination_size):
+                destination_chunk = destination_indexes[d : d + destination_size]
+                try:
+                    table = self._fetch_table(
+                        [sources[i] for i in source_chunk],
+                        [destinations[j] for j in destination_chunk],
+                    )
+                except pybreaker.CircuitBreakerError:
+                    # Só responde com valores vencidos se cobrirem o bloco todo;
+                    # senão o erro sobe e quem chamou usa o seu fallback.
+                    pending = [
+                        (i, j)
+                        for i in source_chunk
+                        for j in destination_chunk
+                        if (i, j) in missing_set
+                    ]
+                    if not all(pair in fallbacks for pair in pending):
+                        raise
+                    for i, j in pending:
+                        matrix[i][j] = fallbacks[(i, j)]
+                    continue
+                fetched = {}
+                for row, i in zip(table, source_chunk):
+                    for distance, j in zip(row, destination_chunk):
+                        matrix[i][j] = distance
+                        if distance is not None:
+                            fetched[keys[(i, j)]] = distance
+                set_cached_many(
+                    OSRM_CACHE_PREFIX, fetched, _stale_policy.storage_expiry
+                )
+
+        return matrix
+
+    @with_retry(max_attempts=3, min_wait=1.0, max_wait=5.0)
+    @with_rate_limit(osrm_api_limiter)
+    @with_circuit_breaker(osrm_api_breaker)
+    def _fetch_table(
+        self, sources: Sequence[Coordinate], destinations: Sequence[Coordinate]
+    ) -> List[List[Optional[float]]]:
+        coordinates = ";".join(f"{lon},{lat}" for lon, lat in [*sources, *destinations])
+        source_ids = ";".join(str(i) for i in range(len(sources)))
+        destination_ids = ";".join(
+            str(i) for i in range(len(sources), len(sources) + len(destinations))
+        )
+        url = (
+            f"{self._table_url}{coordinates}"
+            f"?sources={source_ids}&destinations={destination_ids}"
+            "&annotations=distance"
+        )
+        try:
+            response = self._http.get(url)
             response.raise_for_status()
-            routes: List[Dict[str, Any]] = response.json().get("routes", [])
-            if not routes or "distance" not in routes[0]:
-                raise ExternalAPIError("Distance not found in OSRM response.")
-            distance_in_meters = cast(float, routes[0]["distance"])
-            distance_in_km = distance_in_meters / 1000
-            return distance_in_km
+            distances = response.json().get("distances")
+            if not distances or len(distances) != len(sources):
+                raise ExternalAPIError("Distances not found in OSRM table response.")
+            return [
+                [None if meters is None else meters / 1000 for meters in row]
+                for row in distances
+            ]
+        except requests.RequestException as e:
+            raise ExternalAPIError(
+                f"Failed to fetch distances from OSRM: {str(e)}"
+            ) from e
+
+    def _cache_key(self, source: Coordinate, destination: Coordinate) -> str:
+        return format_cache_key(
+            OSRM_CACHE_PREFIX,
+            OSRM_CACHE_KEY_NAME,
+            (*source, *destination),
+            {},
+            coordinates_key,
+        )
+
+    @staticmethod
+    def _legacy_cache_key(source: Coordinate, destination: Coordinate) -> str:
+        return format_cache_key(
+            OSRM_CACHE_PREFIX, OSRM_CACHE_KEY_NAME, (*source, *destination), {}
+        )
+
+    @staticmethod
+    def _chunk_sizes(sources: int, destinations: int) -> Tuple[int, int]:
+        limit = max(2, OSRM_TABLE_MAX_COORDINATES)
+        source_size = min(sources, max(1, limit - min(destinations, limit // 2)))
+        return source_size, limit - source_size
+
+
+class AsyncOSRMProvider(AsyncDistanceProvider):
+    def __init__(self):
+        self._api_url = os.getenv("OSRM_API_URL")
+        if not self._api_url:
+            raise ValueError("OSRM_API_URL not found in environment variables.")
+        self._http = HttpClient.for_service("OSRM_API")
+
+    @cached(
+        prefix=OSRM_CACHE_PREFIX,
+        expiry=OSRM_CACHE_EXPIRY,
+        l1_max_entries=OSRM_API_L1_MAX_ENTRIES,
+        l1_ttl=OSRM_API_L1_TTL,
+        lock_timeout=OSRM_API_LOCK_TIMEOUT or None,
+        stale_after=OSRM_API_STALE_AFTER,
+        stale_if_error=OSRM_API_STALE_IF_ERROR,
+        breaker=osrm_api_breaker,
+        serializer=FloatSerializer(),
+        key_builder=coordinates_key,
+        key_name=OSRM_CACHE_KEY_NAME,
+        legacy_keys=True,
+    )
+    @with_retry(max_attempts=3, min_wait=1.0, max_wait=5.0)
+    @with_rate_limit(osrm_api_limiter)
+    @with_circuit_breaker(osrm_api_breaker)
+    @with_hedging(osrm_api_hedging)
+    async def get_distance(
+        self, origin_lon: float, origin_lat: float, dest_lon: float, dest_lat: float
+    ) -> float:
+        url = f"{self._api_url}{origin_lon},{origin_lat};{dest_lon},{dest_lat}"
+        try:
+            response = await self._http.get_async(url)
+            return _parse_route_response(response)
         except requests.RequestException as e:
-            raise ExternalAPIError(f"Failed to fetch distance from OSRM: {str(e)}")
+            raise ExternalAPIError(
+                f"Failed to fetch distance from OSRM: {str(e)}"
+            ) from e
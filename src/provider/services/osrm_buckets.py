@@ -0,0 +1,124 @@
+import os
+import random
+from typing import Dict, Optional, Tuple
+
+from config import load_env
+
+from provider.cache import CacheClient, get_cached, set_cached
+from provider.cache_keys import format_cache_key
+from provider.serializers import FloatSerializer, register_serializer
+from provider.services.haversine import haversine_km
+from provider.spatial import encode_geohash, geohash_cell_diagonal_km
+
+load_env()
+
+# Modo aproximado (opcional): pares de CEP que caem nas mesmas células de
+# geohash reaproveitam a distância já calculada pelo OSRM. 0 desativa.
+OSRM_BUCKET_PRECISION = int(os.getenv("OSRM_BUCKET_PRECISION", "0"))
+# Erro relativo máximo aceito ao reaproveitar a distância da célula
+OSRM_BUCKET_TOLERANCE = float(os.getenv("OSRM_BUCKET_TOLERANCE", "0.01"))
+# Fração dos acertos que ainda consulta o OSRM para medir o erro real
+OSRM_BUCKET_SAMPLE_RATE = float(os.getenv("OSRM_BUCKET_SAMPLE_RATE", "0.05"))
+OSRM_SAMPLES_MAX_LENGTH = int(os.getenv("OSRM_SAMPLES_MAX_LENGTH", "10000"))
+
+BUCKET_CACHE_PREFIX = "osrm_bucket"
+BUCKET_CACHE_EXPIRY = 86400  # Cache por 24 horas
+BUCKET_STATS_KEY = "osrm_bucket_stats"
+SAMPLES_KEY = "osrm_samples:exact"
+ERROR_THRESHOLDS = (0.005, 0.01, 0.02, 0.05, 0.1)
+
+register_serializer(BUCKET_CACHE_PREFIX, FloatSerializer())
+
+Route = Tuple[float, float, float, float]
+
+
+class DistanceBuckets:
+    def __init__(
+        self,
+        precision: int = OSRM_BUCKET_PRECISION,
+        tolerance: float = OSRM_BUCKET_TOLERANCE,
+        sample_rate: float = OSRM_BUCKET_SAMPLE_RATE,
+    ):
+        self.precision = precision
+        self.tolerance = tolerance
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.precision > 0
+
+    def key_for(self, route: Route) -> Optional[str]:
+        # Mover cada ponta dentro da célula muda a rota em até ~uma diagonal;
+        # só usa a célula quando esse erro cabe na tolerância.
+        if not self.enabled:
+            return None
+        origin_lon, origin_lat, dest_lon, dest_lat = route
+        straight_km = haversine_km(*route)
+        max_error_km = geohash_cell_diagonal_km(
+            self.precision, origin_lat
+        ) + geohash_cell_diagonal_km(self.precision, dest_lat)
+        if max_error_km > self.tolerance * straight_km:
+            return None
+        return format_cache_key(
+            BUCKET_CACHE_PREFIX,
+            "get_distance",
+            (
+                encode_geohash(origin_lat, origin_lon, self.precision),
+                encode_geohash(dest_lat, dest_lon, self.precision),
+            ),
+            {},
+        )
+
+    def lookup(self, key: str) -> Optional[float]:
+        return get_cached(BUCKET_CACHE_PREFIX, key)
+
+    def should_sample(self) -> bool:
+        return random.random() < self.sample_rate
+
+    def record_hit(self) -> None:
+        self._increment({"hits": 1})
+
+    def record_exact(
+        self, key: str, route: Route, exact: float, approximate: Optional[float]
+    ) -> None:
+        if approximate is None:
+            set_cached(BUCKET_CACHE_PREFIX, key, exact, BUCKET_CACHE_EXPIRY)
+            self._increment({"misses": 1})
+        elif exact == 0:
+            # Pontas no mesmo nó do OSRM: erro relativo indefinido
+            self._increment({"sampled": 1, "zero_distance": 1})
+        else:
+            self._increment(
+                {"sampled": 1, _error_field(abs(approximate - exact) / exact): 1}
+            )
+
+        cache_client = CacheClient()
+        if cache_client.is_available():
+            origin_lon, origin_lat, dest_lon, dest_lat = route
+            cache_client.append_capped(
+                SAMPLES_KEY,
+                {
+                    "origin_lon": origin_lon,
+                    "origin_lat": origin_lat,
+                    "dest_lon": dest_lon,
+                    "dest_lat": dest_lat,
+                    "distance_km": float(exact),
+                },
+                OSRM_SAMPLES_MAX_LENGTH,
+            )
+
+    def _increment(self, fields: Dict[str, int]) -> None:
+        cache_client = CacheClient()
+        if cache_client.is_available():
+            cache_client.increment(BUCKET_STATS_KEY, fields)
+
+
+def _error_field(error: float) -> str:
+    for threshold in ERROR_THRESHOLDS:
+        if error <= threshold:
+            return f"error_le_{threshold:g}"
+    return "error_gt_" + f"{ERROR_THRESHOLDS[-1]:g}"
+
+
+def get_bucket_stats() -> Dict[str, int]:
+    return CacheClient().get_counts(BUCKET_STATS_KEY)
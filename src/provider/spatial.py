@@ -0,0 +1,45 @@
+import math
+from typing import List, Tuple
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_KM_PER_DEGREE = 111.32
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars: List[str] = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    # Tamanho da célula em graus (latitude, longitude).
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def geohash_cell_diagonal_km(precision: int, latitude: float) -> float:
+    lat_degrees, lon_degrees = geohash_cell_size(precision)
+    height = lat_degrees * _KM_PER_DEGREE
+    width = lon_degrees * _KM_PER_DEGREE * math.cos(math.radians(latitude))
+    return math.hypot(height, width)
@@ -0,0 +1,61 @@
+from typing import TYPE_CHECKING, Any, Dict
+
+from exceptions import (
+    DeadlineExceededError,
+    ExternalAPIError,
+    FreightError,
+    RateLimitError,
+)
+from lazy import lazy_import
+from model.freight import Freight
+
+if TYPE_CHECKING:
+    import pybreaker
+else:
+    pybreaker = lazy_import("pybreaker")
+
+# Formato JSON das cotações e classificação dos erros, compartilhados pelo
+# serviço HTTP e pelo modo --batch.
+
+
+def is_unavailable(error: BaseException) -> bool:
+    # Falhas transitórias da camada de resiliência (circuito aberto, limite de
+    # taxa, prazo esgotado): o serviço externo está indisponível, não é bug.
+    return isinstance(
+        error, (pybreaker.CircuitBreakerError, RateLimitError, DeadlineExceededError)
+    )
+
+
+def is_unexpected(error: BaseException) -> bool:
+    return not isinstance(error, FreightError) and not is_unavailable(error)
+
+
+def error_status(error: BaseException) -> str:
+    if is_unavailable(error):
+        return "503 Service Unavailable"
+    if isinstance(error, ExternalAPIError):
+        return "502 Bad Gateway"
+    if isinstance(error, FreightError):
+        return "422 Unprocessable Entity"
+    return "500 Internal Server Error"
+
+
+def freight_to_dict(freight: Freight) -> Dict[str, Any]:
+    return {
+        "value": round(freight.value, 2),
+        "distance_km": round(freight.distance, 3),
+        "distance_provider": getattr(freight.distance, "provider", None),
+        "estimated": bool(getattr(freight.distance, "estimated", False)),
+        "weight": freight.weight,
+    }
+
+
+def error_to_dict(error: BaseException) -> Dict[str, Any]:
+    if isinstance(error, pybreaker.CircuitBreakerError):
+        return {
+            "error": "CircuitOpenError",
+            "message": "Upstream service temporarily unavailable.",
+        }
+    if isinstance(error, FreightError):
+        return {"error": type(error).__name__, "message": str(error)}
+    return {"error": "InternalError", "message": "Unexpected internal error."}
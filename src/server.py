@@ -0,0 +1,365 @@
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from socketserver import ThreadingMixIn
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from config import load_env
+
+from factories.provider_factory import CepProviderFactory
+from main import calculate_freight, calculate_freights
+from metrics import render_prometheus, snapshot
+from provider.cache import CacheClient
+from provider.cep import CepProvider
+from provider.services.brasil_api import BrasilApiProvider
+from provider.services.osrm_api import OSRMProvider
+from serialization import error_status, error_to_dict, freight_to_dict, is_unexpected
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+# Tempo para os workers concluírem as requisições em andamento ao desligar
+SERVER_GRACEFUL_TIMEOUT = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", "1048576"))
+SERVER_MAX_BATCH_SIZE = int(os.getenv("SERVER_MAX_BATCH_SIZE", "1000"))
+# Worker que morre antes de SERVER_WORKER_MIN_UPTIME segundos conta como falha
+# na subida; o reinício espera um back-off exponencial (até
+# SERVER_RESPAWN_MAX_DELAY) e, após SERVER_MAX_WORKER_FAILURES falhas seguidas
+# no mesmo slot, o master encerra o serviço.
+SERVER_WORKER_MIN_UPTIME = float(os.getenv("SERVER_WORKER_MIN_UPTIME", "5"))
+SERVER_RESPAWN_MAX_DELAY = float(os.getenv("SERVER_RESPAWN_MAX_DELAY", "30"))
+SERVER_MAX_WORKER_FAILURES = int(os.getenv("SERVER_MAX_WORKER_FAILURES", "5"))
+
+StartResponse = Callable[..., Any]
+
+
+class HttpError(Exception):
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _parse_record(payload: Any) -> Dict[str, Any]:
+    if not isinstance(payload, dict):
+        raise HttpError("400 Bad Request", "Each quote must be a JSON object.")
+    try:
+        record: Dict[str, Any] = {
+            "weight": float(payload["weight"]),
+            "option": int(payload["option"]),
+        }
+        if payload.get("distance") is not None:
+            record["distance"] = float(payload["distance"])
+    except KeyError as e:
+        raise HttpError("400 Bad Request", f"Missing field: {e.args[0]}.")
+    except (TypeError, ValueError):
+        raise HttpError(
+            "400 Bad Request", "weight, option and distance must be numbers."
+        )
+    for field in ("origin_cep", "destination_cep"):
+        if payload.get(field) is not None:
+            record[field] = str(payload[field])
+    return record
+
+
+class FreightApp:
+    # Uma instância por worker: provedores e pools HTTP são criados uma vez
+    # (depois do fork) e reaproveitados por todas as requisições.
+    def __init__(self, cep_provider: Optional[CepProvider] = None):
+        self._cep_provider = cep_provider
+
+    def check_config(self) -> None:
+        # Roda no master, antes do fork: configuração inválida encerra o serviço
+        # uma vez, em vez de cada worker falhar ao subir.
+        required = ["OSRM_API_URL"]
+        if self._cep_provider is None:
+            required.append("BRASIL_API_URL")
+        missing = [name for name in required if not os.getenv(name)]
+        if missing:
+            raise ValueError(
+                f"{', '.join(missing)} not found in environment variables."
+            )
+
+    def warm_up(self) -> None:
+        if self._cep_provider is None:
+            self._cep_provider = CepProviderFactory().create_provider(
+                BrasilApiProvider()
+            )
+        OSRMProvider()
+        CacheClient().is_available()
+
+    def __call__(
+        self, environ: Mapping[str, Any], start_response: StartResponse
+    ) -> Iterable[bytes]:
+        method = environ.get("REQUEST_METHOD", "GET")
+        path = environ.get("PATH_INFO", "/")
+        if path == "/metrics" and method == "GET":
+            return self._metrics(environ, start_response)
+        try:
+            if path == "/health":
+                self._require_method(method, "GET")
+                status, body = "200 OK", {"status": "ok"}
+            elif path == "/freight":
+                self._require_method(method, "POST")
+                status, body = self._quote(self._read_json(environ))
+            elif path == "/freights":
+                self._require_method(method, "POST")
+                status, body = self._quote_batch(self._read_json(environ))
+            else:
+                raise HttpError("404 Not Found", f"No route for {path}.")
+        except HttpError as e:
+            reason = e.status.split(" ", 1)[1].replace(" ", "")
+            status, body = e.status, {"error": reason, "message": str(e)}
+        except Exception:
+            logger.exception("Unhandled error serving %s %s", method, path)
+            status, body = "500 Internal Server Error", error_to_dict(Exception())
+
+        payload = json.dumps(body).encode()
+        start_response(
+            status,
+            [
+                ("Content-Type", "application/json"),
+                ("Content-Length", str(len(payload))),
+            ],
+        )
+        return [payload]
+
+    @staticmethod
+    def _metrics(
+        environ: Mapping[str, Any], start_response: StartResponse
+    ) -> Iterable[bytes]:
+        # Métricas do worker que atendeu (cada processo tem seu registro).
+        if "format=json" in environ.get("QUERY_STRING", ""):
+            payload = json.dumps(snapshot()).encode()
+            content_type = "application/json"
+        else:
+            payload = render_prometheus().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        start_response(
+            "200 OK",
+            [("Content-Type", content_type), ("Content-Length", str(len(payload)))],
+        )
+        return [payload]
+
+    def _quote(self, payload: Any) -> Tuple[str, Dict[str, Any]]:
+        record = _parse_record(payload)
+        try:
+            freight = calculate_freight(**record, cep_provider=self._cep_provider)
+        except Exception as e:
+            # Indisponibilidade do serviço externo (503) não é bug: sem traceback.
+            if is_unexpected(e):
+                logger.exception("Unexpected error calculating freight")
+            return error_status(e), error_to_dict(e)
+        return "200 OK", {**freight_to_dict(freight), "option": record["option"]}
+
+    def _quote_batch(self, payload: Any) -> Tuple[str, Dict[str, Any]]:
+        items = payload.get("items") if isinstance(payload, dict) else None
+        if not isinstance(items, list):
+            raise HttpError("400 Bad Request", "Expected an object with an items list.")
+        if len(items) > SERVER_MAX_BATCH_SIZE:
+            raise HttpError(
+                "413 Payload Too Large",
+                f"A batch accepts at most {SERVER_MAX_BATCH_SIZE} items.",
+            )
+
+        records = [_parse_record(item) for item in items]
+        results: List[Dict[str, Any]] = []
+        for record, result in zip(
+            records, calculate_freights(records, cep_provider=self._cep_provider)
+        ):
+            if isinstance(result, Exception):
+                results.append(error_to_dict(result))
+            else:
+                results.append({**freight_to_dict(result), "option": record["option"]})
+        return "200 OK", {"results": results}
+
+    @staticmethod
+    def _require_method(method: str, expected: str) -> None:
+        if method != expected:
+            raise HttpError("405 Method Not Allowed", f"Use {expected}.")
+
+    @staticmethod
+    def _read_json(environ: Mapping[str, Any]) -> Any:
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        if length > SERVER_MAX_BODY_BYTES:
+            raise HttpError("413 Payload Too Large", "Request body is too large.")
+        try:
+            return json.loads(environ["wsgi.input"].read(length) or b"null")
+        except ValueError:
+            raise HttpError("400 Bad Request", "Request body must be valid JSON.")
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = False
+    block_on_close = True
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def _create_listener(host: str, port: int) -> socket.socket:
+    return socket.create_server((host, port), backlog=128)
+
+
+def _serve_worker(listener: socket.socket, app: FreightApp) -> None:
+    # Todos os workers aceitam conexões do mesmo socket criado antes do fork.
+    host, port = listener.getsockname()[:2]
+    server = ThreadingWSGIServer(
+        (host, port), QuietRequestHandler, bind_and_activate=False
+    )
+    server.socket.close()
+    server.socket = listener
+    server.server_address = (host, port)
+    server.server_name = socket.getfqdn(host)
+    server.server_port = port
+    server.setup_environ()
+    server.set_app(app)
+
+    def stop(signum: int, frame: Any) -> None:
+        # shutdown() bloqueia até o loop parar, então roda fora do handler.
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    app.warm_up()
+    try:
+        server.serve_forever()
+    finally:
+        # Espera as requisições em andamento terminarem (block_on_close).
+        server.server_close()
+
+
+def _respawn_delay(failures: int) -> float:
+    if failures <= 0:
+        return 0.0
+    return min(SERVER_RESPAWN_MAX_DELAY, 0.5 * 2 ** (failures - 1))
+
+
+def serve(
+    host: str = SERVER_HOST,
+    port: int = SERVER_PORT,
+    workers: int = SERVER_WORKERS,
+    app_factory: Callable[[], FreightApp] = FreightApp,
+) -> None:
+    # O app é criado uma vez no master; provedores e pools só são criados no
+    # warm_up, dentro de cada worker.
+    app = app_factory()
+    app.check_config()
+    listener = _create_listener(host, port)
+    logger.info(f"Serving on {host}:{listener.getsockname()[1]} with {workers} workers")
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        _serve_worker(listener, app)
+        return
+
+    children: Dict[int, int] = {}
+    started: Dict[int, float] = {}
+    failures = [0] * workers
+    respawn_at: Dict[int, float] = {}
+    stopping = threading.Event()
+    crash_loop = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                _serve_worker(listener, app)
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = slot
+        started[slot] = time.monotonic()
+
+    def stop(signum: int, frame: Any) -> None:
+        stopping.set()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(workers):
+        spawn(slot)
+
+    deadline: Optional[float] = None
+    while children or (respawn_at and not stopping.is_set()):
+        if stopping.is_set() and deadline is None:
+            deadline = time.monotonic() + SERVER_GRACEFUL_TIMEOUT
+        if deadline is not None and time.monotonic() > deadline:
+            for pid in list(children):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        if not stopping.is_set():
+            for slot, due in list(respawn_at.items()):
+                if time.monotonic() >= due:
+                    del respawn_at[slot]
+                    spawn(slot)
+        if not children:
+            time.sleep(0.1)
+            continue
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.1)
+            continue
+        slot = children.pop(pid, -1)
+        if slot < 0 or stopping.is_set():
+            continue
+
+        if time.monotonic() - started[slot] < SERVER_WORKER_MIN_UPTIME:
+            failures[slot] += 1
+        else:
+            failures[slot] = 0
+        if failures[slot] >= SERVER_MAX_WORKER_FAILURES:
+            logger.error(
+                f"Worker slot {slot} failed {failures[slot]} times in a row "
+                "right after starting, shutting down"
+            )
+            crash_loop = True
+            stop(signal.SIGTERM, None)
+            continue
+        delay = _respawn_delay(failures[slot])
+        logger.warning(
+            f"Worker {pid} exited with status {status}, restarting in {delay:g}s"
+        )
+        respawn_at[slot] = time.monotonic() + delay
+
+    listener.close()
+    if crash_loop:
+        raise RuntimeError("Workers keep crashing on startup.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        serve()
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -1,14 +1,65 @@
-from dotenv import load_dotenv
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from config import load_env
+from concurrency import BATCH_MAX_WORKERS, run_concurrently
 from exceptions import ExternalAPIError
-from provider.cep import CepProvider
-from provider.services.osrm_api import OSRMProvider
+from provider.cep import AsyncCepProvider, CepProvider
+from factories.provider_factory import DistanceProviderFactory
+from provider.distance import AsyncDistanceProvider, Coordinate, DistanceProvider
+from provider.services.osrm_api import AsyncOSRMProvider
 from validation import Validation
-from provider.resilience import with_retry
+from model.cep import Coordinates
+from provider.cache import cached, get_cached_many, set_cached_many
+from provider.cache_keys import cep_pair_key, format_cache_key
+from provider.serializers import FloatSerializer
+from lazy import lazy_import
+
+if TYPE_CHECKING:
+    import asyncio
+else:
+    asyncio = lazy_import("asyncio")
+
+load_env()
+
+CEP_DISTANCE_CACHE_PREFIX = "cep_distance"
+# Nome fixo na chave: as buscas em lote leem as entradas de
+# get_distance_between_ceps
+CEP_DISTANCE_CACHE_KEY_NAME = "get_distance_between_ceps"
+CEP_DISTANCE_CACHE_EXPIRY = 86400  # Cache por 24 horas
+CEP_DISTANCE_L1_MAX_ENTRIES = int(os.getenv("CEP_DISTANCE_L1_MAX_ENTRIES", "10000"))
+CEP_DISTANCE_L1_TTL = float(os.getenv("CEP_DISTANCE_L1_TTL", "300"))
+
+
+def _get_coordinates(data: Dict[str, Any]) -> Coordinate:
+    return Coordinates.from_cep_data(data).lon_lat()
+
+
+def is_estimated(distance: Any) -> bool:
+    return bool(getattr(distance, "estimated", False))
 
-load_dotenv()
 
+def _cep_pair_cache_key(origin_cep: str, destination_cep: str) -> str:
+    return format_cache_key(
+        CEP_DISTANCE_CACHE_PREFIX,
+        CEP_DISTANCE_CACHE_KEY_NAME,
+        (origin_cep, destination_cep),
+        {},
+        cep_pair_key,
+    )
 
-@with_retry(max_attempts=2, min_wait=1.0, max_wait=3.0)
+
+@cached(
+    prefix=CEP_DISTANCE_CACHE_PREFIX,
+    expiry=CEP_DISTANCE_CACHE_EXPIRY,
+    l1_max_entries=CEP_DISTANCE_L1_MAX_ENTRIES,
+    l1_ttl=CEP_DISTANCE_L1_TTL,
+    serializer=FloatSerializer(),
+    key_builder=cep_pair_key,
+    key_name=CEP_DISTANCE_CACHE_KEY_NAME,
+    legacy_keys=True,
+    cache_if=lambda distance: not is_estimated(distance),
+)
 def get_distance_between_ceps(
     origin_cep: str, destination_cep: str, cep_provider: CepProvider
 ) -> float:
@@ -20,11 +71,139 @@ def get_distance_between_ceps(
     ) or not Validation.has_valid_coordinates(destination_data):
         raise ExternalAPIError(f"CEP {origin_cep} or {destination_cep} is invalid.")
 
-    origin_coords = origin_data["location"]["coordinates"]
-    destination_coords = destination_data["location"]["coordinates"]
-
-    lon1, lat1 = origin_coords["longitude"], origin_coords["latitude"]
-    lon2, lat2 = destination_coords["longitude"], destination_coords["latitude"]
+    lon1, lat1 = _get_coordinates(origin_data)
+    lon2, lat2 = _get_coordinates(destination_data)
 
-    distance_provider = OSRMProvider()
+    distance_provider = DistanceProviderFactory().create_provider()
     return distance_provider.get_distance(lon1, lat1, lon2, lat2)
+
+
+async def get_distance_between_ceps_async(
+    origin_cep: str,
+    destination_cep: str,
+    cep_provider: AsyncCepProvider,
+    distance_provider: Optional[AsyncDistanceProvider] = None,
+) -> float:
+    origin_data, destination_data = await asyncio.gather(
+        cep_provider.get_cep_data(origin_cep),
+        cep_provider.get_cep_data(destination_cep),
+    )
+
+    if not Validation.has_valid_coordinates(
+        origin_data
+    ) or not Validation.has_valid_coordinates(destination_data):
+        raise ExternalAPIError(f"CEP {origin_cep} or {destination_cep} is invalid.")
+
+    lon1, lat1 = _get_coordinates(origin_data)
+    lon2, lat2 = _get_coordinates(destination_data)
+
+    provider = distance_provider or AsyncOSRMProvider()
+    return await provider.get_distance(lon1, lat1, lon2, lat2)
+
+
+def get_distances_between_ceps(
+    cep_pairs: Sequence[Tuple[str, str]],
+    cep_provider: CepProvider,
+    distance_provider: Optional[DistanceProvider] = None,
+    max_workers: int = BATCH_MAX_WORKERS,
+) -> List[Union[float, Exception]]:
+    pairs = [
+        (Validation.normalize_cep(origin), Validation.normalize_cep(destination))
+        for origin, destination in cep_pairs
+    ]
+
+    pair_keys = {pair: _cep_pair_cache_key(*pair) for pair in dict.fromkeys(pairs)}
+    cached_distances = get_cached_many(
+        CEP_DISTANCE_CACHE_PREFIX, list(pair_keys.values())
+    )
+    distances: Dict[Tuple[str, str], Union[float, Exception]] = {
+        pair: cached_distances[key]
+        for pair, key in pair_keys.items()
+        if key in cached_distances
+    }
+    missing = [pair for pair in pair_keys if pair not in distances]
+    if missing:
+        distances.update(
+            zip(
+                missing,
+                _resolve_distances(
+                    missing, cep_provider, distance_provider, max_workers
+                ),
+            )
+        )
+        set_cached_many(
+            CEP_DISTANCE_CACHE_PREFIX,
+            {
+                pair_keys[pair]: distances[pair]
+                for pair in missing
+                if not isinstance(distances[pair], Exception)
+                and not is_estimated(distances[pair])
+            },
+            CEP_DISTANCE_CACHE_EXPIRY,
+        )
+
+    return [distances[pair] for pair in pairs]
+
+
+def _resolve_distances(
+    pairs: Sequence[Tuple[str, str]],
+    cep_provider: CepProvider,
+    distance_provider: Optional[DistanceProvider],
+    max_workers: int,
+) -> List[Union[float, Exception]]:
+    cep_data = cep_provider.get_cep_data_many(
+        list(dict.fromkeys(cep for pair in pairs for cep in pair)),
+        max_workers=max_workers,
+    )
+
+    coordinates: Dict[str, Union[Coordinate, Exception]] = {}
+    for cep, data in cep_data.items():
+        if isinstance(data, Exception):
+            coordinates[cep] = data
+        elif not Validation.has_valid_coordinates(data):
+            coordinates[cep] = ExternalAPIError(f"CEP {cep} is invalid.")
+        else:
+            coordinates[cep] = _get_coordinates(data)
+
+    routes: List[Union[Tuple[Coordinate, Coordinate], Exception]] = []
+    for origin, destination in pairs:
+        origin_coords = coordinates[origin]
+        destination_coords = coordinates[destination]
+        if isinstance(origin_coords, Exception):
+            routes.append(origin_coords)
+        elif isinstance(destination_coords, Exception):
+            routes.append(destination_coords)
+        else:
+            routes.append((origin_coords, destination_coords))
+
+    destinations_by_origin: Dict[Coordinate, Dict[Coordinate, int]] = {}
+    for route in routes:
+        if not isinstance(route, Exception):
+            destinations = destinations_by_origin.setdefault(route[0], {})
+            destinations.setdefault(route[1], len(destinations))
+
+    provider = distance_provider or DistanceProviderFactory().create_provider()
+    rows = run_concurrently(
+        lambda origin: provider.get_distance_matrix(
+            [origin], list(destinations_by_origin[origin])
+        )[0],
+        destinations_by_origin,
+        max_workers,
+    )
+
+    results: List[Union[float, Exception]] = []
+    for route in routes:
+        if isinstance(route, Exception):
+            results.append(route)
+            continue
+        row = rows[route[0]]
+        if isinstance(row, Exception):
+            results.append(row)
+            continue
+        distance = row[destinations_by_origin[route[0]][route[1]]]
+        if distance is None:
+            results.append(ExternalAPIError("Distance not found in OSRM response."))
+        else:
+            results.append(distance)
+
+    return results
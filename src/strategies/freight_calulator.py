@@ -1,16 +1,51 @@
+from typing import Any, Optional, Sequence
+
 from strategies.freight_strategy import FreightStrategy
 
 
 class NormalFreight(FreightStrategy):
-    def calculate(self, distance: float, weight: float) -> float:
+    def calculate(
+        self, distance: float, weight: float, destination_cep: Optional[str] = None
+    ) -> float:
         return distance * weight + 5
 
+    def _calculate_array(
+        self,
+        np: Any,
+        distances: Any,
+        weights: Any,
+        destination_ceps: Optional[Sequence[Optional[str]]],
+    ) -> Any:
+        return distances * weights + 5
+
 
 class SedexFreight(FreightStrategy):
-    def calculate(self, distance: float, weight: float) -> float:
+    def calculate(
+        self, distance: float, weight: float, destination_cep: Optional[str] = None
+    ) -> float:
         return distance * weight + 10
 
+    def _calculate_array(
+        self,
+        np: Any,
+        distances: Any,
+        weights: Any,
+        destination_ceps: Optional[Sequence[Optional[str]]],
+    ) -> Any:
+        return distances * weights + 10
+
 
 class Sedex10Freight(FreightStrategy):
-    def calculate(self, distance: float, weight: float) -> float:
+    def calculate(
+        self, distance: float, weight: float, destination_cep: Optional[str] = None
+    ) -> float:
         return distance * weight + 15
+
+    def _calculate_array(
+        self,
+        np: Any,
+        distances: Any,
+        weights: Any,
+        destination_ceps: Optional[Sequence[Optional[str]]],
+    ) -> Any:
+        return distances * weights + 15
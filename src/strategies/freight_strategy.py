@@ -1,7 +1,88 @@
+import math
 from abc import ABC, abstractmethod
+from typing import Any, List, Optional, Sequence, Tuple
+
+from exceptions import FreightError
+from lazy import numpy_module
+
+# (valores, válidas): arrays NumPy (float64 e bool) quando disponível, senão
+# listas. Linhas inválidas (distância ou peso não positivos, fora da tarifa)
+# ficam com NaN e False em vez de levantar exceção.
+BatchResult = Tuple[Any, Any]
 
 
 class FreightStrategy(ABC):
     @abstractmethod
-    def calculate(self, distance: float, weight: float) -> float:
+    def calculate(
+        self, distance: float, weight: float, destination_cep: Optional[str] = None
+    ) -> float:
         pass
+
+    def calculate_batch(
+        self,
+        distances: Sequence[float],
+        weights: Sequence[float],
+        destination_ceps: Optional[Sequence[Optional[str]]] = None,
+    ) -> BatchResult:
+        if len(distances) != len(weights) or (
+            destination_ceps is not None and len(destination_ceps) != len(weights)
+        ):
+            raise ValueError("Batch columns must have the same length.")
+
+        np = numpy_module()
+        if np is None:
+            return self._calculate_rows(distances, weights, destination_ceps)
+
+        distance_array = np.asarray(distances, dtype=np.float64)
+        weight_array = np.asarray(weights, dtype=np.float64)
+        # Mesma validação do Freight; NaN também não passa em "> 0".
+        valid = (distance_array > 0) & (weight_array > 0)
+        with np.errstate(invalid="ignore"):
+            values = self._calculate_array(
+                np, distance_array, weight_array, destination_ceps
+            )
+        valid &= ~np.isnan(values)
+        return np.where(valid, values, np.nan), valid
+
+    def _calculate_array(
+        self,
+        np: Any,
+        distances: Any,
+        weights: Any,
+        destination_ceps: Optional[Sequence[Optional[str]]],
+    ) -> Any:
+        # Padrão para estratégias sem versão vetorizada: uma linha por vez.
+        ceps = destination_ceps or [None] * len(distances)
+        return np.fromiter(
+            (
+                self._row_value(distance, weight, cep)
+                for distance, weight, cep in zip(
+                    distances.tolist(), weights.tolist(), ceps
+                )
+            ),
+            dtype=np.float64,
+            count=len(distances),
+        )
+
+    def _calculate_rows(
+        self,
+        distances: Sequence[float],
+        weights: Sequence[float],
+        destination_ceps: Optional[Sequence[Optional[str]]],
+    ) -> BatchResult:
+        ceps = destination_ceps or [None] * len(distances)
+        values: List[float] = []
+        valid: List[bool] = []
+        for distance, weight, cep in zip(distances, weights, ceps):
+            value = math.nan
+            if distance > 0 and weight > 0:
+                value = self._row_value(distance, weight, cep)
+            values.append(value)
+            valid.append(not math.isnan(value))
+        return values, valid
+
+    def _row_value(self, distance: float, weight: float, cep: Optional[str]) -> float:
+        try:
+            return float(self.calculate(distance, weight, cep))
+        except FreightError:
+            return math.nan
@@ -0,0 +1,321 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from exceptions import DistanceInvalidError, FreightTypeInvalidError, WeightInvalidError
+from strategies.freight_strategy import FreightStrategy
+from validation import Validation
+
+logger = logging.getLogger(__name__)
+
+# Formato do arquivo (JSON):
+# {
+#   "options": {
+#     "1": {
+#       "name": "Normal",
+#       "weight_bands": [1, 5, 10],        limites superiores (kg), crescentes
+#       "distance_bands": [100, 500],      limites superiores (km), crescentes
+#       "prices": [[10, 15], [12, 18], [20, 30]],   uma linha por faixa de peso
+#       "excess_kg_rate": 2.5,             opcional: por kg acima da última faixa
+#       "excess_km_rate": 0.05             opcional: por km acima da última faixa
+#     }
+#   },
+#   "surcharges": [
+#     {"name": "Norte", "cep_start": "66000000", "cep_end": "69999999",
+#      "percent": 20, "fixed": 5}
+#   ]
+# }
+
+
+def _bounds(values: Any, field: str) -> Tuple[float, ...]:
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"{field} must be a non-empty list.")
+    bounds = tuple(float(value) for value in values)
+    if bounds[0] <= 0 or any(a >= b for a, b in zip(bounds, bounds[1:])):
+        raise ValueError(f"{field} must be positive and strictly increasing.")
+    return bounds
+
+
+def _optional_rate(value: Any, field: str) -> Optional[float]:
+    if value is None:
+        return None
+    rate = float(value)
+    if rate < 0:
+        raise ValueError(f"{field} must not be negative.")
+    return rate
+
+
+def _cep_number(value: Any) -> int:
+    cep = Validation.normalize_cep(str(value))
+    if not Validation.is_valid_cep(cep):
+        raise ValueError(f"Invalid CEP in tariff table: {cep!r}.")
+    return int(cep)
+
+
+class RegionalSurcharges:
+    # Faixas de CEP de destino ordenadas e sem sobreposição; a busca é uma
+    # bisseção sobre os inícios das faixas.
+    def __init__(self, entries: Sequence[Mapping[str, Any]] = ()):
+        ranges = sorted(
+            (
+                _cep_number(entry.get("cep_start")),
+                _cep_number(entry.get("cep_end")),
+                float(entry.get("percent", 0)),
+                float(entry.get("fixed", 0)),
+                str(entry.get("name", "")),
+            )
+            for entry in entries
+        )
+        if any(start > end for start, end, *_ in ranges):
+            raise ValueError("Surcharge cep_start must not exceed cep_end.")
+        if any(b[0] <= a[1] for a, b in zip(ranges, ranges[1:])):
+            raise ValueError("Surcharge CEP ranges must not overlap.")
+        self._starts = tuple(entry[0] for entry in ranges)
+        self._ends = tuple(entry[1] for entry in ranges)
+        self._percents = tuple(entry[2] for entry in ranges)
+        self._fixed = tuple(entry[3] for entry in ranges)
+        self.names = tuple(entry[4] for entry in ranges)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def index(self, cep: Optional[str]) -> int:
+        if not cep or not self._starts:
+            return -1
+        normalized = Validation.normalize_cep(cep)
+        if not normalized.isdigit():
+            return -1
+        number = int(normalized)
+        index = bisect_right(self._starts, number) - 1
+        if index < 0 or number > self._ends[index]:
+            return -1
+        return index
+
+    def apply(self, value: float, cep: Optional[str]) -> float:
+        index = self.index(cep)
+        if index < 0:
+            return value
+        return value * (1 + self._percents[index] / 100) + self._fixed[index]
+
+    def apply_array(
+        self, np: Any, values: Any, ceps: Optional[Sequence[Optional[str]]]
+    ) -> Any:
+        if ceps is None or not self._starts:
+            return values
+        indexes = np.fromiter(
+            (self.index(cep) for cep in ceps), dtype=np.intp, count=len(ceps)
+        )
+        # Sem acréscimo (-1) cai na última posição, que é neutra.
+        multipliers = np.asarray([1 + p / 100 for p in self._percents] + [1.0])
+        fixed = np.asarray(self._fixed + (0.0,))
+        return values * multipliers[indexes] + fixed[indexes]
+
+
+class TariffFreight(FreightStrategy):
+    # Compilada uma vez a partir de uma opção da tabela e compartilhada entre
+    # cotações (não muda depois): limites das faixas em tuplas ordenadas e
+    # busca por bisseção (O(log n)).
+    def __init__(
+        self,
+        name: str,
+        weight_bounds: Tuple[float, ...],
+        distance_bounds: Tuple[float, ...],
+        prices: Sequence[Sequence[float]],
+        excess_kg_rate: Optional[float] = None,
+        excess_km_rate: Optional[float] = None,
+        surcharges: Optional[RegionalSurcharges] = None,
+    ):
+        if len(prices) != len(weight_bounds) or any(
+            len(row) != len(distance_bounds) for row in prices
+        ):
+            raise ValueError(
+                f"{name}: prices must have one row per weight band and one "
+                "column per distance band."
+            )
+        self.name = name
+        self.weight_bounds = weight_bounds
+        self.distance_bounds = distance_bounds
+        # Matriz achatada: preço da faixa (p, d) em p * len(distance_bounds) + d
+        self._prices = tuple(float(price) for row in prices for price in row)
+        self.excess_kg_rate = excess_kg_rate
+        self.excess_km_rate = excess_km_rate
+        self.surcharges = surcharges or RegionalSurcharges()
+
+    def price(self, distance: float, weight: float) -> float:
+        excess = 0.0
+        weight_band = bisect_left(self.weight_bounds, weight)
+        if weight_band == len(self.weight_bounds):
+            if self.excess_kg_rate is None:
+                raise WeightInvalidError(
+                    f"Weight above the {self.name} tariff limit "
+                    f"({self.weight_bounds[-1]:g} kg)."
+                )
+            weight_band -= 1
+            excess += (weight - self.weight_bounds[-1]) * self.excess_kg_rate
+
+        distance_band = bisect_left(self.distance_bounds, distance)
+        if distance_band == len(self.distance_bounds):
+            if self.excess_km_rate is None:
+                raise DistanceInvalidError(
+                    f"Distance above the {self.name} tariff limit "
+                    f"({self.distance_bounds[-1]:g} km)."
+                )
+            distance_band -= 1
+            excess += (distance - self.distance_bounds[-1]) * self.excess_km_rate
+
+        return (
+            self._prices[weight_band * len(self.distance_bounds) + distance_band]
+            + excess
+        )
+
+    def calculate(
+        self, distance: float, weight: float, destination_cep: Optional[str] = None
+    ) -> float:
+        return self.surcharges.apply(self.price(distance, weight), destination_cep)
+
+    def _calculate_array(
+        self,
+        np: Any,
+        distances: Any,
+        weights: Any,
+        destination_ceps: Optional[Sequence[Optional[str]]],
+    ) -> Any:
+        weight_bands, weight_excess = _band_array(
+            np, weights, self.weight_bounds, self.excess_kg_rate
+        )
+        distance_bands, distance_excess = _band_array(
+            np, distances, self.distance_bounds, self.excess_km_rate
+        )
+        prices = np.asarray(self._prices)[
+            weight_bands * len(self.distance_bounds) + distance_bands
+        ]
+        return self.surcharges.apply_array(
+            np, prices + weight_excess + distance_excess, destination_ceps
+        )
+
+
+def _band_array(
+    np: Any, values: Any, bounds: Tuple[float, ...], excess_rate: Optional[float]
+) -> Tuple[Any, Any]:
+    # searchsorted(side="left") é o bisect_left de price(): limite inclusivo.
+    # Acima da última faixa sem taxa de excedente, a linha vira NaN (inválida).
+    bands = np.searchsorted(bounds, values, side="left")
+    above = bands == len(bounds)
+    if excess_rate is None:
+        excess = np.where(above, np.nan, 0.0)
+    else:
+        excess = np.where(above, (values - bounds[-1]) * excess_rate, 0.0)
+    return np.minimum(bands, len(bounds) - 1), excess
+
+
+class TariffTable:
+    def __init__(
+        self,
+        strategies: Mapping[int, TariffFreight],
+        surcharges: RegionalSurcharges,
+        source: Optional[str] = None,
+        mtime: Optional[float] = None,
+    ):
+        self._strategies = dict(strategies)
+        self.surcharges = surcharges
+        self.source = source
+        self.mtime = mtime
+
+    @property
+    def options(self) -> List[int]:
+        return sorted(self._strategies)
+
+    def strategy(self, option: int) -> TariffFreight:
+        strategy = self._strategies.get(option)
+        if strategy is None:
+            raise FreightTypeInvalidError("Invalid freight option.")
+        return strategy
+
+
+def compile_tariff_table(
+    data: Mapping[str, Any],
+    source: Optional[str] = None,
+    mtime: Optional[float] = None,
+) -> TariffTable:
+    options = data.get("options")
+    if not isinstance(options, dict) or not options:
+        raise ValueError("Tariff table must define at least one option.")
+    surcharges = RegionalSurcharges(data.get("surcharges") or ())
+
+    strategies: Dict[int, TariffFreight] = {}
+    for key, spec in options.items():
+        if not isinstance(spec, dict):
+            raise ValueError(f"Tariff option {key} must be an object.")
+        name = str(spec.get("name") or key)
+        strategies[int(key)] = TariffFreight(
+            name,
+            _bounds(spec.get("weight_bands"), f"{name}.weight_bands"),
+            _bounds(spec.get("distance_bands"), f"{name}.distance_bands"),
+            spec.get("prices") or [],
+            _optional_rate(spec.get("excess_kg_rate"), f"{name}.excess_kg_rate"),
+            _optional_rate(spec.get("excess_km_rate"), f"{name}.excess_km_rate"),
+            surcharges,
+        )
+    return TariffTable(strategies, surcharges, source, mtime)
+
+
+def load_tariff_table(path: str) -> TariffTable:
+    mtime = os.stat(path).st_mtime
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    if not isinstance(data, dict):
+        raise ValueError("Tariff table must be a JSON object.")
+    return compile_tariff_table(data, source=path, mtime=mtime)
+
+
+class TariffTableLoader:
+    # Mantém a tabela compilada do processo. A cada reload_interval segundos
+    # confere o mtime do arquivo e, se mudou, compila e troca a tabela inteira
+    # (as cotações em andamento seguem com a anterior). Um arquivo inválido
+    # num reload é ignorado e a tabela atual continua valendo.
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._table: Optional[TariffTable] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> TariffTable:
+        table = self._table
+        if table is None:
+            return self.reload()
+        if self.reload_interval > 0 and time.monotonic() >= self._next_check:
+            self._check(table)
+        return self._table or table
+
+    def _check(self, table: TariffTable) -> None:
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                changed = os.stat(self.path).st_mtime != table.mtime
+            except OSError as e:
+                logger.warning(f"Tariff table {self.path} unavailable: {e}")
+                return
+            if changed:
+                try:
+                    self._table = load_tariff_table(self.path)
+                    logger.info(f"Tariff table {self.path} reloaded")
+                except (OSError, ValueError, TypeError, KeyError) as e:
+                    logger.error(
+                        f"Invalid tariff table {self.path}, keeping the old one: {e}"
+                    )
+        finally:
+            self._lock.release()
+
+    def reload(self) -> TariffTable:
+        # Carga explícita: erros sobem para quem chamou.
+        with self._lock:
+            self._table = load_tariff_table(self.path)
+            self._next_check = time.monotonic() + self.reload_interval
+            return self._table
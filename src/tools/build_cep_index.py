@@ -0,0 +1,70 @@
+import argparse
+import csv
+import sys
+from typing import Iterator, List, Optional, Tuple
+
+from provider.services.local_cep_index import write_cep_index
+from validation import Validation
+
+
+def read_csv(
+    path: str,
+    cep_column: str = "cep",
+    latitude_column: str = "latitude",
+    longitude_column: str = "longitude",
+    delimiter: str = ",",
+    skipped: Optional[List[int]] = None,
+) -> Iterator[Tuple[str, float, float]]:
+    with open(path, newline="", encoding="utf-8") as file:
+        reader = csv.DictReader(file, delimiter=delimiter)
+        for line_number, row in enumerate(reader, start=2):
+            try:
+                cep = Validation.normalize_cep(row[cep_column] or "")
+                latitude = float(row[latitude_column])
+                longitude = float(row[longitude_column])
+            except (KeyError, TypeError, ValueError):
+                cep, latitude, longitude = "", 0.0, 0.0
+            if not Validation.is_valid_cep(cep) or not (
+                -90 <= latitude <= 90 and -180 <= longitude <= 180
+            ):
+                if skipped is not None:
+                    skipped.append(line_number)
+                continue
+            yield cep, latitude, longitude
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compile a CEP -> latitude/longitude CSV into a CEP index."
+    )
+    parser.add_argument("source", help="CSV file with the CEP dataset")
+    parser.add_argument("output", help="path of the binary index to write")
+    parser.add_argument("--cep-column", default="cep")
+    parser.add_argument("--latitude-column", default="latitude")
+    parser.add_argument("--longitude-column", default="longitude")
+    parser.add_argument("--delimiter", default=",")
+    args = parser.parse_args(argv)
+
+    skipped: List[int] = []
+    count = write_cep_index(
+        read_csv(
+            args.source,
+            args.cep_column,
+            args.latitude_column,
+            args.longitude_column,
+            args.delimiter,
+            skipped,
+        ),
+        args.output,
+    )
+    print(f"Wrote {count} CEPs to {args.output}", file=sys.stderr)
+    if skipped:
+        print(
+            f"Skipped {len(skipped)} invalid rows (first at line {skipped[0]})",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
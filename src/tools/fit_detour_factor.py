@@ -0,0 +1,105 @@
+import argparse
+import csv
+import json
+import statistics
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from provider.cache import CacheClient
+from provider.services.haversine import haversine_km
+from provider.services.osrm_buckets import OSRM_SAMPLES_MAX_LENGTH, SAMPLES_KEY
+
+FIELDS = ("origin_lon", "origin_lat", "dest_lon", "dest_lat", "distance_km")
+
+Sample = Tuple[float, float]
+
+
+def read_samples(path: str, min_km: float = 1.0) -> Iterator[Sample]:
+    rows: Iterable[Dict[str, Any]]
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) for line in file if line.strip())
+        else:
+            rows = csv.DictReader(file)
+        yield from to_samples(rows, min_km)
+
+
+def to_samples(rows: Iterable[Dict[str, Any]], min_km: float = 1.0) -> Iterator[Sample]:
+    # Cada amostra vira (distância em linha reta, distância real do OSRM).
+    for row in rows:
+        try:
+            origin_lon, origin_lat, dest_lon, dest_lat, road_km = (
+                float(row[field]) for field in FIELDS
+            )
+        except (KeyError, TypeError, ValueError):
+            continue
+        straight_km = haversine_km(origin_lon, origin_lat, dest_lon, dest_lat)
+        if straight_km >= min_km and road_km > 0:
+            yield straight_km, road_km
+
+
+def fit_detour_factor(samples: Iterable[Sample]) -> Tuple[float, Dict[str, float]]:
+    # Mínimos quadrados de road = factor * straight (reta pela origem).
+    samples = list(samples)
+    if not samples:
+        raise ValueError("No usable samples to fit the detour factor.")
+
+    factor = sum(straight * road for straight, road in samples) / sum(
+        straight * straight for straight, _ in samples
+    )
+    errors = [abs(factor * straight - road) / road for straight, road in samples]
+    return factor, {
+        "samples": len(samples),
+        "median_ratio": statistics.median(
+            road / straight for straight, road in samples
+        ),
+        "mean_abs_pct_error": 100 * statistics.fmean(errors),
+        "p95_abs_pct_error": 100 * sorted(errors)[int(0.95 * (len(errors) - 1))],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Fit HAVERSINE_DETOUR_FACTOR from exact OSRM distances."
+    )
+    parser.add_argument(
+        "samples",
+        nargs="?",
+        help=f"CSV or JSONL file with the columns {', '.join(FIELDS)}",
+    )
+    parser.add_argument(
+        "--from-redis",
+        action="store_true",
+        help="use the exact OSRM samples recorded in Redis by the bucket mode",
+    )
+    parser.add_argument(
+        "--min-km",
+        type=float,
+        default=1.0,
+        help="ignore pairs closer than this in a straight line",
+    )
+    args = parser.parse_args(argv)
+
+    if args.from_redis:
+        samples = to_samples(
+            CacheClient().get_list(SAMPLES_KEY, OSRM_SAMPLES_MAX_LENGTH), args.min_km
+        )
+    elif args.samples:
+        samples = read_samples(args.samples, args.min_km)
+    else:
+        parser.error("a samples file or --from-redis is required")
+
+    try:
+        factor, stats = fit_detour_factor(samples)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    for name, value in stats.items():
+        print(f"{name}: {value:.4f}", file=sys.stderr)
+    print(f"HAVERSINE_DETOUR_FACTOR={factor:.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -38,6 +38,10 @@ class Validation:
         if not cep:
             return False
 
-        cep = cep.replace("-", "")
+        cep = Validation.normalize_cep(cep)
 
         return bool(re.match(r"^\d{8}$", cep))
+
+    @staticmethod
+    def normalize_cep(cep: str) -> str:
+        return cep.strip().replace("-", "")
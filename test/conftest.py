@@ -0,0 +1,9 @@
+import pytest
+
+from provider.resilience import retry_budget
+
+
+@pytest.fixture(autouse=True)
+def no_retries(monkeypatch):
+    # Sem retries (nem back-off) por padrão; os testes de retry liberam o orçamento.
+    monkeypatch.setattr(retry_budget, "try_retry", lambda: False)
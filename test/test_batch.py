@@ -0,0 +1,107 @@
+import io
+import json
+import threading
+from unittest.mock import MagicMock, patch
+
+import pybreaker
+
+from batch import run_batch
+from exceptions import DeadlineExceededError, RateLimitError, WeightInvalidError
+from model.freight import Freight
+
+
+def quote(weight, option, origin_cep=None, destination_cep=None, distance=None, **_):
+    if weight <= 0:
+        raise WeightInvalidError("Weight must be a positive value.")
+    strategy = MagicMock()
+    strategy.calculate.return_value = distance * weight
+    return Freight(distance, weight, strategy)
+
+
+class TestRunBatch:
+    @patch("batch.calculate_freight", side_effect=quote)
+    def test_results_follow_input_order(self, mock_calculate):
+        release = threading.Event()
+
+        def slow_first(**record):
+            if record["distance"] == 1:
+                release.wait(timeout=2)
+            else:
+                release.set()
+            return quote(**record)
+
+        mock_calculate.side_effect = slow_first
+        lines = [
+            json.dumps({"weight": 1, "option": 1, "distance": distance})
+            for distance in (1, 2, 3)
+        ]
+        output = io.StringIO()
+
+        summary = run_batch(lines, output, max_workers=3, cep_provider=MagicMock())
+
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert [result["line"] for result in results] == [1, 2, 3]
+        assert summary.records == 3 and not summary.errors
+
+    @patch("batch.calculate_freight", side_effect=quote)
+    def test_errors_are_reported_per_line(self, mock_calculate):
+        lines = [
+            '{"weight": 2, "option": 1, "distance": 10}',
+            "",
+            "not json",
+            '{"weight": -1, "option": 1, "distance": 10}',
+        ]
+        output = io.StringIO()
+
+        summary = run_batch(
+            lines, output, max_workers=2, ordered=False, cep_provider=MagicMock()
+        )
+
+        results = {
+            result["line"]: result
+            for result in map(json.loads, output.getvalue().splitlines())
+        }
+        assert results[1]["value"] == 20.0
+        assert results[3]["error"] == "InvalidRecordError"
+        assert results[4]["error"] == "WeightInvalidError"
+        assert summary.errors == {"InvalidRecordError": 1, "WeightInvalidError": 1}
+        assert "records: 3" in summary.report()
+
+    @patch("batch.calculate_freight", side_effect=quote)
+    def test_input_is_read_lazily_within_window(self, mock_calculate):
+        consumed = []
+
+        def lines():
+            for distance in range(1, 101):
+                consumed.append(distance)
+                yield json.dumps({"weight": 1, "option": 1, "distance": distance})
+
+        class Output(io.StringIO):
+            def write(self, text):
+                # Nunca há mais que `window` registros lidos sem resposta
+                assert len(consumed) - self.getvalue().count("\n") <= 4
+                return super().write(text)
+
+        run_batch(lines(), Output(), max_workers=2, window=4, cep_provider=MagicMock())
+
+        assert len(consumed) == 100
+
+    @patch("batch.calculate_freight")
+    def test_upstream_outages_are_named_per_line(self, mock_calculate):
+        mock_calculate.side_effect = [
+            pybreaker.CircuitBreakerError("open"),
+            RateLimitError("Rate limit brasil_api exceeded"),
+            DeadlineExceededError("Request deadline exceeded."),
+            RuntimeError("bug"),
+        ]
+        lines = ['{"weight": 2, "option": 1, "distance": 10}'] * 4
+        output = io.StringIO()
+
+        summary = run_batch(lines, output, max_workers=1, cep_provider=MagicMock())
+
+        assert summary.errors == {
+            "CircuitOpenError": 1,
+            "RateLimitError": 1,
+            "DeadlineExceededError": 1,
+            "InternalError": 1,
+        }
@@ -0,0 +1,90 @@
+import unittest
+
+import redis
+import requests
+
+from bench.fake_redis import FakeRedisServer
+from bench.run import compare, percentile
+from bench.stubs import BrasilApiStub, OsrmStub, StubBehavior, StubServer
+
+
+class TestFakeRedis(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeRedisServer().start()
+        self.addCleanup(self.server.stop)
+        host, port = self.server.address
+        self.client = redis.Redis(host=host, port=port, socket_timeout=2)
+
+    def test_commands_used_by_the_cache(self):
+        self.client.set("a", b"1", ex=60)
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.mget(["a", "b"])
+        pipeline.pttl("a")
+        pipeline.pttl("b")
+        values, ttl_a, ttl_b = pipeline.execute()
+
+        self.assertEqual(values, [b"1", None])
+        self.assertGreater(ttl_a, 59000)
+        self.assertEqual(ttl_b, -2)
+
+        self.client.hincrby("stats", "hits", 2)
+        self.assertEqual(self.client.hgetall("stats"), {b"hits": b"2"})
+
+        self.assertTrue(self.client.set("lock", b"token", nx=True, px=1000))
+        self.assertIsNone(self.client.set("lock", b"other", nx=True, px=1000))
+
+
+class TestStubs(unittest.TestCase):
+    def test_stub_server_requires_a_route(self):
+        with self.assertRaises(TypeError):
+            StubServer()
+
+    def test_brasil_api_and_osrm_answer_like_the_real_services(self):
+        brasil_api = BrasilApiStub(StubBehavior(latency=0, jitter=0)).start()
+        osrm = OsrmStub(StubBehavior(latency=0, jitter=0)).start()
+        self.addCleanup(brasil_api.stop)
+        self.addCleanup(osrm.stop)
+
+        cep = requests.get(f"{brasil_api.url}/api/cep/v2/01001000", timeout=2).json()
+        coordinates = cep["location"]["coordinates"]
+        route = requests.get(
+            f"{osrm.url}/route/v1/driving/-46.63,-23.55;-43.20,-22.90", timeout=2
+        ).json()
+        table = requests.get(
+            f"{osrm.url}/table/v1/driving/-46.63,-23.55;-43.20,-22.90"
+            "?sources=0&destinations=1",
+            timeout=2,
+        ).json()
+
+        self.assertTrue(-34 < float(coordinates["latitude"]) < 6)
+        self.assertAlmostEqual(route["routes"][0]["distance"] / 1000, 467, delta=5)
+        self.assertEqual(table["distances"], [[route["routes"][0]["distance"]]])
+
+    def test_error_rate(self):
+        stub = BrasilApiStub(StubBehavior(latency=0, jitter=0, error_rate=1.0)).start()
+        self.addCleanup(stub.stop)
+
+        response = requests.get(f"{stub.url}/api/cep/v2/01001000", timeout=2)
+
+        self.assertEqual(response.status_code, 500)
+
+
+class TestBaselineComparison(unittest.TestCase):
+    def test_flags_only_regressions_beyond_tolerance_and_noise(self):
+        baseline = {
+            "cold": {"p50_ms": 20.0, "p99_ms": 40.0, "throughput_rps": 50.0},
+            "warm": {"p50_ms": 0.01, "p99_ms": 0.02, "throughput_rps": 9000.0},
+        }
+        current = {
+            "cold": {"p50_ms": 21.0, "p99_ms": 60.0, "throughput_rps": 40.0},
+            "warm": {"p50_ms": 0.03, "p99_ms": 0.05, "throughput_rps": 9500.0},
+        }
+
+        regressions = compare(current, baseline, tolerance=0.1)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("cold.p99_ms"))
+        self.assertTrue(regressions[1].startswith("cold.throughput_rps"))
+
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([1.0, 2.0, 3.0, 4.0], 50), 2.5)
@@ -1,9 +1,33 @@
+import asyncio
 import json
+import threading
+import time
 import unittest
-from unittest.mock import patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pybreaker
 import redis
-from provider.cache import CacheClient, cached
+from bench.fake_redis import FakeRedisServer
+from provider.cache import (
+    REDIS_RETRY_INTERVAL,
+    AsyncCacheClient,
+    CacheClient,
+    _single_flight,
+    LocalCache,
+    cached,
+    cached_many,
+    clear_local_caches,
+    get_cache_stats,
+)
+from provider.cache_keys import cep_key, format_cache_key
+from provider.serializers import (
+    CoordinatesSerializer,
+    FloatSerializer,
+    VersionedSerializer,
+    register_serializer,
+)
+from provider.single_flight import AsyncSingleFlight, SingleFlight
 
 
 class TestCacheClient(unittest.TestCase):
@@ -56,6 +80,115 @@ class TestCacheClient(unittest.TestCase):
         self.assertTrue(result)
         mock_redis_instance.setex.assert_called_once()
 
+    @patch("redis.Redis")
+    def test_is_available_does_not_ping_while_healthy(self, mock_redis):
+        mock_redis_instance = MagicMock()
+        mock_redis_instance.ping.return_value = True
+        mock_redis.return_value = mock_redis_instance
+
+        client = CacheClient()
+
+        self.assertTrue(client.is_available())
+        self.assertTrue(client.is_available())
+        mock_redis_instance.ping.assert_called_once()
+
+    @patch("provider.cache.time.monotonic")
+    @patch("redis.Redis")
+    def test_marks_down_on_failure_and_recovers(self, mock_redis, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        mock_redis_instance = MagicMock()
+        mock_redis_instance.ping.return_value = True
+        mock_redis_instance.get.side_effect = redis.ConnectionError("Connection lost")
+        mock_redis.return_value = mock_redis_instance
+
+        client = CacheClient()
+        self.assertTrue(client.is_available())
+        self.assertIsNone(client.get("test_key"))
+        self.assertFalse(client.is_available())
+
+        mock_monotonic.return_value = 100.0 + REDIS_RETRY_INTERVAL
+        self.assertTrue(client.is_available())
+        self.assertEqual(mock_redis_instance.ping.call_count, 2)
+
+    @patch("provider.cache.time.monotonic")
+    @patch("redis.Redis")
+    def test_reconnects_after_startup_failure(self, mock_redis, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        mock_redis_instance = MagicMock()
+        mock_redis_instance.ping.return_value = True
+        mock_redis.side_effect = [redis.ConnectionError("Connection error")] * 2 + [
+            mock_redis_instance
+        ]
+
+        client = CacheClient()
+        self.assertFalse(client.is_available())
+        self.assertFalse(client.is_available())
+
+        mock_monotonic.return_value = 100.0 + REDIS_RETRY_INTERVAL
+        self.assertTrue(client.is_available())
+        self.assertIs(client._redis, mock_redis_instance)
+
+    @patch("redis.Redis")
+    def test_get_many_uses_mget(self, mock_redis):
+        mock_redis_instance = MagicMock()
+        mock_redis_instance.mget.return_value = [json.dumps(1), None, "{invalid"]
+        mock_redis.return_value = mock_redis_instance
+
+        client = CacheClient()
+
+        self.assertEqual(client.get_many(["a", "b", "c"]), [1, None, None])
+        mock_redis_instance.mget.assert_called_once_with(["a", "b", "c"])
+
+    @patch("redis.Redis")
+    def test_set_many_uses_pipeline(self, mock_redis):
+        mock_redis_instance = MagicMock()
+        pipeline = mock_redis_instance.pipeline.return_value
+        mock_redis.return_value = mock_redis_instance
+
+        client = CacheClient()
+
+        self.assertTrue(client.set_many({"a": 1, "b": {"c": 2}}, 60))
+        mock_redis_instance.pipeline.assert_called_once_with(transaction=False)
+        pipeline.setex.assert_any_call("a", 60, b"1")
+        pipeline.setex.assert_any_call("b", 60, b'{"c":2}')
+        pipeline.execute.assert_called_once()
+
+    @patch("redis.Redis")
+    def test_many_operations_degrade_when_redis_fails(self, mock_redis):
+        mock_redis_instance = MagicMock()
+        mock_redis_instance.mget.side_effect = redis.ConnectionError("Down")
+        mock_redis_instance.pipeline.side_effect = redis.ConnectionError("Down")
+        mock_redis.return_value = mock_redis_instance
+
+        client = CacheClient()
+
+        self.assertEqual(client.get_many(["a", "b"]), [None, None])
+        self.assertFalse(client.set_many({"a": 1}))
+
+
+class TestAsyncCacheClient(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeRedisServer().start()
+        self.addCleanup(self.server.stop)
+
+    def test_each_event_loop_gets_its_own_client(self):
+        host, port = self.server.address
+
+        async def round_trip(value):
+            client = AsyncCacheClient()
+            self.assertIs(AsyncCacheClient(), client)
+            await client.set("test_loop:key", value, 60)
+            return client, await client.get("test_loop:key")
+
+        with patch("provider.cache.REDIS_HOST", host), patch(
+            "provider.cache.REDIS_PORT", port
+        ):
+            first, first_value = asyncio.run(round_trip("first"))
+            second, second_value = asyncio.run(round_trip("second"))
+
+        self.assertIsNot(first, second)
+        self.assertEqual((first_value, second_value), ("first", "second"))
+
 
 class TestCachedDecorator(unittest.TestCase):
     @patch("provider.cache.CacheClient")
@@ -104,3 +237,456 @@ class TestCachedDecorator(unittest.TestCase):
         self.assertEqual(result, "foo_bar")
         mock_client.get.assert_not_called()
         mock_client.set.assert_not_called()
+
+    @patch("provider.cache.AsyncCacheClient")
+    def test_cached_decorator_async_miss(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available = AsyncMock(return_value=True)
+        mock_client.get = AsyncMock(return_value=None)
+        mock_client.set = AsyncMock(return_value=True)
+        mock_client_class.return_value = mock_client
+
+        @cached(prefix="test")
+        async def test_function(arg1, arg2):
+            return f"{arg1}_{arg2}"
+
+        result = asyncio.run(test_function("foo", "bar"))
+        self.assertEqual(result, "foo_bar")
+        mock_client.get.assert_awaited_once()
+        mock_client.set.assert_awaited_once_with(
+            "test:test_function:('foo', 'bar'):[]", "foo_bar", 3600
+        )
+
+
+class TestLocalCache(unittest.TestCase):
+    def setUp(self):
+        clear_local_caches()
+
+    def test_lru_eviction(self):
+        local_cache = LocalCache(max_entries=2, ttl=60)
+        local_cache.set("a", 1)
+        local_cache.set("b", 2)
+        local_cache.get("a")
+        local_cache.set("c", 3)
+
+        self.assertEqual(local_cache.get("a"), 1)
+        self.assertIsNone(local_cache.get("b"))
+        self.assertEqual(local_cache.get("c"), 3)
+
+    @patch("provider.cache.time.monotonic")
+    def test_ttl_expiry(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        local_cache = LocalCache(max_entries=10, ttl=5)
+        local_cache.set("a", 1)
+
+        mock_monotonic.return_value = 104.0
+        self.assertEqual(local_cache.get("a"), 1)
+        mock_monotonic.return_value = 105.0
+        self.assertIsNone(local_cache.get("a"))
+        self.assertEqual(len(local_cache), 0)
+
+    @patch("provider.cache.CacheClient")
+    def test_cached_decorator_checks_l1_before_redis(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get.side_effect = [None, "from_redis"]
+        mock_client_class.return_value = mock_client
+        calls = []
+
+        @cached(prefix="test_l1", l1_max_entries=10, l1_ttl=60)
+        def test_function(arg):
+            calls.append(arg)
+            return f"value_{arg}"
+
+        self.assertEqual(test_function("foo"), "value_foo")
+        self.assertEqual(test_function("foo"), "value_foo")
+        self.assertEqual(test_function("bar"), "from_redis")
+        self.assertEqual(test_function("bar"), "from_redis")
+
+        self.assertEqual(calls, ["foo"])
+        self.assertEqual(mock_client.get.call_count, 2)
+        mock_client.set.assert_called_once()
+        self.assertEqual(
+            get_cache_stats()["test_l1"],
+            {"l1": {"hits": 2, "misses": 2}, "l2": {"hits": 1, "misses": 1}},
+        )
+
+
+class TestCachedManyDecorator(unittest.TestCase):
+    @patch("provider.cache.CacheClient")
+    def test_only_missing_items_are_fetched(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get_many.return_value = ["cached_a", None, None]
+        mock_client_class.return_value = mock_client
+        error = ValueError("failed")
+
+        @cached_many(prefix="test_many", key_name="lookup")
+        def lookup_many(items):
+            self.assertEqual(items, ["b", "c"])
+            return {"b": "value_b", "c": error}
+
+        result = lookup_many(["a", "b", "c", "a"])
+
+        self.assertEqual(result, {"a": "cached_a", "b": "value_b", "c": error})
+        mock_client.get_many.assert_called_once_with(
+            [
+                "test_many:lookup:('a',):[]",
+                "test_many:lookup:('b',):[]",
+                "test_many:lookup:('c',):[]",
+            ]
+        )
+        mock_client.set_many.assert_called_once_with(
+            {"test_many:lookup:('b',):[]": "value_b"}, 3600
+        )
+
+
+class TestLegacyKeys(unittest.TestCase):
+    @patch("provider.cache.CacheClient")
+    def test_legacy_entry_is_migrated_on_miss(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get_many_with_ttl.side_effect = [[(None, None)], [("old", 80.0)]]
+        mock_client_class.return_value = mock_client
+        calls = []
+
+        @cached(
+            prefix="test_legacy",
+            expiry=100,
+            stale_if_error=50,
+            key_builder=cep_key,
+            key_name="lookup",
+            legacy_keys=True,
+        )
+        def lookup(cep):
+            calls.append(cep)
+            return "new"
+
+        self.assertEqual(lookup("01001-000"), "old")
+        self.assertEqual(calls, [])
+        new_key = format_cache_key("test_legacy", "lookup", ("01001-000",), {}, cep_key)
+        self.assertEqual(
+            mock_client.get_many_with_ttl.call_args_list[1].args[0],
+            ["test_legacy:lookup:('01001-000',):[]"],
+        )
+        mock_client.set.assert_called_once_with(new_key, "old", 80)
+
+    @patch("provider.cache.CACHE_LEGACY_KEYS", False)
+    @patch("provider.cache.CacheClient")
+    def test_legacy_lookup_can_be_disabled(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get.return_value = None
+        mock_client_class.return_value = mock_client
+
+        @cached(
+            prefix="test_legacy_off",
+            key_builder=cep_key,
+            key_name="lookup",
+            legacy_keys=True,
+        )
+        def lookup(cep):
+            return "new"
+
+        self.assertEqual(lookup("01001000"), "new")
+        mock_client.get_many_with_ttl.assert_not_called()
+
+    @patch("provider.cache.CacheClient")
+    def test_cached_many_migrates_legacy_entries(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get_many.return_value = [None, None]
+        mock_client.get_many_with_ttl.return_value = [("old_a", None), (None, None)]
+        mock_client_class.return_value = mock_client
+
+        @cached_many(
+            prefix="test_legacy_many",
+            key_name="lookup",
+            key_builder=cep_key,
+            legacy_keys=True,
+        )
+        def lookup_many(items):
+            self.assertEqual(items, ["b"])
+            return {"b": "value_b"}
+
+        self.assertEqual(lookup_many(["a", "b"]), {"a": "old_a", "b": "value_b"})
+        mock_client.get_many_with_ttl.assert_called_once_with(
+            ["test_legacy_many:lookup:('a',):[]", "test_legacy_many:lookup:('b',):[]"]
+        )
+        mock_client.set.assert_called_once_with(
+            format_cache_key("test_legacy_many", "lookup", ("a",), {}, cep_key),
+            "old_a",
+            3600,
+        )
+
+
+class TestSingleFlight(unittest.TestCase):
+    @patch("provider.cache.CacheClient")
+    def test_concurrent_misses_call_function_once(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = False
+        mock_client_class.return_value = mock_client
+        release = threading.Event()
+        calls = []
+
+        @cached(prefix="test_flight")
+        def test_function(arg):
+            calls.append(arg)
+            release.wait(timeout=2)
+            return f"value_{arg}"
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(test_function, "foo") for _ in range(5)]
+            while _single_flight.in_flight() == 0:
+                time.sleep(0.001)
+            time.sleep(0.05)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, ["value_foo"] * 5)
+        self.assertEqual(calls, ["foo"])
+
+    def test_followers_receive_leader_error(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def failing():
+            started.set()
+            release.wait(timeout=2)
+            raise ValueError("failed")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(single_flight.do, "key", failing)
+            started.wait(timeout=2)
+            follower = executor.submit(single_flight.do, "key", lambda: "unused")
+            time.sleep(0.05)
+            release.set()
+
+            with self.assertRaises(ValueError):
+                leader.result()
+            with self.assertRaises(ValueError):
+                follower.result()
+
+    def test_async_concurrent_misses_call_function_once(self):
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        async def scenario():
+            single_flight = AsyncSingleFlight()
+            return await asyncio.gather(
+                *(single_flight.do("key", load) for _ in range(5))
+            )
+
+        self.assertEqual(asyncio.run(scenario()), ["value"] * 5)
+        self.assertEqual(calls, [1])
+
+    @patch("provider.cache.CACHE_LOCK_POLL_INTERVAL", 0.001)
+    @patch("provider.cache.CacheClient")
+    def test_waits_for_lock_holder_in_another_process(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get.return_value = None
+        mock_client.get_many_with_ttl.side_effect = [
+            [(None, None)],
+            [("filled_by_other_node", 86400.0)],
+        ]
+        mock_client.try_lock.return_value = None
+        mock_client_class.return_value = mock_client
+
+        @cached(prefix="test_lock", lock_timeout=1.0)
+        def test_function(arg):
+            raise AssertionError("Should wait for the lock holder")
+
+        self.assertEqual(test_function("foo"), "filled_by_other_node")
+        mock_client.try_lock.assert_called_once_with(
+            "test_lock:test_function:('foo',):[]:lock", 1.0
+        )
+        mock_client.unlock.assert_not_called()
+
+    @patch("provider.cache.CACHE_LOCK_POLL_INTERVAL", 0.001)
+    @patch("provider.cache.CacheClient")
+    def test_waiting_for_lock_ignores_expired_entries(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        # Idade 130s: passou do expiry (100), só vale com o circuito aberto
+        mock_client.get_many_with_ttl.return_value = [("expired", 20.0)]
+        mock_client.try_lock.return_value = None
+        mock_client_class.return_value = mock_client
+
+        @cached(
+            prefix="test_lock_expired", expiry=100, stale_if_error=50, lock_timeout=0.05
+        )
+        def test_function(arg):
+            return "fresh"
+
+        self.assertEqual(test_function("foo"), "fresh")
+        self.assertGreater(mock_client.get_many_with_ttl.call_count, 2)
+
+    @patch("provider.cache.CacheClient")
+    def test_lock_holder_computes_and_releases(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get.return_value = None
+        mock_client.try_lock.return_value = "token"
+        mock_client_class.return_value = mock_client
+
+        @cached(prefix="test_lock", lock_timeout=1.0)
+        def test_function(arg):
+            return f"value_{arg}"
+
+        self.assertEqual(test_function("foo"), "value_foo")
+        mock_client.set.assert_called_once()
+        mock_client.unlock.assert_called_once_with(
+            "test_lock:test_function:('foo',):[]:lock", "token"
+        )
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    @patch("provider.cache.CacheClient")
+    def test_stale_value_is_served_and_refreshed(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        # expiry 100 + grace 50, restam 90s: idade 60 >= stale_after 30
+        mock_client.get_many_with_ttl.return_value = [("old", 90.0)]
+        mock_client_class.return_value = mock_client
+        refreshed = threading.Event()
+
+        @cached(prefix="test_swr", expiry=100, stale_after=30, stale_if_error=50)
+        def test_function(arg):
+            refreshed.set()
+            return "new"
+
+        self.assertEqual(test_function("foo"), "old")
+        self.assertTrue(refreshed.wait(timeout=2))
+        for _ in range(100):
+            if mock_client.set.called:
+                break
+            time.sleep(0.01)
+        mock_client.set.assert_called_once_with(
+            "test_swr:test_function:('foo',):[]", "new", 150
+        )
+
+    @patch("provider.cache.CacheClient")
+    def test_fresh_value_is_not_refreshed(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get_many_with_ttl.return_value = [("cached", 140.0)]
+        mock_client_class.return_value = mock_client
+        calls = []
+
+        @cached(prefix="test_swr_fresh", expiry=100, stale_after=30, stale_if_error=50)
+        def test_function(arg):
+            calls.append(arg)
+            return "new"
+
+        self.assertEqual(test_function("foo"), "cached")
+        self.assertEqual(calls, [])
+
+    @patch("provider.cache.CacheClient")
+    def test_expired_value_served_only_when_circuit_open(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get_many_with_ttl.return_value = [("expired", 20.0)]
+        mock_client_class.return_value = mock_client
+        outcomes = [pybreaker.CircuitBreakerError("open"), "new"]
+
+        @cached(prefix="test_swr_grace", expiry=100, stale_if_error=50)
+        def test_function(arg):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.assertEqual(test_function("foo"), "expired")
+        self.assertEqual(test_function("foo"), "new")
+
+    @patch("provider.cache.CacheClient")
+    def test_no_refresh_while_circuit_open(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get_many_with_ttl.return_value = [("old", 90.0)]
+        mock_client_class.return_value = mock_client
+        breaker = pybreaker.CircuitBreaker(name="test_swr_breaker")
+        breaker.open()
+        calls = []
+
+        @cached(
+            prefix="test_swr_open",
+            expiry=100,
+            stale_after=30,
+            stale_if_error=50,
+            breaker=breaker,
+        )
+        def test_function(arg):
+            calls.append(arg)
+            return "new"
+
+        self.assertEqual(test_function("foo"), "old")
+        time.sleep(0.05)
+        self.assertEqual(calls, [])
+
+
+class TestSerializers(unittest.TestCase):
+    document = {
+        "cep": "01001000",
+        "street": "Praça da Sé",
+        "location": {
+            "type": "Point",
+            "coordinates": {"latitude": "-23.5503", "longitude": "-46.6339"},
+        },
+    }
+
+    def test_coordinates_are_stored_as_compact_record(self):
+        serializer = CoordinatesSerializer()
+
+        payload = serializer.dumps(self.document)
+
+        self.assertEqual(len(payload), 17)
+        self.assertEqual(payload[0], 1)
+        self.assertEqual(
+            serializer.loads(payload),
+            {
+                "location": {
+                    "coordinates": {"latitude": -23.5503, "longitude": -46.6339}
+                }
+            },
+        )
+
+    def test_legacy_json_entries_are_still_readable(self):
+        serializer = CoordinatesSerializer()
+
+        value = serializer.loads(json.dumps(self.document).encode())
+
+        self.assertEqual(value["location"]["coordinates"]["latitude"], -23.5503)
+        self.assertIsNone(serializer.loads(b"{invalid"))
+
+    def test_versioned_serializer_requires_pack_and_unpack(self):
+        with self.assertRaises(TypeError):
+            VersionedSerializer()
+
+    def test_float_serializer_round_trip(self):
+        serializer = FloatSerializer()
+
+        self.assertEqual(serializer.loads(serializer.dumps(430.25)), 430.25)
+        self.assertEqual(serializer.loads(b"430.25"), 430.25)
+
+    @patch("redis.Redis")
+    def test_client_uses_serializer_registered_for_prefix(self, mock_redis):
+        CacheClient._instance = None
+        self.addCleanup(setattr, CacheClient, "_instance", None)
+        mock_redis_instance = MagicMock()
+        mock_redis.return_value = mock_redis_instance
+        register_serializer("test_compact", FloatSerializer())
+
+        client = CacheClient()
+        client.set("test_compact:key", 1.5, 60)
+
+        payload = mock_redis_instance.setex.call_args.args[2]
+        self.assertEqual(len(payload), 9)
+        mock_redis_instance.get.return_value = payload
+        self.assertEqual(client.get("test_compact:key"), 1.5)
@@ -8,7 +8,8 @@ from exceptions import (
     FreightTypeInvalidError,
     WeightInvalidError,
 )
-from main import generate_freight
+from main import generate_freight, generate_freights
+from provider.distance import Distance
 
 
 class TestGenerateFreight:
@@ -81,9 +82,79 @@ class TestGenerateFreight:
         )
         assert result == f"The freight value is {expected_value:.2f}"
 
+    @patch("main.get_distance_between_ceps")
+    def test_generate_freight_reports_estimated_distance(self, mock_get_distance):
+        mock_get_distance.return_value = Distance(430.0, "haversine", estimated=True)
+
+        result = generate_freight(
+            weight=5.0, option=2, origin_cep="01001000", destination_cep="20040030"
+        )
+
+        assert result == (
+            "The freight value is 2160.00 (estimated distance: haversine)"
+        )
+
     @patch("main.get_distance_between_ceps", side_effect=ExternalAPIError("Test error"))
     def test_generate_freight_with_api_error(self, mock_get_distance):
         with pytest.raises(ExternalAPIError):
             generate_freight(
                 weight=5.0, option=1, origin_cep="01001000", destination_cep="20040030"
             )
+
+
+class TestGenerateFreights:
+    @patch("main.BrasilApiProvider")
+    @patch("main.get_distances_between_ceps")
+    def test_generate_freights_deduplicates_cep_pairs(
+        self, mock_get_distances, mock_provider_class
+    ):
+        mock_get_distances.return_value = [100.0, ExternalAPIError("Test error")]
+
+        results = generate_freights(
+            [
+                {"weight": 5.0, "option": 1, "distance": 10.0},
+                {
+                    "weight": 5.0,
+                    "option": 1,
+                    "origin_cep": "01001000",
+                    "destination_cep": "20040030",
+                },
+                {
+                    "weight": 2.0,
+                    "option": 2,
+                    "origin_cep": "01001000",
+                    "destination_cep": "20040030",
+                },
+                {
+                    "weight": 5.0,
+                    "option": 1,
+                    "origin_cep": "01001000",
+                    "destination_cep": "22041001",
+                },
+                {"weight": 5.0, "option": 0, "distance": 10.0},
+            ]
+        )
+
+        mock_get_distances.assert_called_once()
+        assert mock_get_distances.call_args.args[0] == [
+            ("01001000", "20040030"),
+            ("01001000", "22041001"),
+        ]
+        assert results[0] == "The freight value is 55.00"
+        assert results[1] == "The freight value is 505.00"
+        assert results[2] == "The freight value is 210.00"
+        assert isinstance(results[3], ExternalAPIError)
+        assert isinstance(results[4], FreightTypeInvalidError)
+
+    def test_generate_freights_without_ceps(self):
+        results = generate_freights(
+            [
+                {"weight": 2.0, "option": 1, "distance": 500},
+                {"weight": -1.0, "option": 1, "distance": 500},
+                {"weight": 2.0, "option": 1},
+            ]
+        )
+
+        assert results[0] == "The freight value is 1005.00"
+        assert isinstance(results[1], WeightInvalidError)
+        assert isinstance(results[2], DistanceInvalidError)
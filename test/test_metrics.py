@@ -0,0 +1,74 @@
+import unittest
+
+from metrics import Metric, Registry
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_collected_gauge_render_as_prometheus(self):
+        requests_total = self.registry.counter(
+            "requests_total", "Requests.", ("service",)
+        )
+        requests_total.inc("osrm")
+        requests_total.inc("osrm", amount=2)
+        self.registry.gauge(
+            "breaker_state", "State.", ("breaker",), collect=lambda: {("osrm",): 2}
+        )
+
+        text = self.registry.render_prometheus()
+
+        self.assertIn("# TYPE requests_total counter", text)
+        self.assertIn('requests_total{service="osrm"} 3', text)
+        self.assertIn("# TYPE breaker_state gauge", text)
+        self.assertIn('breaker_state{breaker="osrm"} 2', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        latency = self.registry.histogram(
+            "latency_seconds", "Latency.", ("service",), buckets=(0.1, 1.0)
+        )
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value, "osrm")
+
+        text = self.registry.render_prometheus()
+
+        self.assertIn('latency_seconds_bucket{service="osrm",le="0.1"} 2', text)
+        self.assertIn('latency_seconds_bucket{service="osrm",le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{service="osrm",le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_count{service="osrm"} 4', text)
+        self.assertIn('latency_seconds_sum{service="osrm"} 3.65', text)
+
+    def test_json_snapshot(self):
+        self.registry.counter("quotes_total", "Quotes.", ("outcome",)).inc("ok")
+        with self.registry.histogram("quote_seconds", "Quote latency.").time():
+            pass
+
+        snapshot = self.registry.snapshot()
+
+        self.assertEqual(
+            snapshot["quotes_total"],
+            {"type": "counter", "samples": [{"labels": {"outcome": "ok"}, "value": 1}]},
+        )
+        self.assertEqual(snapshot["quote_seconds"]["samples"][0]["count"], 1)
+
+    def test_label_values_are_escaped(self):
+        self.registry.counter("errors_total", "Errors.", ("reason",)).inc('bad "x"')
+
+        self.assertIn(
+            'errors_total{reason="bad \\"x\\""} 1', self.registry.render_prometheus()
+        )
+
+    def test_same_name_with_another_type_is_rejected(self):
+        counter = self.registry.counter("x_total", "X.")
+        self.assertIs(self.registry.counter("x_total", "X."), counter)
+
+        self.registry.gauge("y", "Y.")
+        with self.assertRaises(ValueError):
+            self.registry.counter("y", "Y.")
+        with self.assertRaises(ValueError):
+            self.registry.gauge("x_total", "X.")
+
+    def test_metric_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Metric("x", "X.")
@@ -0,0 +1,129 @@
+import io
+import json
+import math
+from unittest.mock import patch
+
+import pytest
+
+from exceptions import InvalidCepError
+from model.cep import CepRecord, Coordinates
+from model.freight import Freight
+from model.freight_batch import FreightBatch
+from strategies.freight_calulator import NormalFreight, SedexFreight
+
+CEP_DATA = {
+    "cep": "01001000",
+    "state": "SP",
+    "city": "São Paulo",
+    "location": {
+        "type": "Point",
+        "coordinates": {"latitude": "-23.5", "longitude": "-46.6"},
+    },
+}
+
+
+class TestSlots:
+    def test_freight_has_no_instance_dict(self):
+        freight = Freight(10.0, 2.0, NormalFreight())
+
+        assert not hasattr(freight, "__dict__")
+        assert freight.value == 25.0
+
+    def test_cep_record_round_trip(self):
+        record = CepRecord.from_cep_data("01001-000", CEP_DATA)
+
+        assert not hasattr(record, "__dict__")
+        assert record.coordinates == Coordinates(-23.5, -46.6)
+        assert record.coordinates.lon_lat() == (-46.6, -23.5)
+        assert CepRecord.from_cep_data("01001000", record.to_cep_data()) == record
+
+    def test_cep_record_requires_valid_coordinates(self):
+        with pytest.raises(InvalidCepError):
+            CepRecord.from_cep_data("01001000", {"cep": "01001000"})
+
+
+class TestFreightBatch:
+    def make_batch(self):
+        return FreightBatch.price(
+            distances=[10.0, 20.0, -1.0, 5.0],
+            weights=[2.0, 1.0, 1.0, 1.0],
+            options=[1, 2, 1, 9],
+        )
+
+    @pytest.mark.parametrize("numpy", [True, False])
+    def test_price_uses_the_strategies_and_masks_invalid_rows(self, numpy):
+        if numpy:
+            pytest.importorskip("numpy")
+            batch = self.make_batch()
+        else:
+            with patch("strategies.freight_strategy.numpy_module", return_value=None):
+                batch = self.make_batch()
+
+        assert list(batch.values)[:2] == [
+            NormalFreight().calculate(10.0, 2.0),
+            SedexFreight().calculate(20.0, 1.0),
+        ]
+        assert batch.valid_mask() == [True, True, False, False]
+
+    def test_rows_are_views_over_the_columns(self):
+        batch = self.make_batch()
+        row = batch[0]
+
+        batch.values[0] = 99.0
+
+        assert (row.distance, row.weight, row.option, row.value) == (
+            10.0,
+            2.0,
+            1,
+            99.0,
+        )
+        assert not batch[-1].valid
+        assert [r.option for r in batch] == [1, 2, 1, 9]
+        with pytest.raises(IndexError):
+            batch[4]
+
+    def test_from_freights(self):
+        batch = FreightBatch.from_freights([(Freight(10.0, 2.0, NormalFreight()), 1)])
+
+        assert len(batch) == 1
+        assert batch[0].value == 25.0
+
+    def test_csv_and_jsonl_export(self):
+        batch = self.make_batch()
+        csv_file, jsonl_file = io.StringIO(), io.StringIO()
+
+        batch.to_csv(csv_file)
+        batch.to_jsonl(jsonl_file)
+
+        lines = csv_file.getvalue().splitlines()
+        assert lines[0] == "distance,weight,option,value"
+        assert lines[1] == "10.0,2.0,1,25.0"
+        assert lines[3] == "-1.0,1.0,1,"
+        rows = [json.loads(line) for line in jsonl_file.getvalue().splitlines()]
+        assert rows[1] == {"distance": 20.0, "weight": 1.0, "option": 2, "value": 30.0}
+        assert rows[3]["value"] is None
+
+    def test_buffers_share_memory_and_carry_a_validity_bitmap(self):
+        batch = self.make_batch()
+
+        buffers = batch.to_buffers()
+
+        assert buffers["value"]["format"] == "g"
+        assert buffers["value"]["validity"] == bytes([0b0011])
+        assert buffers["option"]["data"].tolist() == [1, 2, 1, 9]
+        batch.distances[0] = 11.0
+        assert buffers["distance"]["data"][0] == 11.0
+
+    def test_columns_must_have_the_same_length(self):
+        with pytest.raises(ValueError):
+            FreightBatch([1.0], [1.0, 2.0], [1], [1.0])
+
+    def test_numpy_views_do_not_copy(self):
+        pytest.importorskip("numpy")
+        batch = self.make_batch()
+
+        arrays = batch.to_numpy()
+        batch.values[1] = 7.0
+
+        assert arrays["value"][1] == 7.0
+        assert math.isnan(arrays["value"][2])
@@ -1,17 +1,43 @@
+import asyncio
+import pybreaker
 import requests
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from exceptions import ExternalAPIError, InvalidCepError
-from provider.cep import CepProvider
-from provider.services.brasil_api import BrasilApiProvider
-from services import get_distance_between_ceps
+from exceptions import CepNotFoundError, ExternalAPIError, InvalidCepError
+from factories.provider_factory import CepProviderFactory, DistanceProviderFactory
+from provider.cep import AsyncCepProvider, CepProvider, TieredCepProvider
+from provider.cache import clear_local_caches
+from provider.distance import (
+    AsyncDistanceProvider,
+    Distance,
+    DistanceProvider,
+    FallbackDistanceProvider,
+)
+from provider.http import HttpClient
+from provider.serializers import CoordinatesSerializer
+from provider.services.brasil_api import AsyncBrasilApiProvider, BrasilApiProvider
+from provider.services import haversine
+from provider.services.haversine import HaversineDistanceProvider, haversine_km
+from provider.services.local_cep_index import LocalCepIndexProvider
+from provider.services import osrm_api
+from provider.services.osrm_api import AsyncOSRMProvider, OSRMProvider
+from provider.services.osrm_buckets import DistanceBuckets
+from provider.spatial import encode_geohash
+from services import (
+    get_distance_between_ceps,
+    get_distance_between_ceps_async,
+    _cep_pair_cache_key,
+    get_distances_between_ceps,
+)
+from tools.build_cep_index import main as build_cep_index
+from tools.fit_detour_factor import fit_detour_factor, read_samples
 from validation import Validation
 
 
 class TestProviders:
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_get_distance_between_ceps_handles_errors(self, mock_get):
         mock_provider = MagicMock(spec=CepProvider)
         mock_provider.get_cep_data.return_value = {
@@ -35,7 +61,7 @@ class TestProviders:
 
 
 class TestBrasilApiProvider:
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_brasil_api_provider_error_handling(self, mock_get):
         provider = BrasilApiProvider()
 
@@ -54,6 +80,34 @@ class TestBrasilApiProvider:
         with pytest.raises(InvalidCepError):
             provider.get_cep_data("12345678")
 
+    @patch("provider.cache.CacheClient")
+    @patch("requests.Session.get")
+    def test_miss_returns_the_same_shape_as_a_cache_hit(
+        self, mock_get, mock_client_class
+    ):
+        clear_local_caches()
+        mock_client_class.return_value.is_available.return_value = False
+        document = {
+            "cep": "01001000",
+            "state": "SP",
+            "city": "São Paulo",
+            "location": {
+                "type": "Point",
+                "coordinates": {"latitude": "-23.55", "longitude": "-46.63"},
+            },
+        }
+        mock_get.return_value.json.return_value = document
+        mock_get.return_value.raise_for_status.return_value = None
+
+        result = BrasilApiProvider().get_cep_data("01001000")
+
+        serializer = CoordinatesSerializer()
+        assert result == serializer.loads(serializer.dumps(document))
+        assert result == {
+            "location": {"coordinates": {"latitude": -23.55, "longitude": -46.63}}
+        }
+        clear_local_caches()
+
     def test_coordinate_validation(self):
         valid_cases = [
             {"location": {"coordinates": {"latitude": -22.9, "longitude": -43.1}}},
@@ -74,3 +128,456 @@ class TestBrasilApiProvider:
 
         for case in invalid_cases:
             assert not Validation.has_valid_coordinates(case)
+
+
+class TestBatchDistances:
+    def test_get_distances_between_ceps_resolves_each_cep_once(self):
+        coordinates = {
+            "01001000": {"latitude": -23.55, "longitude": -46.63},
+            "20040030": {"latitude": -22.90, "longitude": -43.17},
+            "22041001": {"latitude": -22.97, "longitude": -43.18},
+        }
+        requested = []
+
+        class StubCepProvider(CepProvider):
+            def get_cep_data(self, cep):
+                requested.append(cep)
+                if cep not in coordinates:
+                    return {}
+                return {"location": {"coordinates": coordinates[cep]}}
+
+        mock_distance = MagicMock(spec=DistanceProvider)
+        mock_distance.get_distance_matrix.side_effect = lambda sources, destinations: [
+            [430.0] * len(destinations)
+        ]
+
+        results = get_distances_between_ceps(
+            [
+                ("01001-000", "20040030"),
+                ("01001000", "20040-030"),
+                ("01001000", "22041001"),
+                ("01001000", "99999999"),
+            ],
+            StubCepProvider(),
+            mock_distance,
+            max_workers=4,
+        )
+
+        assert results[:3] == [430.0, 430.0, 430.0]
+        assert isinstance(results[3], ExternalAPIError)
+        assert sorted(requested) == ["01001000", "20040030", "22041001", "99999999"]
+        mock_distance.get_distance_matrix.assert_called_once()
+        assert len(mock_distance.get_distance_matrix.call_args.args[1]) == 2
+
+    @patch("provider.cache.CacheClient")
+    def test_single_and_batch_lookups_share_cache_keys(self, mock_client_class):
+        clear_local_caches()
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get.return_value = 430.0
+        mock_client_class.return_value = mock_client
+
+        distance = get_distance_between_ceps(
+            "01001-000", "20040030", MagicMock(spec=CepProvider)
+        )
+
+        assert distance == 430.0
+        mock_client.get.assert_called_once_with(
+            _cep_pair_cache_key("01001000", "20040030")
+        )
+
+
+class TestOSRMDistanceMatrix:
+    @patch.dict(
+        "os.environ",
+        {"OSRM_API_URL": "http://osrm/route/v1/driving/", "OSRM_TABLE_API_URL": ""},
+    )
+    def test_table_url_is_derived_from_route_url(self):
+        assert OSRMProvider()._table_url == "http://osrm/table/v1/driving/"
+
+    @patch.dict(
+        "os.environ", {"OSRM_API_URL": "http://osrm/", "OSRM_TABLE_API_URL": ""}
+    )
+    def test_table_url_is_required_when_it_cannot_be_derived(self):
+        with pytest.raises(ValueError, match="OSRM_TABLE_API_URL"):
+            OSRMProvider()
+
+    @patch.dict(
+        "os.environ",
+        {"OSRM_API_URL": "http://osrm/route/v1/driving/", "OSRM_TABLE_API_URL": ""},
+    )
+    @patch("provider.cache.CACHE_LEGACY_KEYS", False)
+    @patch("provider.services.osrm_api.OSRM_TABLE_MAX_COORDINATES", 4)
+    @patch("provider.cache.CacheClient")
+    @patch("requests.Session.get")
+    def test_get_distance_matrix_chunks_and_fills_cache(
+        self, mock_get, mock_client_class
+    ):
+        clear_local_caches()
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client.get_many_with_ttl.side_effect = lambda keys: [(None, None)] * len(
+            keys
+        )
+        mock_client_class.return_value = mock_client
+
+        def table_response(url, *args, **kwargs):
+            query = url.split("?")[1]
+            params = dict(param.split("=") for param in query.split("&"))
+            response = MagicMock()
+            response.raise_for_status.return_value = None
+            response.json.return_value = {
+                "distances": [
+                    [1000.0] * len(params["destinations"].split(";"))
+                    for _ in params["sources"].split(";")
+                ]
+            }
+            return response
+
+        mock_get.side_effect = table_response
+
+        provider = OSRMProvider()
+        sources = [(-46.63, -23.55)]
+        destinations = [(-43.17, -22.90 - i / 100) for i in range(5)]
+
+        matrix = provider.get_distance_matrix(sources, destinations)
+
+        assert matrix == [[1.0] * 5]
+        assert mock_get.call_count == 2
+        assert mock_get.call_args.args[0].startswith("http://osrm/table/v1/driving/")
+        assert "annotations=distance" in mock_get.call_args.args[0]
+        mock_client.get_many_with_ttl.assert_called_once()
+        written = {}
+        for call in mock_client.set_many.call_args_list:
+            written.update(call.args[0])
+        assert len(written) == 5
+        assert written[provider._cache_key(sources[0], destinations[0])] == 1.0
+        # Ruído de ponto flutuante não gera uma entrada nova
+        assert provider._cache_key(
+            (-46.630000000001, -23.55), destinations[0]
+        ) == provider._cache_key(sources[0], destinations[0])
+
+    @patch("provider.cache.CACHE_LEGACY_KEYS", False)
+    @patch("provider.cache.CacheClient")
+    def test_open_circuit_uses_stale_values_only_for_a_fully_stale_chunk(
+        self, mock_client_class
+    ):
+        clear_local_caches()
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client_class.return_value = mock_client
+        sources = [(-46.63, -23.55)]
+        destinations = [(-43.17, -22.90), (-43.18, -22.97)]
+        # Vencido (só vale com o circuito aberto) para o primeiro destino
+        expired = (400.0, 100.0)
+
+        with patch.object(
+            OSRMProvider,
+            "_fetch_table",
+            side_effect=pybreaker.CircuitBreakerError("open"),
+        ):
+            mock_client.get_many_with_ttl.side_effect = lambda keys: [expired] * len(
+                keys
+            )
+            assert OSRMProvider().get_distance_matrix(sources, destinations) == [
+                [400.0, 400.0]
+            ]
+
+            mock_client.get_many_with_ttl.side_effect = lambda keys: [expired] + [
+                (None, None)
+            ] * (len(keys) - 1)
+            with pytest.raises(pybreaker.CircuitBreakerError):
+                OSRMProvider().get_distance_matrix(sources, destinations)
+
+            matrix = FallbackDistanceProvider(
+                OSRMProvider(), HaversineDistanceProvider()
+            ).get_distance_matrix(sources, destinations)
+
+        assert all(value is not None for value in matrix[0])
+        assert matrix[0][1].provider == "haversine"
+        clear_local_caches()
+
+    def test_sync_async_and_matrix_share_the_cache_key(self):
+        keys = []
+
+        def cached_entries(prefix, cache_keys):
+            keys.extend(cache_keys)
+            return {key: (1.0, None) for key in cache_keys}
+
+        async def cached_entries_async(prefix, cache_keys):
+            return cached_entries(prefix, cache_keys)
+
+        route = (-46.63, -23.55, -43.17, -22.90)
+        with patch(
+            "provider.cache.get_cached_entries", side_effect=cached_entries
+        ), patch(
+            "provider.cache.get_cached_entries_async", side_effect=cached_entries_async
+        ):
+            assert OSRMProvider().get_distance(*route) == 1.0
+            assert asyncio.run(AsyncOSRMProvider().get_distance(*route)) == 1.0
+
+        assert keys[0] == keys[1]
+        assert keys[0].startswith("osrm_api:get_distance:")
+        assert keys[0] == OSRMProvider()._cache_key(route[:2], route[2:])
+
+
+class TestHttpClient:
+    @patch.dict(
+        "os.environ",
+        {
+            "TEST_API_POOL_SIZE": "4",
+            "TEST_API_CONNECT_TIMEOUT": "1.5",
+            "TEST_API_READ_TIMEOUT": "2.5",
+            "TEST_API_KEEP_ALIVE": "false",
+        },
+    )
+    @patch("requests.Session.get")
+    def test_http_client_is_shared_and_uses_timeouts(self, mock_get):
+        HttpClient._instances.pop("TEST_API", None)
+
+        client = HttpClient.for_service("TEST_API")
+        client.get("http://example.com/")
+
+        assert HttpClient.for_service("TEST_API") is client
+        assert client.pool_size == 4
+        assert client.session.headers["Connection"] == "close"
+        mock_get.assert_called_once_with("http://example.com/", timeout=(1.5, 2.5))
+
+    def test_providers_reuse_the_same_session(self):
+        assert BrasilApiProvider()._http is BrasilApiProvider()._http
+        assert OSRMProvider()._http is not BrasilApiProvider()._http
+
+
+class TestAsyncProviders:
+    def test_get_distance_between_ceps_async_fetches_ceps_concurrently(self):
+        started = []
+
+        class SlowCepProvider(AsyncCepProvider):
+            async def get_cep_data(self, cep):
+                started.append(cep)
+                await asyncio.sleep(0.01)
+                assert len(started) == 2
+                return {
+                    "location": {
+                        "coordinates": {"latitude": -22.97, "longitude": -43.18}
+                    }
+                }
+
+        distance_provider = MagicMock(spec=AsyncDistanceProvider)
+        distance_provider.get_distance = AsyncMock(return_value=430.0)
+
+        result = asyncio.run(
+            get_distance_between_ceps_async(
+                "22041001", "01310200", SlowCepProvider(), distance_provider
+            )
+        )
+
+        assert result == 430.0
+        assert started == ["22041001", "01310200"]
+        distance_provider.get_distance.assert_awaited_once_with(
+            -43.18, -22.97, -43.18, -22.97
+        )
+
+    @patch("provider.cache.AsyncCacheClient")
+    @patch("requests.Session.get")
+    def test_async_brasil_api_provider(self, mock_get, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available = AsyncMock(return_value=False)
+        mock_client_class.return_value = mock_client
+
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            "location": {"coordinates": {"latitude": -22.9, "longitude": -43.1}}
+        }
+        mock_response.raise_for_status.return_value = None
+        mock_get.return_value = mock_response
+
+        provider = AsyncBrasilApiProvider()
+        result = asyncio.run(provider.get_cep_data("22041001"))
+
+        assert result == mock_response.json.return_value
+        with pytest.raises(InvalidCepError):
+            asyncio.run(provider.get_cep_data("123"))
+
+
+class TestLocalCepIndex:
+    @pytest.fixture
+    def index_path(self, tmp_path):
+        source = tmp_path / "ceps.csv"
+        source.write_text(
+            "cep;latitude;longitude\n"
+            "20040-030;-22.90;-43.17\n"
+            "01001000;-23.55;-46.63\n"
+            "invalid;0;0\n"
+            "22041001;-22.97;-43.18\n",
+            encoding="utf-8",
+        )
+        path = tmp_path / "ceps.idx"
+        assert build_cep_index([str(source), str(path), "--delimiter", ";"]) == 0
+        return str(path)
+
+    def test_lookup_by_binary_search(self, index_path):
+        provider = LocalCepIndexProvider(index_path)
+
+        data = provider.get_cep_data("01001-000")
+
+        assert data["location"]["coordinates"] == {
+            "latitude": -23.55,
+            "longitude": -46.63,
+        }
+        assert Validation.has_valid_coordinates(provider.get_cep_data("22041001"))
+        assert len(provider._index) == 3
+        with pytest.raises(CepNotFoundError):
+            provider.get_cep_data("99999999")
+        with pytest.raises(InvalidCepError):
+            provider.get_cep_data("123")
+
+    def test_tiered_provider_falls_back_on_missing_ceps(self, index_path):
+        fallback = MagicMock(spec=CepProvider)
+        fallback.get_cep_data.return_value = {"cep": "99999999"}
+        fallback.get_cep_data_many.return_value = {"99999999": {"cep": "99999999"}}
+
+        provider = CepProviderFactory(index_path).create_provider(fallback)
+
+        assert isinstance(provider, TieredCepProvider)
+        assert provider.get_cep_data("99999999") == {"cep": "99999999"}
+        results = provider.get_cep_data_many(["01001000", "99999999"], max_workers=2)
+        assert results["01001000"]["cep"] == "01001000"
+        assert results["99999999"] == {"cep": "99999999"}
+        fallback.get_cep_data_many.assert_called_once_with(["99999999"], max_workers=2)
+
+    @patch.dict("os.environ", {"CEP_INDEX_PATH": ""})
+    def test_factory_without_index_returns_fallback(self):
+        fallback = MagicMock(spec=CepProvider)
+
+        assert CepProviderFactory().create_provider(fallback) is fallback
+
+
+class TestHaversineFallback:
+    def test_haversine_distance_applies_detour_factor(self):
+        straight = haversine_km(-46.63, -23.55, -43.17, -22.90)
+        assert 355 < straight < 362
+
+        distance = HaversineDistanceProvider(detour_factor=1.25).get_distance(
+            -46.63, -23.55, -43.17, -22.90
+        )
+
+        assert distance == pytest.approx(straight * 1.25)
+        assert distance.estimated and distance.provider == "haversine"
+
+    def test_matrix_matches_pairwise_distances_without_numpy(self):
+        provider = HaversineDistanceProvider(detour_factor=1.0)
+        sources = [(-46.63, -23.55), (-43.17, -22.90)]
+        destinations = [(-43.18, -22.97), (-49.27, -25.43), (-46.63, -23.55)]
+
+        with patch.object(haversine, "numpy_module", return_value=None):
+            matrix = provider.get_distance_matrix(sources, destinations)
+
+        for row, source in zip(matrix, sources):
+            for value, destination in zip(row, destinations):
+                assert value == pytest.approx(haversine_km(*source, *destination))
+
+    def test_fallback_is_used_when_primary_fails(self):
+        primary = MagicMock(spec=DistanceProvider)
+        primary.get_distance.side_effect = ExternalAPIError("OSRM down")
+        primary.get_distance_matrix.side_effect = ExternalAPIError("OSRM down")
+        provider = FallbackDistanceProvider(primary, HaversineDistanceProvider())
+
+        distance = provider.get_distance(-46.63, -23.55, -43.17, -22.90)
+        matrix = provider.get_distance_matrix([(-46.63, -23.55)], [(-43.17, -22.90)])
+
+        assert isinstance(distance, Distance) and distance.estimated
+        assert matrix[0][0] == pytest.approx(distance)
+
+    def test_factory_wires_haversine_fallback(self):
+        assert isinstance(
+            DistanceProviderFactory("haversine").create_provider(),
+            FallbackDistanceProvider,
+        )
+        assert isinstance(DistanceProviderFactory("").create_provider(), OSRMProvider)
+        with pytest.raises(ValueError):
+            DistanceProviderFactory("unknown").create_provider()
+
+    def test_fit_detour_factor_from_samples(self, tmp_path):
+        straight = haversine_km(-46.63, -23.55, -43.17, -22.90)
+        samples = tmp_path / "samples.jsonl"
+        samples.write_text(
+            "\n".join(
+                [
+                    '{"origin_lon": -46.63, "origin_lat": -23.55, "dest_lon": -43.17,'
+                    f' "dest_lat": -22.90, "distance_km": {straight * 1.3}}}',
+                    '{"origin_lon": -46.63, "origin_lat": -23.55, "dest_lon": -46.63,'
+                    ' "dest_lat": -23.55, "distance_km": 2.0}',
+                ]
+            ),
+            encoding="utf-8",
+        )
+
+        factor, stats = fit_detour_factor(read_samples(str(samples)))
+
+        assert factor == pytest.approx(1.3)
+        assert stats["samples"] == 1
+
+
+class TestOSRMBuckets:
+    paulista = (-46.6544, -23.5614)
+    copacabana = (-43.1822, -22.9711)
+
+    def test_geohash_matches_reference_encoding(self):
+        assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+    def test_bucket_only_used_within_tolerance(self):
+        buckets = DistanceBuckets(precision=7, tolerance=0.01, sample_rate=0)
+        nearby = (-46.6544, -23.5614, -46.6500, -23.5600)
+
+        assert buckets.key_for((*self.paulista, *self.copacabana)) is not None
+        assert buckets.key_for(nearby) is None
+        assert DistanceBuckets(precision=0).key_for(nearby) is None
+        # Pontos vizinhos na mesma célula compartilham a chave
+        assert buckets.key_for((*self.paulista, *self.copacabana)) == buckets.key_for(
+            (-46.65441, -23.56141, *self.copacabana)
+        )
+
+    @patch("provider.services.osrm_buckets.CacheClient")
+    def test_bucket_hit_skips_osrm_and_miss_records_exact(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client_class.return_value = mock_client
+        buckets = DistanceBuckets(precision=7, tolerance=0.01, sample_rate=0)
+        provider = OSRMProvider()
+        route = (*self.paulista, *self.copacabana)
+
+        with patch.object(osrm_api, "_buckets", buckets), patch.object(
+            buckets, "lookup", return_value=None
+        ), patch(
+            "provider.services.osrm_buckets.set_cached"
+        ) as mock_set_cached, patch.object(
+            OSRMProvider, "_get_exact_distance", return_value=430.0
+        ) as mock_exact:
+            assert provider.get_distance(*route) == 430.0
+            mock_set_cached.assert_called_once()
+            mock_client.increment.assert_called_once_with(
+                "osrm_bucket_stats", {"misses": 1}
+            )
+            sample = mock_client.append_capped.call_args.args[1]
+            assert sample["distance_km"] == 430.0
+
+            buckets.lookup.return_value = 431.0
+            distance = provider.get_distance(*route)
+
+            assert distance == 431.0 and distance.estimated
+            mock_exact.assert_called_once()
+
+    @patch("provider.services.osrm_buckets.CacheClient")
+    def test_sampled_zero_distance_does_not_fail(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.is_available.return_value = True
+        mock_client_class.return_value = mock_client
+        buckets = DistanceBuckets(precision=7, tolerance=0.01, sample_rate=1)
+        route = (*self.paulista, *self.paulista)
+
+        buckets.record_exact("key", route, 0.0, 0.2)
+
+        mock_client.increment.assert_called_once_with(
+            "osrm_bucket_stats", {"sampled": 1, "zero_distance": 1}
+        )
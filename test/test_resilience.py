@@ -1,10 +1,27 @@
+import asyncio
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, Mock
 import requests
 import pybreaker
 
 from provider.services.brasil_api import BrasilApiProvider
-from exceptions import ExternalAPIError
+from concurrency import run_concurrently
+from exceptions import DeadlineExceededError, ExternalAPIError, RateLimitError
+from provider.deadline import deadline, remaining
+from provider.hedging import HedgePolicy, with_hedging
+from provider.http import HttpClient
+from provider.resilience import (
+    RateLimiter,
+    RetryBudget,
+    _limiter_from_env,
+    retry_budget,
+    with_circuit_breaker,
+    with_rate_limit,
+    with_retry,
+)
 
 
 def mock_with_retry(*args, **kwargs):
@@ -29,7 +46,7 @@ class TestResiliencePatterns(unittest.TestCase):
             }
         }
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     @patch("provider.services.brasil_api.brasil_api_breaker", lambda f: f)
     @patch("provider.services.brasil_api.with_retry", mock_with_retry)
     def test_retry_pattern(self, mock_requests_get):
@@ -43,9 +60,7 @@ class TestResiliencePatterns(unittest.TestCase):
             mock_response_success,
         ]
 
-        with patch(
-            "provider.resilience.retry", side_effect=lambda *args, **kwargs: lambda f: f
-        ):
+        with patch.object(retry_budget, "try_retry", return_value=False):
             provider = BrasilApiProvider()
 
             with self.assertRaises(ExternalAPIError):
@@ -59,7 +74,7 @@ class TestResiliencePatterns(unittest.TestCase):
 
             self.assertEqual(mock_requests_get.call_count, 3)
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_circuit_breaker_pattern(self, mock_requests_get):
         mock_requests_get.side_effect = requests.exceptions.ConnectionError(
             "Connection refused"
@@ -78,3 +93,362 @@ class TestResiliencePatterns(unittest.TestCase):
 
             with self.assertRaises(pybreaker.CircuitBreakerError):
                 provider.get_cep_data("12345678")
+
+
+class TestCircuitBreakerConcurrency(unittest.TestCase):
+    def test_guarded_calls_run_concurrently(self):
+        breaker = pybreaker.CircuitBreaker(fail_max=3, reset_timeout=30)
+        barrier = threading.Barrier(2, timeout=2)
+
+        @with_circuit_breaker(breaker)
+        def lookup():
+            barrier.wait()
+            return True
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(lambda _: lookup(), range(2)))
+
+        self.assertEqual(results, [True, True])
+        self.assertEqual(breaker.current_state, pybreaker.STATE_CLOSED)
+
+    def test_breaker_opens_after_failures(self):
+        breaker = pybreaker.CircuitBreaker(fail_max=2, reset_timeout=30)
+
+        @with_circuit_breaker(breaker)
+        def lookup():
+            raise ExternalAPIError("Service down")
+
+        with self.assertRaises(ExternalAPIError):
+            lookup()
+        with self.assertRaises(pybreaker.CircuitBreakerError):
+            lookup()
+        with self.assertRaises(pybreaker.CircuitBreakerError):
+            lookup()
+        self.assertEqual(breaker.current_state, pybreaker.STATE_OPEN)
+
+    def test_async_breaker_opens_and_ignores_cancellation(self):
+        breaker = pybreaker.CircuitBreaker(fail_max=2, reset_timeout=30)
+
+        @with_circuit_breaker(breaker)
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        @with_circuit_breaker(breaker)
+        async def failing():
+            raise ExternalAPIError("Service down")
+
+        async def scenario():
+            with self.assertRaises(asyncio.CancelledError):
+                await cancelled()
+            with self.assertRaises(ExternalAPIError):
+                await failing()
+            with self.assertRaises(pybreaker.CircuitBreakerError):
+                await failing()
+
+        asyncio.run(scenario())
+        self.assertEqual(breaker.current_state, pybreaker.STATE_OPEN)
+
+
+class TestPybreakerInternals(unittest.TestCase):
+    # with_circuit_breaker depends on these private pybreaker details; this
+    # fails on an upgrade that changes them (pybreaker is pinned in Pipfile).
+    def test_private_api_used_by_with_circuit_breaker(self):
+        breaker = pybreaker.CircuitBreaker(fail_max=2, reset_timeout=30)
+        error = ExternalAPIError("Service down")
+
+        with breaker._lock:
+            self.assertIsNone(breaker._state_storage.opened_at)
+            self.assertIsNone(breaker.state._handle_error(error, reraise=False))
+        self.assertEqual(breaker.fail_counter, 1)
+
+        with breaker._lock:
+            breaker.state._handle_success()
+        self.assertEqual(breaker.fail_counter, 0)
+
+        with breaker._lock:
+            breaker.state._handle_error(error, reraise=False)
+            with self.assertRaises(pybreaker.CircuitBreakerError):
+                breaker.state._handle_error(error, reraise=False)
+        self.assertEqual(breaker.current_state, pybreaker.STATE_OPEN)
+        self.assertIsNotNone(breaker._state_storage.opened_at)
+
+
+def too_many_requests(retry_after=None):
+    response = requests.Response()
+    response.status_code = 429
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(retry_after)
+    error = ExternalAPIError("Failed to fetch CEP data")
+    error.__cause__ = requests.HTTPError("429 Too Many Requests", response=response)
+    return error
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_waits_for_tokens(self):
+        limiter = RateLimiter("test", rate=1, burst=2, max_wait=0.1)
+
+        limiter.acquire()
+        limiter.acquire()
+        with self.assertRaises(RateLimitError):
+            limiter.acquire()
+
+    def test_caps_calls_in_flight(self):
+        limiter = RateLimiter("test", rate=100, burst=100, max_in_flight=2)
+        barrier = threading.Barrier(2, timeout=2)
+        lock = threading.Lock()
+        state = {"current": 0, "peak": 0}
+
+        @with_rate_limit(limiter)
+        def lookup():
+            with lock:
+                state["current"] += 1
+                state["peak"] = max(state["peak"], state["current"])
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+            with lock:
+                state["current"] -= 1
+            return True
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(lambda _: lookup(), range(6)))
+
+        self.assertEqual(results, [True] * 6)
+        self.assertEqual(state["peak"], 2)
+
+    def test_too_many_requests_halves_rate_and_honours_retry_after(self):
+        limiter = RateLimiter("test", rate=8, burst=8, adaptive=True, max_wait=0.1)
+
+        @with_rate_limit(limiter)
+        def lookup():
+            raise too_many_requests(retry_after=30)
+
+        with self.assertRaises(ExternalAPIError):
+            lookup()
+
+        self.assertEqual(limiter.rate, 4)
+        with self.assertRaises(RateLimitError):
+            limiter.acquire()
+
+    def test_success_increases_rate_up_to_max(self):
+        limiter = RateLimiter("test", rate=2, burst=10, adaptive=True, max_rate=2.6)
+
+        @with_rate_limit(limiter)
+        def lookup():
+            return True
+
+        lookup()
+        self.assertEqual(limiter.rate, 2.5)
+        lookup()
+        self.assertEqual(limiter.rate, 2.6)
+
+    def test_configured_rate_is_the_ceiling_unless_a_max_is_set(self):
+        with patch.dict("os.environ", {"TEST_API_RATE_LIMIT": "4"}):
+            self.assertEqual(_limiter_from_env("TEST_API", 10, 2).max_rate, 4)
+        with patch.dict(
+            "os.environ", {"TEST_API_RATE_LIMIT": "4", "TEST_API_RATE_LIMIT_MAX": "6"}
+        ):
+            self.assertEqual(_limiter_from_env("TEST_API", 10, 2).max_rate, 6)
+
+    def test_other_errors_and_open_circuit_keep_rate(self):
+        limiter = RateLimiter("test", rate=4, burst=4, adaptive=True)
+
+        @with_rate_limit(limiter)
+        def failing():
+            raise ExternalAPIError("Service down")
+
+        @with_rate_limit(limiter)
+        def open_circuit():
+            raise pybreaker.CircuitBreakerError("open")
+
+        with self.assertRaises(ExternalAPIError):
+            failing()
+        with self.assertRaises(pybreaker.CircuitBreakerError):
+            open_circuit()
+        self.assertEqual(limiter.rate, 4)
+
+    def test_async_calls_share_the_bucket(self):
+        limiter = RateLimiter("test", rate=1, burst=1, max_wait=0.1)
+
+        @with_rate_limit(limiter)
+        async def lookup():
+            return True
+
+        async def scenario():
+            self.assertTrue(await lookup())
+            with self.assertRaises(RateLimitError):
+                await lookup()
+
+        asyncio.run(scenario())
+
+
+def connection_refused():
+    error = ExternalAPIError("Failed to fetch CEP data")
+    error.__cause__ = requests.ConnectionError("Connection refused")
+    return error
+
+
+class TestRetryBudgetAndDeadlines(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(retry_budget, "try_retry", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_transient_errors_only(self):
+        calls = []
+
+        @with_retry(max_attempts=3, min_wait=0, max_wait=0)
+        def transient():
+            calls.append("transient")
+            raise connection_refused()
+
+        @with_retry(max_attempts=3, min_wait=0, max_wait=0)
+        def permanent():
+            calls.append("permanent")
+            raise ExternalAPIError("Distance not found in OSRM response.")
+
+        with self.assertRaises(ExternalAPIError):
+            transient()
+        with self.assertRaises(ExternalAPIError):
+            permanent()
+        self.assertEqual(calls, ["transient"] * 3 + ["permanent"])
+
+    def test_budget_limits_retries_to_a_share_of_requests(self):
+        budget = RetryBudget(ratio=0.1, min_per_second=0, window=10)
+        for _ in range(20):
+            budget.record_request()
+
+        self.assertTrue(budget.try_retry())
+        self.assertTrue(budget.try_retry())
+        self.assertFalse(budget.try_retry())
+
+    def test_does_not_back_off_past_the_deadline(self):
+        calls = []
+
+        @with_retry(max_attempts=3, min_wait=5, max_wait=5)
+        def lookup():
+            calls.append(remaining())
+            raise connection_refused()
+
+        with deadline(1):
+            with self.assertRaises(ExternalAPIError):
+                lookup()
+        self.assertEqual(len(calls), 1)
+
+    def test_nested_deadline_never_extends_the_outer_one(self):
+        with deadline(1):
+            with deadline(60):
+                self.assertLessEqual(remaining(), 1)
+        self.assertIsNone(remaining())
+
+    def test_deadline_reaches_worker_threads(self):
+        with deadline(5):
+            results = run_concurrently(lambda _: remaining(), ["a", "b"])
+        self.assertTrue(all(0 < left <= 5 for left in results.values()))
+
+    @patch("requests.Session.get")
+    def test_http_timeouts_are_capped_by_the_deadline(self, mock_get):
+        client = HttpClient.for_service("BRASIL_API")
+
+        with deadline(0.5):
+            client.get("http://example.com")
+        connect_timeout, read_timeout = mock_get.call_args.kwargs["timeout"]
+        self.assertLessEqual(connect_timeout, 0.5)
+        self.assertLessEqual(read_timeout, 0.5)
+
+        with deadline(0.001):
+            time.sleep(0.01)
+            with self.assertRaises(DeadlineExceededError):
+                client.get("http://example.com")
+        self.assertEqual(mock_get.call_count, 1)
+
+
+class TestHedging(unittest.TestCase):
+    def policy(self, **kwargs):
+        budget = RetryBudget(ratio=1, min_per_second=10, window=10)
+        return HedgePolicy(
+            "test", enabled=True, default_delay=0.05, budget=budget, **kwargs
+        )
+
+    def test_slow_call_is_hedged_and_fastest_wins(self):
+        calls = []
+        release = threading.Event()
+
+        @with_hedging(self.policy())
+        def lookup():
+            calls.append(threading.current_thread().name)
+            if len(calls) == 1:
+                release.wait(2)
+                return "slow"
+            return "fast"
+
+        self.assertEqual(lookup(), "fast")
+        release.set()
+        self.assertEqual(len(calls), 2)
+
+    def test_fast_call_is_not_hedged(self):
+        calls = []
+
+        @with_hedging(self.policy())
+        def lookup():
+            calls.append(1)
+            return "ok"
+
+        self.assertEqual(lookup(), "ok")
+        self.assertEqual(len(calls), 1)
+
+    def test_no_hedge_without_budget_or_rate_limit_slot(self):
+        calls = []
+        limiter = RateLimiter("test", rate=1, burst=1)
+        limiter.acquire()
+
+        @with_hedging(self.policy(limiter=limiter))
+        def lookup():
+            calls.append(1)
+            time.sleep(0.1)
+            return "ok"
+
+        self.assertEqual(lookup(), "ok")
+        self.assertEqual(len(calls), 1)
+
+    def test_delay_follows_the_latency_percentile(self):
+        policy = HedgePolicy(
+            "test", enabled=True, percentile=90, min_delay=0.01, min_samples=10
+        )
+        for latency in range(1, 51):
+            policy.record(latency / 100)
+        self.assertEqual(policy.delay(), 0.46)
+
+    def test_breaker_counts_one_failure_when_all_attempts_fail(self):
+        breaker = pybreaker.CircuitBreaker(fail_max=2, reset_timeout=30)
+
+        @with_circuit_breaker(breaker)
+        @with_hedging(self.policy())
+        def lookup():
+            time.sleep(0.1)
+            raise ExternalAPIError("Service down")
+
+        with self.assertRaises(ExternalAPIError):
+            lookup()
+        self.assertEqual(breaker.fail_counter, 1)
+        self.assertEqual(breaker.current_state, pybreaker.STATE_CLOSED)
+
+    def test_async_loser_is_cancelled(self):
+        cancelled = []
+
+        @with_hedging(self.policy())
+        async def lookup(delays):
+            delay = delays.pop(0)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(delay)
+                raise
+            return delay
+
+        async def scenario():
+            return await lookup([1.0, 0.01])
+
+        self.assertEqual(asyncio.run(scenario()), 0.01)
+        self.assertEqual(cancelled, [1.0])
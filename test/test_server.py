@@ -0,0 +1,213 @@
+import io
+import json
+import os
+import signal
+from unittest.mock import MagicMock, patch
+
+import pybreaker
+import pytest
+
+from exceptions import ExternalAPIError, FreightTypeInvalidError
+from model.freight import Freight
+from provider.distance import Distance
+import server
+from server import FreightApp, _respawn_delay, serve
+
+
+def call(app, method, path, body=None):
+    payload = b"" if body is None else json.dumps(body).encode()
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "CONTENT_LENGTH": str(len(payload)),
+        "wsgi.input": io.BytesIO(payload),
+    }
+    start_response = MagicMock()
+    response = b"".join(app(environ, start_response))
+    return start_response.call_args.args[0], json.loads(response)
+
+
+def freight(distance, value):
+    strategy = MagicMock()
+    strategy.calculate.return_value = value
+    return Freight(distance, 5.0, strategy)
+
+
+class TestFreightApp:
+    @patch("server.calculate_freight")
+    def test_metrics_are_exported(self, mock_calculate):
+        mock_calculate.return_value = freight(Distance(10.0, "osrm"), 50.0)
+        app = FreightApp(MagicMock())
+        call(app, "POST", "/freight", {"weight": 5, "option": 1, "distance": 10})
+
+        start_response = MagicMock()
+        text = b"".join(
+            app({"REQUEST_METHOD": "GET", "PATH_INFO": "/metrics"}, start_response)
+        ).decode()
+        assert start_response.call_args.args[0] == "200 OK"
+        assert "# TYPE circuit_breaker_state gauge" in text
+        assert "# TYPE cache_lookups_total counter" in text
+
+        body = b"".join(
+            app(
+                {
+                    "REQUEST_METHOD": "GET",
+                    "PATH_INFO": "/metrics",
+                    "QUERY_STRING": "format=json",
+                },
+                MagicMock(),
+            )
+        )
+        assert json.loads(body)["circuit_breaker_state"]["type"] == "gauge"
+
+    def test_health(self):
+        assert call(FreightApp(MagicMock()), "GET", "/health") == (
+            "200 OK",
+            {"status": "ok"},
+        )
+
+    @patch("server.calculate_freight")
+    def test_quote_returns_structured_json(self, mock_calculate):
+        cep_provider = MagicMock()
+        mock_calculate.return_value = freight(
+            Distance(430.0, "haversine", estimated=True), 2160.0
+        )
+
+        status, body = call(
+            FreightApp(cep_provider),
+            "POST",
+            "/freight",
+            {
+                "weight": 5,
+                "option": 2,
+                "origin_cep": "01001000",
+                "destination_cep": "20040030",
+            },
+        )
+
+        assert status == "200 OK"
+        assert body == {
+            "value": 2160.0,
+            "distance_km": 430.0,
+            "distance_provider": "haversine",
+            "estimated": True,
+            "weight": 5.0,
+            "option": 2,
+        }
+        mock_calculate.assert_called_once_with(
+            weight=5.0,
+            option=2,
+            origin_cep="01001000",
+            destination_cep="20040030",
+            cep_provider=cep_provider,
+        )
+
+    @patch("server.calculate_freight")
+    def test_quote_maps_errors_to_status_codes(self, mock_calculate):
+        app = FreightApp(MagicMock())
+
+        mock_calculate.side_effect = ExternalAPIError("OSRM down")
+        assert call(app, "POST", "/freight", {"weight": 5, "option": 1})[0] == (
+            "502 Bad Gateway"
+        )
+
+        mock_calculate.side_effect = FreightTypeInvalidError("Invalid freight option.")
+        status, body = call(app, "POST", "/freight", {"weight": 5, "option": 9})
+        assert status == "422 Unprocessable Entity"
+        assert body["error"] == "FreightTypeInvalidError"
+
+        assert call(app, "POST", "/freight", {"option": 1})[0] == "400 Bad Request"
+        assert call(app, "GET", "/freight")[0] == "405 Method Not Allowed"
+
+    @patch("provider.cache.CacheClient")
+    @patch("server.logger")
+    def test_open_circuit_is_503_without_traceback(
+        self, mock_logger, mock_client_class
+    ):
+        mock_client_class.return_value.is_available.return_value = False
+        cep_provider = MagicMock()
+        cep_provider.get_cep_data.side_effect = pybreaker.CircuitBreakerError("open")
+        cep_provider.get_cep_data_many.side_effect = pybreaker.CircuitBreakerError(
+            "open"
+        )
+        app = FreightApp(cep_provider)
+
+        status, body = call(
+            app,
+            "POST",
+            "/freight",
+            {
+                "weight": 5,
+                "option": 1,
+                "origin_cep": "01001000",
+                "destination_cep": "20040030",
+            },
+        )
+
+        assert status == "503 Service Unavailable"
+        assert body["error"] == "CircuitOpenError"
+        mock_logger.exception.assert_not_called()
+
+    @patch("server.calculate_freights")
+    def test_batch_reports_each_item(self, mock_calculate):
+        mock_calculate.return_value = [
+            freight(500.0, 1005.0),
+            FreightTypeInvalidError("Invalid freight option."),
+        ]
+
+        status, body = call(
+            FreightApp(MagicMock()),
+            "POST",
+            "/freights",
+            {
+                "items": [
+                    {"weight": 2, "option": 1, "distance": 500},
+                    {"weight": 2, "option": 9, "distance": 500},
+                ]
+            },
+        )
+
+        assert status == "200 OK"
+        assert body["results"][0]["value"] == 1005.0
+        assert body["results"][1]["error"] == "FreightTypeInvalidError"
+
+
+class TestServe:
+    @patch.dict("os.environ", {"OSRM_API_URL": ""})
+    def test_invalid_config_fails_in_the_master(self):
+        app_factory = MagicMock(return_value=FreightApp(MagicMock()))
+
+        with patch("server._create_listener") as create_listener, patch(
+            "os.fork"
+        ) as fork, pytest.raises(ValueError, match="OSRM_API_URL"):
+            serve(port=0, workers=2, app_factory=app_factory)
+
+        app_factory.assert_called_once_with()
+        create_listener.assert_not_called()
+        fork.assert_not_called()
+
+    def test_respawn_backs_off_exponentially(self):
+        assert _respawn_delay(0) == 0
+        assert [_respawn_delay(n) for n in (1, 2, 3)] == [0.5, 1.0, 2.0]
+        assert _respawn_delay(100) == server.SERVER_RESPAWN_MAX_DELAY
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+    @patch.dict(
+        "os.environ", {"OSRM_API_URL": "http://osrm/", "BRASIL_API_URL": "http://cep/"}
+    )
+    def test_gives_up_when_workers_keep_crashing_on_startup(self):
+        app = FreightApp(MagicMock())
+        app.warm_up = MagicMock(side_effect=RuntimeError("boom"))
+        handlers = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+        try:
+            with patch.object(server, "SERVER_MAX_WORKER_FAILURES", 3), patch.object(
+                server, "SERVER_RESPAWN_MAX_DELAY", 0.01
+            ), patch("server.logger"), patch("os.fork", wraps=os.fork) as fork:
+                with pytest.raises(RuntimeError, match="crashing"):
+                    serve(host="127.0.0.1", port=0, workers=2, app_factory=lambda: app)
+        finally:
+            signal.signal(signal.SIGTERM, handlers[0])
+            signal.signal(signal.SIGINT, handlers[1])
+
+        # 2 workers iniciais; o slot que chega a 3 falhas encerra o serviço
+        assert 4 <= fork.call_count <= 6
@@ -0,0 +1,96 @@
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from config import find_env_file
+from lazy import lazy_import
+from provider.resilience import LazyCircuitBreaker, _breaker_state
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+HEAVY_MODULES = (
+    "asyncio",
+    "numpy",
+    "pybreaker",
+    "redis",
+    "requests",
+    "tenacity",
+    "urllib3",
+)
+
+
+def import_times(module: str) -> dict:
+    # Tempo cumulativo (µs) por módulo importado, como reportado pelo Python.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartup(unittest.TestCase):
+    def test_main_import_skips_heavy_dependencies(self):
+        times = import_times("main")
+
+        self.assertIn("main", times)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times)
+        if find_env_file() is None:
+            self.assertNotIn("dotenv", times)
+
+
+class TestLazyModule(unittest.TestCase):
+    def test_imports_on_first_attribute_access(self):
+        module = MagicMock(value=42)
+        with patch("lazy.importlib.import_module", return_value=module) as load:
+            lazy = lazy_import("some.module")
+            load.assert_not_called()
+
+            self.assertEqual(lazy.value, 42)
+            self.assertEqual(lazy.value, 42)
+        load.assert_called_once_with("some.module")
+
+    def test_sees_patches_on_the_real_module(self):
+        lazy = lazy_import("json")
+        with patch("json.dumps", return_value="patched"):
+            self.assertEqual(lazy.dumps({}), "patched")
+        self.assertEqual(lazy.dumps({}), "{}")
+
+
+class TestLazyCircuitBreaker(unittest.TestCase):
+    def test_created_on_first_use(self):
+        breaker = LazyCircuitBreaker("test_lazy_breaker", fail_max=2)
+        self.assertFalse(breaker.created)
+
+        self.assertEqual(breaker.fail_max, 2)
+        self.assertTrue(breaker.created)
+        self.assertEqual(breaker.name, "test_lazy_breaker")
+        self.assertEqual(len(breaker.listeners), 1)
+
+    def test_idle_breaker_reports_closed_without_being_created(self):
+        breaker = LazyCircuitBreaker("test_idle_breaker")
+
+        self.assertEqual(_breaker_state(breaker), 0)
+        self.assertFalse(breaker.created)
+
+
+class TestEnvFile(unittest.TestCase):
+    def test_finds_closest_env_file_up_the_tree(self):
+        with tempfile.TemporaryDirectory() as root:
+            nested = Path(root, "a", "b")
+            nested.mkdir(parents=True)
+            Path(root, "a", ".env").write_text("X=1\n")
+
+            self.assertEqual(find_env_file(str(nested)), str(Path(root, "a", ".env")))
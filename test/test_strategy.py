@@ -1,8 +1,23 @@
+import json
+import math
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from exceptions import (
+    DistanceInvalidError,
+    FreightTypeInvalidError,
+    WeightInvalidError,
+)
+from factories.freight_factory import FreightStrategyFactory
 from strategies.freight_calulator import (
     NormalFreight,
     Sedex10Freight,
     SedexFreight,
 )
+from strategies.tariff import TariffFreight, TariffTableLoader, compile_tariff_table
 
 
 class TestFreightStrategy:
@@ -32,3 +47,181 @@ class TestFreightStrategy:
         expected_value = 1715.00  # 500 * 3.4 + 15
 
         assert strategy.calculate(distance, weight) == expected_value
+
+
+TABLE = {
+    "options": {
+        "1": {
+            "name": "Normal",
+            "weight_bands": [1, 5, 10],
+            "distance_bands": [100, 500],
+            "prices": [[10, 15], [12, 18], [20, 30]],
+            "excess_kg_rate": 2,
+        },
+        "2": {
+            "name": "Sedex",
+            "weight_bands": [5],
+            "distance_bands": [1000],
+            "prices": [[40]],
+        },
+    },
+    "surcharges": [
+        {"cep_start": "66000000", "cep_end": "69999999", "percent": 10, "fixed": 1}
+    ],
+}
+
+
+class TestTariffFreight:
+    def test_band_boundaries_are_inclusive_upper_limits(self):
+        strategy = compile_tariff_table(TABLE).strategy(1)
+
+        assert strategy.calculate(100, 1) == 10
+        assert strategy.calculate(100.1, 1) == 15
+        assert strategy.calculate(50, 1.01) == 12
+        assert strategy.calculate(500, 10) == 30
+
+    def test_excess_rate_above_last_band(self):
+        strategy = compile_tariff_table(TABLE).strategy(1)
+
+        assert strategy.calculate(50, 12) == 20 + 2 * 2
+
+    def test_out_of_range_without_excess_rate(self):
+        strategy = compile_tariff_table(TABLE).strategy(2)
+
+        with pytest.raises(WeightInvalidError):
+            strategy.calculate(10, 6)
+        with pytest.raises(DistanceInvalidError):
+            strategy.calculate(1001, 1)
+
+    def test_regional_surcharge_by_destination_cep(self):
+        strategy = compile_tariff_table(TABLE).strategy(2)
+
+        assert strategy.calculate(10, 1, "69010-000") == pytest.approx(45.0)
+        assert strategy.calculate(10, 1, "70000000") == 40
+        assert strategy.calculate(10, 1) == 40
+
+    def test_rejects_invalid_tables(self):
+        bad_prices = {"options": {"1": {**TABLE["options"]["1"], "prices": [[1]]}}}
+        unsorted = {
+            "options": {"1": {**TABLE["options"]["1"], "weight_bands": [5, 1, 10]}}
+        }
+        overlapping = {
+            **TABLE,
+            "surcharges": [
+                {"cep_start": "01000000", "cep_end": "05999999"},
+                {"cep_start": "05000000", "cep_end": "09999999"},
+            ],
+        }
+        for data in (bad_prices, unsorted, overlapping, {"options": {}}):
+            with pytest.raises(ValueError):
+                compile_tariff_table(data)
+
+    def test_unknown_option(self):
+        with pytest.raises(FreightTypeInvalidError):
+            compile_tariff_table(TABLE).strategy(3)
+
+
+class TestTariffTableLoader:
+    def write(self, path, table):
+        path.write_text(json.dumps(table))
+
+    def test_reloads_when_the_file_changes(self, tmp_path):
+        path = tmp_path / "tariffs.json"
+        self.write(path, TABLE)
+        loader = TariffTableLoader(str(path), reload_interval=0.01)
+        first = loader.current()
+        assert loader.current() is first
+
+        changed = json.loads(json.dumps(TABLE))
+        changed["options"]["2"]["prices"] = [[50]]
+        self.write(path, changed)
+        os.utime(path, (first.mtime + 10, first.mtime + 10))
+        time.sleep(0.02)
+
+        assert loader.current().strategy(2).calculate(10, 1) == 50
+
+    def test_keeps_current_table_when_reload_fails(self, tmp_path):
+        path = tmp_path / "tariffs.json"
+        self.write(path, TABLE)
+        loader = TariffTableLoader(str(path), reload_interval=0.01)
+        first = loader.current()
+
+        path.write_text("{not json")
+        os.utime(path, (first.mtime + 10, first.mtime + 10))
+        time.sleep(0.02)
+
+        assert loader.current() is first
+
+
+class TestFreightStrategyFactory:
+    def test_builtin_strategies_are_shared(self):
+        assert FreightStrategyFactory().create_strategy(
+            1
+        ) is FreightStrategyFactory().create_strategy(1)
+        with pytest.raises(FreightTypeInvalidError):
+            FreightStrategyFactory().create_strategy(4)
+
+    def test_uses_the_tariff_table_when_configured(self, tmp_path):
+        path = tmp_path / "tariffs.json"
+        path.write_text(json.dumps(TABLE))
+        factory = FreightStrategyFactory(TariffTableLoader(str(path)))
+
+        strategy = factory.create_strategy(1)
+
+        assert isinstance(strategy, TariffFreight)
+        assert factory.create_strategy(1) is strategy
+
+
+@pytest.fixture(params=["numpy", "python"])
+def batch_backend(request):
+    # Roda cada teste com NumPy (se instalado) e com o fallback em Python puro.
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        yield
+    else:
+        with patch("strategies.freight_strategy.numpy_module", return_value=None):
+            yield
+
+
+class TestCalculateBatch:
+    @pytest.mark.parametrize(
+        "strategy", [NormalFreight(), SedexFreight(), Sedex10Freight()]
+    )
+    def test_matches_calculate_for_builtin_strategies(self, strategy, batch_backend):
+        distances = [500.0, 12.5, 0.1]
+        weights = [2.0, 3.4, 30.0]
+
+        values, valid = strategy.calculate_batch(distances, weights)
+
+        assert list(valid) == [True, True, True]
+        assert list(values) == [
+            strategy.calculate(d, w) for d, w in zip(distances, weights)
+        ]
+
+    def test_invalid_rows_are_masked(self, batch_backend):
+        values, valid = NormalFreight().calculate_batch(
+            [100.0, 0.0, -5.0, 100.0, float("nan")], [1.0, 1.0, 1.0, 0.0, 1.0]
+        )
+
+        assert list(valid) == [True, False, False, False, False]
+        assert values[0] == 105
+        assert all(math.isnan(value) for value in list(values)[1:])
+
+    def test_tariff_matches_row_by_row_pricing(self, batch_backend):
+        strategy = compile_tariff_table(TABLE).strategy(1)
+        distances = [100, 100.1, 50, 500, 50, 600, -1]
+        weights = [1, 1, 1.01, 10, 12, 1, 1]
+        ceps = ["69010-000", None, "70000000", "66000000", "01001000", None, None]
+
+        values, valid = strategy.calculate_batch(distances, weights, ceps)
+
+        assert list(valid) == [True, True, True, True, True, False, False]
+        for value, distance, weight, cep, ok in zip(
+            values, distances, weights, ceps, valid
+        ):
+            if ok:
+                assert value == pytest.approx(strategy.calculate(distance, weight, cep))
+
+    def test_columns_must_have_the_same_length(self):
+        with pytest.raises(ValueError):
+            NormalFreight().calculate_batch([1.0, 2.0], [1.0])